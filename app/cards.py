@@ -0,0 +1,21 @@
+"""
+Правила карт Clash Royale, общие для БД, текста профиля, картинок и аналитики.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+# уровень «как в игре» (RoyaleAPI): у всех редкостей максимум один
+MAX_LEVEL = 16
+
+
+def display_level(card: Dict[str, Any]) -> Optional[int]:
+    """
+    Реальный уровень карты (как в игре / RoyaleAPI):
+    display = level + (16 - maxLevel); None — если посчитать нельзя.
+    """
+    lv = card.get("level")
+    mx = card.get("maxLevel")
+    if isinstance(lv, int) and isinstance(mx, int) and mx > 0:
+        return lv + (MAX_LEVEL - mx)
+    return None
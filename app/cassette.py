@@ -0,0 +1,195 @@
+"""
+Запись и воспроизведение исходящего HTTP (Clash API, RoyaleAPI, иконки карт).
+
+    HTTP_CASSETTE=./cassettes/prod.cas HTTP_CASSETTE_MODE=record   — ходим в сеть и пишем ответы
+    HTTP_CASSETTE=./cassettes/prod.cas HTTP_CASSETTE_MODE=replay   — сеть не трогаем, отдаём записанное
+    HTTP_CASSETTE_LATENCY=1 — при воспроизведении ждать записанную задержку (0 — отдавать сразу)
+
+Кассета — один файл из записей подряд: заголовок записи (метод, URL, статус, content-type,
+задержка) и тело, сжатое zlib. Индекс «метод + URL -> записи» строится чтением заголовков при
+старте, тела читаются с диска по запросу. На один URL может быть несколько ответов — они отдаются
+по кругу в порядке записи, так что повторный прогон видит ту же «форму» трафика.
+
+Заголовок Authorization и прочие заголовки запроса не пишутся: кассету можно отдать коллеге.
+Запись — один write в файл, открытый на дозапись, поэтому бот и воркеры могут писать в одну кассету.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import struct
+import time
+import zlib
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+MODES = ("off", "record", "replay")
+
+# длина заголовка записи и длина сжатого тела
+_PREFIX = struct.Struct(">II")
+# параметры клиента, которые в httpx относятся к транспорту
+_TRANSPORT_KWARGS = ("verify", "cert", "http1", "http2", "limits")
+
+
+def _key(method: str, url: str) -> str:
+    return f"{method.upper()} {url}"
+
+
+class Cassette:
+    def __init__(self, path: str):
+        self.path = path
+        # ключ -> [(смещение тела, длина тела, заголовок записи)]
+        self._index: Dict[str, List[Tuple[int, int, Dict[str, Any]]]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._file: Optional[BinaryIO] = None
+
+    # -------- запись --------
+
+    def append(self, method: str, url: str, status: int, content_type: str, elapsed: float, body: bytes) -> None:
+        packed = zlib.compress(body, 6)
+        head = json.dumps(
+            {"m": method.upper(), "u": url, "s": status, "ct": content_type, "t": round(elapsed, 4)},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        record = _PREFIX.pack(len(head), len(packed)) + head + packed
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            os.write(fd, record)
+        finally:
+            os.close(fd)
+
+    # -------- чтение --------
+
+    def load(self) -> int:
+        """Строит индекс по файлу; возвращает число записей. Оборванная последняя запись пропускается."""
+        self._index.clear()
+        self._cursor.clear()
+        count = 0
+        for offset, size, head in self._scan():
+            self._index.setdefault(_key(head["m"], head["u"]), []).append((offset, size, head))
+            count += 1
+        return count
+
+    def _scan(self) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        if not os.path.exists(self.path):
+            return
+        total = os.path.getsize(self.path)
+        with open(self.path, "rb") as f:
+            while True:
+                prefix = f.read(_PREFIX.size)
+                if len(prefix) < _PREFIX.size:
+                    return
+                head_len, body_len = _PREFIX.unpack(prefix)
+                raw = f.read(head_len)
+                offset = f.tell()
+                if len(raw) < head_len or offset + body_len > total:
+                    return
+                yield offset, body_len, json.loads(raw)
+                f.seek(body_len, os.SEEK_CUR)
+
+    def lookup(self, method: str, url: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        key = _key(method, url)
+        entries = self._index.get(key)
+        if not entries:
+            return None
+        i = self._cursor.get(key, 0)
+        self._cursor[key] = (i + 1) % len(entries)
+        offset, size, head = entries[i]
+        if self._file is None:
+            self._file = open(self.path, "rb")
+        self._file.seek(offset)
+        packed = self._file.read(size)
+        return head, zlib.decompress(packed)
+
+    def urls(self, method: str = "GET") -> List[str]:
+        prefix = method.upper() + " "
+        return [k[len(prefix):] for k in self._index if k.startswith(prefix)]
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Пропускает запрос в сеть и пишет ответ (тело уже без content-encoding) в кассету."""
+
+    def __init__(self, cassette: Cassette, inner: httpx.AsyncBaseTransport):
+        self.cassette = cassette
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        elapsed = time.perf_counter() - started
+        content_type = response.headers.get("content-type", "")
+        self.cassette.append(request.method, str(request.url), response.status_code, content_type, elapsed, body)
+        headers = {"content-type": content_type} if content_type else {}
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Отдаёт записанные ответы; чего в кассете нет — ошибка соединения, как без сети."""
+
+    def __init__(self, cassette: Cassette, latency: float = 1.0):
+        self.cassette = cassette
+        self.latency = latency
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        found = self.cassette.lookup(request.method, str(request.url))
+        if found is None:
+            raise httpx.ConnectError(f"no recorded response for {request.method} {request.url}", request=request)
+        head, body = found
+        if self.latency > 0 and head.get("t"):
+            await asyncio.sleep(head["t"] * self.latency)
+        headers = {"content-type": head["ct"]} if head.get("ct") else {}
+        return httpx.Response(head["s"], headers=headers, content=body, request=request)
+
+
+# -------- настройка процесса --------
+
+_MODE = "off"
+_CASSETTE: Optional[Cassette] = None
+_LATENCY = 1.0
+
+
+def configure(mode: str, path: str = "", latency: float = 1.0) -> Optional[Cassette]:
+    """Включает запись/воспроизведение для всех клиентов, созданных после вызова через http_client()."""
+    global _MODE, _CASSETTE, _LATENCY
+    if mode not in MODES:
+        raise ValueError(f"unknown cassette mode {mode!r}")
+    if _CASSETTE is not None:
+        _CASSETTE.close()
+    _MODE, _LATENCY = mode, latency
+    _CASSETTE = None
+    if mode != "off":
+        if not path:
+            raise ValueError("cassette path is required")
+        _CASSETTE = Cassette(path)
+        if mode == "replay":
+            _CASSETTE.load()
+    return _CASSETTE
+
+
+def http_client(**kwargs: Any) -> httpx.AsyncClient:
+    """httpx.AsyncClient для походов наружу; параметры — как у AsyncClient."""
+    if _CASSETTE is None:
+        return httpx.AsyncClient(**kwargs)
+    transport_kwargs = {k: kwargs.pop(k) for k in _TRANSPORT_KWARGS if k in kwargs}
+    if _MODE == "record":
+        inner = httpx.AsyncHTTPTransport(**transport_kwargs)
+        return httpx.AsyncClient(transport=RecordingTransport(_CASSETTE, inner), **kwargs)
+    return httpx.AsyncClient(transport=ReplayTransport(_CASSETTE, _LATENCY), **kwargs)
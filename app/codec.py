@@ -0,0 +1,115 @@
+"""
+JSON для ответов API и кешей в SQLite: orjson, если установлен, иначе stdlib json.
+
+decode_player — разбор /players/{tag} только с полями из PLAYER_FIELDS (остальное — бейджи,
+достижения, текущая колода, статистика лиг — боту не нужно и в кеш не пишется).
+С msgspec разбор идёт сразу в типизированные структуры, лишние поля даже не создаются;
+без него — обычный разбор и обрезка словаря.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - зависит от окружения
+    msgspec = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+TYPED_BACKEND = "msgspec" if msgspec is not None else "trim"
+
+# поля карты, которые читают профиль, player_index, прогресс и картинка прокачки
+_CARD_FIELDS: Dict[str, Any] = {
+    "id": None,
+    "name": None,
+    "level": None,
+    "maxLevel": None,
+    "evolutionLevel": None,
+    "iconUrls": {"medium": None, "evolutionMedium": None, "heroMedium": None},
+}
+
+# None — поле берётся как есть, dict — вложенный объект, [dict] — список объектов
+PLAYER_FIELDS: Dict[str, Any] = {
+    "tag": None,
+    "name": None,
+    "expLevel": None,
+    "trophies": None,
+    "bestTrophies": None,
+    "wins": None,
+    "losses": None,
+    "battleCount": None,
+    "role": None,
+    "clan": {"tag": None, "name": None, "role": None},
+    "cards": [_CARD_FIELDS],
+    "supportCards": [_CARD_FIELDS],
+}
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumpb(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """Текст для TEXT-колонок SQLite; не-ASCII пишется как есть (как ensure_ascii=False)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+# -------- снапшот игрока без лишних полей --------
+
+
+def trim(obj: Any, fields: Dict[str, Any]) -> Any:
+    """Оставляет в obj только поля из fields (рекурсивно); чужие типы возвращает как есть."""
+    if not isinstance(obj, dict):
+        return obj
+    out = {}
+    for name, sub in fields.items():
+        if name not in obj:
+            continue
+        value = obj[name]
+        if isinstance(sub, dict):
+            value = trim(value, sub)
+        elif isinstance(sub, list) and isinstance(value, list):
+            value = [trim(v, sub[0]) for v in value]
+        out[name] = value
+    return out
+
+
+def _struct(name: str, fields: Dict[str, Any]) -> Any:
+    # отсутствующее в ответе поле остаётся UNSET и не попадает в to_builtins
+    spec = []
+    for fname, sub in fields.items():
+        if isinstance(sub, dict):
+            tp: Any = _struct(f"{name}_{fname}", sub)
+        elif isinstance(sub, list):
+            tp = List[_struct(f"{name}_{fname}", sub[0])]  # type: ignore[misc]
+        else:
+            tp = Any
+        spec.append((fname, Union[tp, msgspec.UnsetType, None], msgspec.UNSET))
+    return msgspec.defstruct(name, spec, kw_only=True)
+
+
+_PLAYER_STRUCT: Optional[Any] = _struct("Player", PLAYER_FIELDS) if msgspec is not None else None
+_PLAYER_DECODER: Optional[Any] = msgspec.json.Decoder(_PLAYER_STRUCT) if msgspec is not None else None
+
+
+def decode_player(data: Union[bytes, str]) -> Dict[str, Any]:
+    """Ответ /players/{tag} -> словарь только с PLAYER_FIELDS."""
+    if _PLAYER_DECODER is not None:
+        return msgspec.to_builtins(_PLAYER_DECODER.decode(data))
+    return trim(loads(data), PLAYER_FIELDS)
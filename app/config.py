@@ -1,8 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
 
 @dataclass(frozen=True)
 class Config:
@@ -10,8 +7,112 @@ class Config:
     db_path: str
     clash_api_token: str
     clash_api_base: str = "https://api.clashroyale.com/v1"
+    # страницы игроков RoyaleAPI (скрейп истории КВ)
+    royaleapi_base: str = "https://royaleapi.com"
+    # страниц RoyaleAPI в секунду на весь бот: с воркерами делится поровну между процессами
+    royaleapi_rate: float = 2.0
+    # запросов к Clash API в секунду на процесс (0 — без лимита)
+    clash_api_rate: float = 20.0
+    # профиль из API хранить только с полями, которые читает бот (app.codec.PLAYER_FIELDS)
+    trim_player_json: bool = True
+
+    # тяжёлые хендлеры (рендер/скрейп): лимиты на пользователя
+    expensive_max_inflight: int = 2
+    expensive_burst: int = 3
+    expensive_refill_seconds: float = 10.0
+
+    # режим получения апдейтов: "polling" (по умолчанию) или "webhook"
+    bot_mode: str = "polling"
+    webhook_url: str = ""  # публичный адрес, например https://bot.example.com
+    webhook_path: str = "/webhook"
+    webhook_secret: str = ""
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_max_concurrency: int = 32
+    shutdown_timeout: float = 30.0
+
+    # процессы-воркеры для тяжёлых задач (0 — всё в процессе бота)
+    job_workers: int = 0
+    job_worker_concurrency: int = 2
+    job_timeout: float = 120.0
+
+    # метрики: /metrics на отдельном порту (и в polling, и в webhook; 0 — выключено) и /stats для админов.
+    # С job_workers > 0 рендер и скрейп идут в воркерах, а их метрики живут в их процессах и сюда
+    # не попадают: naborbot_render_seconds / naborbot_scrape_seconds тогда пустые
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 0
+    admin_ids: frozenset = field(default_factory=frozenset)
+
+    # профилирование (по умолчанию выключено): доля апдейтов под cProfile и порог «медленного» апдейта
+    profile_sample_rate: float = 0.0
+    slow_update_ms: float = 0.0
+    profile_dir: str = "./profiles"
+    profile_max_files: int = 50
+
+    # снапшоты игроков: сколько секунд снапшот из player_cache считается свежим
+    # и фоновое обновление привязанных аккаунтов (запросов к API в секунду, 0 — выключено)
+    snapshot_max_age: float = 300.0
+    refresh_rate: float = 0.5
+    refresh_cycle_seconds: float = 60.0
+    # вместе с профилем забирать и battlelog (копим историю боёв в таблицах battles/battle_players)
+    battlelog_ingest: bool = True
+
+    # подписки /watch: запросов к API в секунду на их опрос (0 — выключены)
+    watch_rate: float = 1.0
+
+    # исходящие сообщения: общий лимит бота (у Telegram ~30/с) и сколько отправителей у outbox
+    outbound_rate: float = 25.0
+    outbox_concurrency: int = 4
+
+    # запись/воспроизведение исходящего HTTP (app.cassette): "off", "record" или "replay";
+    # http_cassette_latency — множитель записанной задержки при воспроизведении (0 — без задержки)
+    http_cassette_mode: str = "off"
+    http_cassette: str = ""
+    http_cassette_latency: float = 1.0
+
+    # обслуживание SQLite (app.services.maintenance): как часто смотреть на файл (0 — выключено),
+    # как часто пересчитывать статистику и при каком размере WAL чекпоинтить даже под нагрузкой
+    db_maintenance_interval: float = 60.0
+    db_analyze_interval: float = 6 * 3600.0
+    db_wal_max_mb: int = 64
+    # миграция 2 (auto_vacuum через полный VACUUM) на большой базе идёт долго и держит старт;
+    # 0 — отложить её (и следующие миграции) до старта с 1, например в окно обслуживания
+    db_auto_vacuum_migration: bool = True
+
+    # /upgrade с выбором аккаунта: сколько аккаунтов рендерить заранее одновременно (0 — не рендерить)
+    # и через сколько секунд без выбора отменять ещё не начатые
+    upgrade_prerender: int = 2
+    upgrade_prerender_idle: float = 60.0
+
+    # фоновый прогрев рендера (Pillow, шрифты, иконки из дискового кеша) после старта
+    warmup: bool = True
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    return int(raw) if raw else default
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    return float(raw) if raw else default
+
+def _env_workers(name: str) -> int:
+    raw = os.getenv(name, "").strip().lower()
+    if raw == "auto":
+        return os.cpu_count() or 1
+    return int(raw) if raw else 0
+
+def _env_ids(name: str) -> frozenset:
+    raw = os.getenv(name, "")
+    return frozenset(int(x) for x in raw.replace(";", ",").split(",") if x.strip())
 
 def load_config() -> Config:
+    # .env читаем здесь, а не при импорте модуля
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
     bot_token = os.getenv("BOT_TOKEN", "").strip()
     if not bot_token:
         raise RuntimeError("BOT_TOKEN is empty in .env")
@@ -22,8 +123,76 @@ def load_config() -> Config:
     if not clash_api_token:
         raise RuntimeError("CLASH_API_TOKEN is empty in .env")
 
+    bot_mode = os.getenv("BOT_MODE", "polling").strip().lower() or "polling"
+    if bot_mode not in ("polling", "webhook"):
+        raise RuntimeError("BOT_MODE must be 'polling' or 'webhook'")
+
+    webhook_url = os.getenv("WEBHOOK_URL", "").strip()
+    if bot_mode == "webhook" and not webhook_url:
+        raise RuntimeError("WEBHOOK_URL is empty in .env (required for BOT_MODE=webhook)")
+
+    webhook_path = os.getenv("WEBHOOK_PATH", "/webhook").strip() or "/webhook"
+    if not webhook_path.startswith("/"):
+        webhook_path = "/" + webhook_path
+
+    webhook_host = os.getenv("WEBHOOK_HOST", "0.0.0.0").strip() or "0.0.0.0"
+    webhook_port = _env_int("WEBHOOK_PORT", 8080)
+    metrics_port = _env_int("METRICS_PORT", 0)
+    if bot_mode == "webhook" and metrics_port == webhook_port:
+        raise RuntimeError("METRICS_PORT must differ from WEBHOOK_PORT: /metrics is not served on the webhook port")
+
+    http_cassette_mode = os.getenv("HTTP_CASSETTE_MODE", "off").strip().lower() or "off"
+    if http_cassette_mode not in ("off", "record", "replay"):
+        raise RuntimeError("HTTP_CASSETTE_MODE must be 'off', 'record' or 'replay'")
+    http_cassette = os.getenv("HTTP_CASSETTE", "").strip()
+    if http_cassette_mode != "off" and not http_cassette:
+        raise RuntimeError("HTTP_CASSETTE is empty in .env (required for HTTP_CASSETTE_MODE=record/replay)")
+
     return Config(
         bot_token=bot_token,
         db_path=db_path,
-        clash_api_token=clash_api_token
+        clash_api_token=clash_api_token,
+        clash_api_base=os.getenv("CLASH_API_BASE", "").strip() or "https://api.clashroyale.com/v1",
+        clash_api_rate=_env_float("CLASH_API_RATE", 20.0),
+        trim_player_json=_env_int("TRIM_PLAYER_JSON", 1) != 0,
+        royaleapi_base=os.getenv("ROYALEAPI_BASE", "").strip() or "https://royaleapi.com",
+        royaleapi_rate=_env_float("ROYALEAPI_RATE", 2.0),
+        expensive_max_inflight=_env_int("EXPENSIVE_MAX_INFLIGHT", 2),
+        expensive_burst=_env_int("EXPENSIVE_BURST", 3),
+        expensive_refill_seconds=_env_float("EXPENSIVE_REFILL_SECONDS", 10.0),
+        bot_mode=bot_mode,
+        webhook_url=webhook_url,
+        webhook_path=webhook_path,
+        webhook_secret=os.getenv("WEBHOOK_SECRET", "").strip(),
+        webhook_host=webhook_host,
+        webhook_port=webhook_port,
+        webhook_max_concurrency=_env_int("WEBHOOK_MAX_CONCURRENCY", 32),
+        shutdown_timeout=_env_float("SHUTDOWN_TIMEOUT", 30.0),
+        job_workers=_env_workers("JOB_WORKERS"),
+        job_worker_concurrency=_env_int("JOB_WORKER_CONCURRENCY", 2),
+        job_timeout=_env_float("JOB_TIMEOUT", 120.0),
+        metrics_host=os.getenv("METRICS_HOST", "127.0.0.1").strip() or "127.0.0.1",
+        metrics_port=metrics_port,
+        admin_ids=_env_ids("ADMIN_IDS"),
+        profile_sample_rate=_env_float("PROFILE_SAMPLE_RATE", 0.0),
+        slow_update_ms=_env_float("SLOW_UPDATE_MS", 0.0),
+        profile_dir=os.getenv("PROFILE_DIR", "./profiles").strip() or "./profiles",
+        profile_max_files=_env_int("PROFILE_MAX_FILES", 50),
+        warmup=_env_int("WARMUP", 1) != 0,
+        snapshot_max_age=_env_float("SNAPSHOT_MAX_AGE", 300.0),
+        refresh_rate=_env_float("REFRESH_RATE", 0.5),
+        refresh_cycle_seconds=_env_float("REFRESH_CYCLE_SECONDS", 60.0),
+        battlelog_ingest=_env_int("BATTLELOG_INGEST", 1) != 0,
+        watch_rate=_env_float("WATCH_RATE", 1.0),
+        outbound_rate=_env_float("OUTBOUND_RATE", 25.0),
+        outbox_concurrency=_env_int("OUTBOX_CONCURRENCY", 4),
+        http_cassette_mode=http_cassette_mode,
+        http_cassette=http_cassette,
+        http_cassette_latency=_env_float("HTTP_CASSETTE_LATENCY", 1.0),
+        db_maintenance_interval=_env_float("DB_MAINTENANCE_INTERVAL", 60.0),
+        db_analyze_interval=_env_float("DB_ANALYZE_INTERVAL", 6 * 3600.0),
+        db_wal_max_mb=_env_int("DB_WAL_MAX_MB", 64),
+        db_auto_vacuum_migration=_env_int("DB_AUTO_VACUUM_MIGRATION", 1) != 0,
+        upgrade_prerender=_env_int("UPGRADE_PRERENDER", 2),
+        upgrade_prerender_idle=_env_float("UPGRADE_PRERENDER_IDLE", 60.0),
     )
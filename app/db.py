@@ -1,8 +1,18 @@
-import json
+import functools
+import inspect
+import sqlite3
+import time
+from collections import OrderedDict
 import aiosqlite
-from typing import Optional, List, Dict, Any
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 from datetime import datetime
 
+from app import codec, migrations, progression
+from app.metrics import DB_QUERY_SECONDS, cache_hit
+from app.player_index import FindQuery, player_index_row
+from app.utils import normalize_player_tag
+
+# базовая схема (версия 0); изменения существующих таблиц — только миграциями (MIGRATIONS внизу файла)
 SCHEMA_SQL = """
 PRAGMA journal_mode=WAL;
 
@@ -28,34 +38,291 @@ CREATE TABLE IF NOT EXISTS player_cache (
   updated_at TEXT NOT NULL
 );
 
+CREATE TABLE IF NOT EXISTS jobs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  kind TEXT NOT NULL,
+  payload TEXT NOT NULL,
+  priority INTEGER NOT NULL DEFAULT 0,
+  status TEXT NOT NULL,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  max_attempts INTEGER NOT NULL DEFAULT 3,
+  available_at REAL NOT NULL,
+  lease_until REAL,
+  worker_id TEXT,
+  result TEXT,
+  error TEXT,
+  created_at TEXT NOT NULL,
+  finished_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS user_activity (
+  telegram_user_id INTEGER PRIMARY KEY,
+  last_seen_at TEXT NOT NULL
+);
+
+-- колонки для поиска кандидатов, извлекаются из снапшота при записи в player_cache
+CREATE TABLE IF NOT EXISTS player_index (
+  player_tag TEXT PRIMARY KEY,
+  name TEXT NOT NULL,
+  trophies INTEGER NOT NULL,
+  best_trophies INTEGER NOT NULL,
+  exp_level INTEGER NOT NULL,
+  clan_tag TEXT,
+  cards_14 INTEGER NOT NULL,  -- карт уровня >= 14 (по уровню как в игре)
+  cards_15 INTEGER NOT NULL,
+  cards_16 INTEGER NOT NULL,
+  evo_count INTEGER NOT NULL,
+  hero_count INTEGER NOT NULL,
+  updated_at TEXT NOT NULL
+);
+
+-- история прогресса: ключевые кадры и дельты (формат — app.progression)
+CREATE TABLE IF NOT EXISTS progress (
+  player_tag TEXT NOT NULL,
+  ts INTEGER NOT NULL,  -- unix-время в мс
+  kind INTEGER NOT NULL,  -- 0 ключевой кадр, 1 дельта
+  data BLOB NOT NULL,
+  PRIMARY KEY(player_tag, ts)
+) WITHOUT ROWID;
+
+-- история боёв (battlelog): бой хранится один раз, даже если в нём несколько наших игроков
+CREATE TABLE IF NOT EXISTS battles (
+  id INTEGER PRIMARY KEY,
+  battle_key INTEGER NOT NULL UNIQUE,  -- хеш battleTime + теги участников
+  battle_time INTEGER NOT NULL,        -- unix-время
+  type TEXT NOT NULL,
+  game_mode_id INTEGER,
+  is_war INTEGER NOT NULL DEFAULT 0
+);
+
+-- колода — отсортированные id карт, упакованные в blob (int32 little-endian)
+CREATE TABLE IF NOT EXISTS decks (
+  id INTEGER PRIMARY KEY,
+  cards BLOB NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS cards (
+  id INTEGER PRIMARY KEY,
+  name TEXT NOT NULL
+);
+
+-- outcome: 1 победа, 0 ничья, -1 поражение
+CREATE TABLE IF NOT EXISTS battle_players (
+  battle_id INTEGER NOT NULL,
+  player_tag TEXT NOT NULL,
+  side INTEGER NOT NULL,
+  crowns INTEGER NOT NULL,
+  outcome INTEGER NOT NULL,
+  deck_id INTEGER,
+  PRIMARY KEY(battle_id, player_tag),
+  FOREIGN KEY(battle_id) REFERENCES battles(id),
+  FOREIGN KEY(deck_id) REFERENCES decks(id)
+) WITHOUT ROWID;
+
+-- до какого боя battlelog тега уже прочитан
+CREATE TABLE IF NOT EXISTS battlelog_cursor (
+  player_tag TEXT PRIMARY KEY,
+  last_battle_time INTEGER NOT NULL,
+  polled_at TEXT NOT NULL
+);
+
+-- подписки на события: kind — left_clan | trophies | war_decks (см. app/services/watcher.py),
+-- state — последнее увиденное значение (JSON), с ним сравнивается следующий снапшот
+CREATE TABLE IF NOT EXISTS watches (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  telegram_user_id INTEGER NOT NULL,
+  kind TEXT NOT NULL,
+  target_tag TEXT NOT NULL,
+  threshold INTEGER NOT NULL DEFAULT 0,
+  state TEXT,
+  created_at TEXT NOT NULL,
+  UNIQUE(telegram_user_id, kind, target_tag, threshold)
+);
+
+-- рассылки: текст хранится один раз, в outbox — только адресаты
+CREATE TABLE IF NOT EXISTS broadcasts (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  text TEXT NOT NULL,
+  created_by INTEGER NOT NULL,
+  total INTEGER NOT NULL DEFAULT 0,
+  sent INTEGER NOT NULL DEFAULT 0,
+  failed INTEGER NOT NULL DEFAULT 0,
+  created_at TEXT NOT NULL
+);
+
+-- исходящие сообщения, ещё не доставленные (доставленные удаляются).
+-- status: queued -> leased (в памяти отправителя) -> sending (ушёл запрос в Telegram)
+CREATE TABLE IF NOT EXISTS outbox (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  chat_id INTEGER NOT NULL,
+  text TEXT,
+  broadcast_id INTEGER,
+  priority INTEGER NOT NULL,
+  status TEXT NOT NULL,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  available_at REAL NOT NULL,
+  FOREIGN KEY(broadcast_id) REFERENCES broadcasts(id)
+);
+
+-- готовый текст /profile и его агрегаты (JSON) для снапшота; snapshot_hash — версия формата и хеш
+-- (см. app/services/profile_text.py); строка на тег — хеш сменился, строка перезаписывается
+CREATE TABLE IF NOT EXISTS profile_text (
+  player_tag TEXT PRIMARY KEY,
+  snapshot_hash TEXT NOT NULL,
+  text TEXT NOT NULL,
+  aggregates TEXT NOT NULL
+) WITHOUT ROWID;
+
+-- file_id картинок, уже загруженных в Telegram: их можно переслать (и отдать в inline) без загрузки
+CREATE TABLE IF NOT EXISTS telegram_files (
+  player_tag TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  file_id TEXT NOT NULL,
+  created_at TEXT NOT NULL,
+  PRIMARY KEY(player_tag, kind)
+) WITHOUT ROWID;
+
 CREATE INDEX IF NOT EXISTS idx_accounts_user ON accounts(telegram_user_id);
+CREATE INDEX IF NOT EXISTS idx_accounts_tag ON accounts(player_tag);
+CREATE INDEX IF NOT EXISTS idx_jobs_pick ON jobs(status, priority, available_at);
+-- основная сортировка /find; фильтруемые колонки лежат в самом индексе — до строки таблицы
+-- доходим только для подошедших игроков. Отдельного индекса по clan_tag нет намеренно:
+-- с ним планировщик выбирает его и сортирует всю выборку
+CREATE INDEX IF NOT EXISTS idx_player_index_trophies ON player_index(
+  trophies, player_tag, cards_16, cards_15, cards_14, evo_count, hero_count, exp_level, clan_tag
+);
+CREATE INDEX IF NOT EXISTS idx_player_index_best ON player_index(best_trophies, player_tag);
+CREATE INDEX IF NOT EXISTS idx_player_index_cards16 ON player_index(cards_16, player_tag);
+CREATE INDEX IF NOT EXISTS idx_battle_players_deck ON battle_players(player_tag, deck_id, outcome);
+CREATE INDEX IF NOT EXISTS idx_watches_user ON watches(telegram_user_id);
+CREATE INDEX IF NOT EXISTS idx_outbox_pick ON outbox(status, priority, id);
 """
 
+PLAYER_INDEX_COLUMNS = (
+    "player_tag, name, trophies, best_trophies, exp_level, clan_tag, "
+    "cards_14, cards_15, cards_16, evo_count, hero_count"
+)
+
+STREAM_BATCH = 1000
+
+# запросы по истории боёв (Database.deck_winrates / war_day_battles); планы проверяет bench.battlelog
+DECK_WINRATES_SQL = """
+SELECT s.deck_id, d.cards, s.battles, s.wins
+FROM (
+    SELECT deck_id, COUNT(*) AS battles, SUM(outcome = 1) AS wins
+    FROM battle_players
+    WHERE player_tag=? AND deck_id IS NOT NULL
+    GROUP BY deck_id
+    ORDER BY battles DESC
+    LIMIT ?
+) s
+JOIN decks d ON d.id = s.deck_id
+ORDER BY s.battles DESC
+"""
+
+WAR_DAY_BATTLES_SQL = """
+SELECT date(b.battle_time - ?, 'unixepoch') AS day, COUNT(*), SUM(bp.outcome = 1)
+FROM battle_players bp
+JOIN battles b ON b.id = bp.battle_id
+WHERE bp.player_tag=? AND b.is_war=1 AND b.battle_time>=?
+GROUP BY day
+ORDER BY day
+"""
+
+# аккаунты пользователей в памяти (см. Database.list_accounts): сколько пользователей держим
+ACCOUNT_CACHE_SIZE = 10000
+# last_seen_at пишем не чаще раза в столько секунд на пользователя
+ACTIVITY_WRITE_INTERVAL = 60.0
+# последнее состояние прогресса по тегу (см. Database._record_progress): сколько тегов держим
+PROGRESS_CACHE_SIZE = 2048
+
+# миграция с полным VACUUM — её можно отложить (Database.init(auto_vacuum_migration=False))
+AUTO_VACUUM_MIGRATION = 2
+
+WAL_CHECKPOINT_MODES = ("PASSIVE", "FULL", "RESTART", "TRUNCATE")
+ANALYZE_LIMIT = 1000
+
+
+def _instrument_queries(cls):
+    """Оборачивает все публичные async-методы: время каждой операции уходит в метрики."""
+
+    def wrap(name, fn):
+        @functools.wraps(fn)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                DB_QUERY_SECONDS.observe(time.perf_counter() - started, op=name)
+
+        return timed
+
+    for name, fn in list(vars(cls).items()):
+        if not name.startswith("_") and inspect.iscoroutinefunction(fn):
+            setattr(cls, name, wrap(name, fn))
+    return cls
+
+
+@_instrument_queries
 class Database:
     def __init__(self, path: str):
         self.path = path
+        # пользователь -> его аккаунты. Привязку меняет только процесс бота (хендлеры),
+        # поэтому кеш сбрасывается в add_account/remove_account и другой инвалидации не нужно
+        self._accounts: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+        # пользователь -> когда последний раз записали его активность (monotonic)
+        self._seen: Dict[int, float] = {}
+        # тег -> (ts последней записи, ts её ключевого кадра, записей с кадра, состояние после неё)
+        self._progress_tips: "OrderedDict[str, Tuple[int, int, int, progression.PlayerState]]" = OrderedDict()
 
-    async def init(self) -> None:
+    async def init(self, auto_vacuum_migration: bool = True) -> None:
+        """auto_vacuum_migration=False — отложить миграцию AUTO_VACUUM_MIGRATION (полный VACUUM)."""
         async with aiosqlite.connect(self.path) as db:
             await db.executescript(SCHEMA_SQL)
             await db.commit()
+            skip = () if auto_vacuum_migration else (AUTO_VACUUM_MIGRATION,)
+            await migrations.upgrade(db, MIGRATIONS, skip=skip)
+
+    async def run_backfills(
+        self, batch: int = migrations.BACKFILL_BATCH, pause: float = migrations.BACKFILL_PAUSE
+    ) -> int:
+        """Фоновая часть миграций (пачками, с курсором); зовётся после старта, а не в init."""
+        return await migrations.run_backfills(self.path, MIGRATIONS, batch=batch, pause=pause)
 
     async def ensure_user(self, telegram_user_id: int) -> None:
+        # пользователь уже есть, а минутная точность last_seen_at фоновому обновлению достаточна
+        seen = self._seen.get(telegram_user_id)
+        if seen is not None and time.monotonic() - seen < ACTIVITY_WRITE_INTERVAL:
+            return
+        now = datetime.utcnow().isoformat()
         async with aiosqlite.connect(self.path) as db:
             await db.execute(
                 "INSERT OR IGNORE INTO users(telegram_user_id, created_at) VALUES(?, ?)",
-                (telegram_user_id, datetime.utcnow().isoformat()),
+                (telegram_user_id, now),
+            )
+            # последнее обращение — по нему фоновое обновление решает, чьи аккаунты освежать чаще
+            await db.execute(
+                """
+                INSERT INTO user_activity(telegram_user_id, last_seen_at) VALUES(?, ?)
+                ON CONFLICT(telegram_user_id) DO UPDATE SET last_seen_at=excluded.last_seen_at
+                """,
+                (telegram_user_id, now),
             )
             await db.commit()
+            # за ensure_user почти всегда идёт list_accounts — холодный кеш заполняем этим же соединением
+            if telegram_user_id not in self._accounts:
+                self._remember_accounts(telegram_user_id, await self._select_accounts(db, telegram_user_id))
+        if len(self._seen) >= ACCOUNT_CACHE_SIZE:
+            self._seen.clear()
+        self._seen[telegram_user_id] = time.monotonic()
 
     async def count_accounts(self, telegram_user_id: int) -> int:
-        async with aiosqlite.connect(self.path) as db:
-            cur = await db.execute(
-                "SELECT COUNT(*) FROM accounts WHERE telegram_user_id=?",
-                (telegram_user_id,),
-            )
-            row = await cur.fetchone()
-            return int(row[0]) if row else 0
+        return len(await self.list_accounts(telegram_user_id))
+
+    async def owns_account(self, telegram_user_id: int, tag: str) -> bool:
+        """Привязан ли tag к пользователю (для callback-кнопок: тег в callback_data не доверенный)."""
+        tag = normalize_player_tag(tag)
+        return any(normalize_player_tag(a["tag"]) == tag for a in await self.list_accounts(telegram_user_id))
 
     async def add_account(self, telegram_user_id: int, tag: str, name: str) -> None:
         async with aiosqlite.connect(self.path) as db:
@@ -74,6 +341,7 @@ class Database:
                 ),
             )
             await db.commit()
+        self._accounts.pop(telegram_user_id, None)
 
     async def remove_account(self, telegram_user_id: int, tag: str) -> bool:
         async with aiosqlite.connect(self.path) as db:
@@ -82,6 +350,7 @@ class Database:
                 (telegram_user_id, tag),
             )
             await db.commit()
+        self._accounts.pop(telegram_user_id, None)
 
         # ✅ чистим кеш для этого тега (чтобы не копился мусор)
         await self.delete_player_cache(tag)
@@ -89,18 +358,42 @@ class Database:
         return cur.rowcount > 0
 
     async def list_accounts(self, telegram_user_id: int) -> List[Dict[str, Any]]:
+        cached = self._accounts.get(telegram_user_id)
+        cache_hit("db_accounts", cached is not None)
+        if cached is not None:
+            self._accounts.move_to_end(telegram_user_id)
+            return [dict(a) for a in cached]
         async with aiosqlite.connect(self.path) as db:
-            cur = await db.execute(
-                """
-                SELECT player_tag, COALESCE(player_name_cached, '') as name, linked_at
-                FROM accounts
-                WHERE telegram_user_id=?
-                ORDER BY id ASC
-                """,
-                (telegram_user_id,),
-            )
-            rows = await cur.fetchall()
-            return [{"tag": r[0], "name": r[1], "linked_at": r[2]} for r in rows]
+            accounts = await self._select_accounts(db, telegram_user_id)
+        self._remember_accounts(telegram_user_id, accounts)
+        return [dict(a) for a in accounts]
+
+    def _remember_accounts(self, telegram_user_id: int, accounts: List[Dict[str, Any]]) -> None:
+        self._accounts[telegram_user_id] = accounts
+        if len(self._accounts) > ACCOUNT_CACHE_SIZE:
+            self._accounts.popitem(last=False)
+
+    def _cached_names(self, tag: str, name: str, telegram_user_id: Optional[int] = None) -> None:
+        # ник в кеше правим на месте — перечитывать аккаунты из-за него незачем
+        users = [telegram_user_id] if telegram_user_id is not None else list(self._accounts)
+        for uid in users:
+            for a in self._accounts.get(uid) or ():
+                if a["tag"] == tag:
+                    a["name"] = name
+
+    @staticmethod
+    async def _select_accounts(db: aiosqlite.Connection, telegram_user_id: int) -> List[Dict[str, Any]]:
+        cur = await db.execute(
+            """
+            SELECT player_tag, COALESCE(player_name_cached, '') as name, linked_at
+            FROM accounts
+            WHERE telegram_user_id=?
+            ORDER BY id ASC
+            """,
+            (telegram_user_id,),
+        )
+        rows = await cur.fetchall()
+        return [{"tag": r[0], "name": r[1], "linked_at": r[2]} for r in rows]
 
     async def get_first_account(self, telegram_user_id: int) -> Optional[Dict[str, Any]]:
         async with aiosqlite.connect(self.path) as db:
@@ -130,24 +423,813 @@ class Database:
                 (name, datetime.utcnow().isoformat(), telegram_user_id, tag),
             )
             await db.commit()
+        self._cached_names(tag, name, telegram_user_id)
+
+    async def list_refresh_candidates(self) -> List[Dict[str, Any]]:
+        """
+        Все привязанные теги (без повторов) для фонового обновления:
+        когда их владельцы последний раз заходили и когда снапшот последний раз обновлялся.
+        """
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                """
+                SELECT a.player_tag,
+                       MAX(u.last_seen_at) AS last_seen_at,
+                       MAX(MAX(COALESCE(a.last_refresh_at, '')), COALESCE(MAX(pc.updated_at), '')) AS refreshed_at
+                FROM accounts a
+                LEFT JOIN user_activity u ON u.telegram_user_id = a.telegram_user_id
+                LEFT JOIN player_cache pc ON pc.player_tag = a.player_tag
+                GROUP BY a.player_tag
+                """
+            )
+            rows = await cur.fetchall()
+            return [
+                {"tag": r[0], "last_seen_at": r[1], "refreshed_at": r[2] or None}
+                for r in rows
+            ]
+
+    async def mark_refreshed(self, tag: str, name: str) -> None:
+        """Снапшот тега обновлён фоном: освежаем ник и last_refresh_at у всех, кто его привязал."""
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute(
+                "UPDATE accounts SET player_name_cached=?, last_refresh_at=? WHERE player_tag=?",
+                (name, datetime.utcnow().isoformat(), tag),
+            )
+            await db.commit()
+        self._cached_names(tag, name)
 
     # -------- player_cache --------
 
-    async def cache_player_json(self, tag: str, data: dict) -> None:
+    async def cache_player_json(self, tag: str, data: dict) -> str:
+        """Сохраняет снапшот; возвращает JSON в том виде, в каком он лёг в player_cache."""
+        now = datetime.utcnow().isoformat()
+        raw = codec.dumps(data)
         async with aiosqlite.connect(self.path) as db:
             await db.execute(
                 "INSERT OR REPLACE INTO player_cache(player_tag, json, updated_at) VALUES(?, ?, ?)",
-                (tag, json.dumps(data, ensure_ascii=False), datetime.utcnow().isoformat()),
+                (tag, raw, now),
             )
+            await self._upsert_player_index(db, tag, data, now)
+            await self._record_progress(db, tag, data, int(time.time() * 1000))
             await db.commit()
+        return raw
 
-    async def get_cached_player_json(self, tag: str) -> dict | None:
+    @staticmethod
+    async def _upsert_player_index(db: aiosqlite.Connection, tag: str, data: dict, now: str) -> None:
+        row = player_index_row(data)
+        await db.execute(
+            """
+            INSERT OR REPLACE INTO player_index(
+                player_tag, name, trophies, best_trophies, exp_level, clan_tag,
+                cards_14, cards_15, cards_16, evo_count, hero_count, updated_at
+            ) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                tag,
+                row["name"],
+                row["trophies"],
+                row["best_trophies"],
+                row["exp_level"],
+                row["clan_tag"],
+                row["cards_14"],
+                row["cards_15"],
+                row["cards_16"],
+                row["evo_count"],
+                row["hero_count"],
+                now,
+            ),
+        )
+
+    @staticmethod
+    async def _progress_chain(db: aiosqlite.Connection, tag: str, since_ms: int) -> list:
+        """Записи прогресса от последнего ключевого кадра не позже since_ms (или от первого) до конца."""
+        cur = await db.execute(
+            """
+            SELECT ts, kind, data FROM progress
+            WHERE player_tag=? AND ts >= COALESCE(
+                (SELECT MAX(ts) FROM progress WHERE player_tag=? AND kind=? AND ts<=?),
+                (SELECT MIN(ts) FROM progress WHERE player_tag=? AND kind=?),
+                0
+            )
+            ORDER BY ts
+            """,
+            (tag, tag, progression.KIND_KEYFRAME, since_ms, tag, progression.KIND_KEYFRAME),
+        )
+        return await cur.fetchall()
+
+    async def _progress_tip(
+        self, db: aiosqlite.Connection, tag: str, now_ms: int
+    ) -> Optional[Tuple[int, int, int, progression.PlayerState]]:
+        """Последняя запись прогресса тега: из памяти, если она всё ещё последняя в базе, иначе — replay цепочки."""
+        tip = self._progress_tips.get(tag)
+        if tip is not None:
+            # прогресс пишут и воркеры: состояние в памяти годится, только если после него никто не писал
+            cur = await db.execute("SELECT MAX(ts) FROM progress WHERE player_tag=?", (tag,))
+            row = await cur.fetchone()
+            if row is None or row[0] != tip[0]:
+                tip = None
+        cache_hit("db_progress", tip is not None)
+        if tip is not None:
+            self._progress_tips.move_to_end(tag)
+            return tip
+        chain = await self._progress_chain(db, tag, now_ms)
+        if not chain:
+            return None
+        return chain[-1][0], chain[0][0], len(chain), progression.replay(chain)[-1][1]
+
+    async def _record_progress(self, db: aiosqlite.Connection, tag: str, data: dict, now_ms: int) -> None:
+        state = progression.state_from_player(data)
+        tip = await self._progress_tip(db, tag, now_ms)
+        if tip is None:
+            kind, blob = progression.KIND_KEYFRAME, progression.encode(state)
+        else:
+            _, keyframe_ts, length, last = tip
+            changed = progression.diff(last, state)
+            if changed is None:
+                return  # ничего не поменялось — ничего и не пишем
+            if length > progression.KEYFRAME_EVERY or now_ms - keyframe_ts > progression.KEYFRAME_MAX_AGE_MS:
+                kind, blob = progression.KIND_KEYFRAME, progression.encode(state)
+            else:
+                kind, blob = progression.KIND_DELTA, progression.encode(state, changed)
+        cur = await db.execute(
+            "INSERT OR IGNORE INTO progress(player_tag, ts, kind, data) VALUES(?, ?, ?, ?)",
+            (tag, now_ms, kind, blob),
+        )
+        if cur.rowcount != 1:
+            # в эту миллисекунду уже писали — последнее состояние в памяти не знаем
+            self._progress_tips.pop(tag, None)
+            return
+        # если транзакция откатится, MAX(ts) в базе не совпадёт с этим ts и следующая запись сделает replay
+        if kind == progression.KIND_KEYFRAME:
+            self._progress_tips[tag] = (now_ms, now_ms, 1, state)
+        else:
+            self._progress_tips[tag] = (now_ms, keyframe_ts, length + 1, state)
+        self._progress_tips.move_to_end(tag)
+        if len(self._progress_tips) > PROGRESS_CACHE_SIZE:
+            self._progress_tips.popitem(last=False)
+
+    async def get_progress(self, tag: str, since_ms: int) -> list:
+        """(ts, kind, data) для восстановления состояний с момента since_ms (см. progression.replay)."""
+        async with aiosqlite.connect(self.path) as db:
+            return await self._progress_chain(db, tag, since_ms)
+
+    @staticmethod
+    def _find_sql(query: FindQuery, after: Optional[tuple] = None) -> tuple:
+        where: List[str] = []
+        params: List[Any] = []
+        for col, op, value in query.filters:
+            where.append(f"{col} {op} ?")  # col и op — только из белых списков parse_find_args
+            params.append(value)
+        if query.no_clan:
+            where.append("clan_tag IS NULL")
+        if after is not None:
+            # row value по тому же порядку, что и индекс (col, player_tag) — SQLite идёт диапазоном
+            where.append(f"({query.sort}, player_tag) < (?, ?)")
+            params += [after[0], after[1]]
+
+        sql = f"SELECT {PLAYER_INDEX_COLUMNS} FROM player_index"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {query.sort} DESC, player_tag DESC"
+        return sql, params
+
+    async def find_players(
+        self,
+        query: FindQuery,
+        after: Optional[tuple] = None,
+        limit: int = 10,
+    ) -> List[Dict[str, Any]]:
+        """
+        Поиск по player_index. Сортировка по query.sort по убыванию, пагинация keyset:
+        after=(значение сортировки, тег) последней строки предыдущей страницы.
+        """
+        sql, params = self._find_sql(query, after)
+        async with aiosqlite.connect(self.path) as db:
+            db.row_factory = aiosqlite.Row
+            cur = await db.execute(sql + " LIMIT ?", [*params, limit])
+            return [dict(r) for r in await cur.fetchall()]
+
+    async def get_player_index(self, tag: str, max_age_seconds: float) -> Optional[Dict[str, Any]]:
+        """Готовые агрегаты игрока из player_index (без разбора снапшота), если они не старше max_age_seconds."""
+        min_updated = datetime.utcfromtimestamp(time.time() - max_age_seconds).isoformat()
+        async with aiosqlite.connect(self.path) as db:
+            db.row_factory = aiosqlite.Row
+            cur = await db.execute(
+                f"SELECT {PLAYER_INDEX_COLUMNS}, updated_at FROM player_index WHERE player_tag=? AND updated_at>=?",
+                (tag, min_updated),
+            )
+            row = await cur.fetchone()
+            cache_hit("db_player_index", row is not None)
+            return dict(row) if row else None
+
+    # -------- telegram_files --------
+
+    async def save_file_id(self, tag: str, kind: str, file_id: str) -> None:
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO telegram_files(player_tag, kind, file_id, created_at) VALUES(?, ?, ?, ?)",
+                (tag, kind, file_id, datetime.utcnow().isoformat()),
+            )
+            await db.commit()
+
+    async def get_file_id(self, tag: str, kind: str) -> Optional[str]:
         async with aiosqlite.connect(self.path) as db:
-            cur = await db.execute("SELECT json FROM player_cache WHERE player_tag=?", (tag,))
+            cur = await db.execute(
+                "SELECT file_id FROM telegram_files WHERE player_tag=? AND kind=?", (tag, kind)
+            )
             row = await cur.fetchone()
-            return json.loads(row[0]) if row else None
+            return row[0] if row else None
+
+    # -------- выгрузки (строки идут потоком, пачками по STREAM_BATCH) --------
+
+    async def _stream(self, sql: str, params: Sequence[Any] = ()) -> AsyncIterator[tuple]:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(sql, params)
+            while True:
+                rows = await cur.fetchmany(STREAM_BATCH)
+                if not rows:
+                    return
+                for row in rows:
+                    yield row
+
+    def iter_candidates(self, query: FindQuery) -> AsyncIterator[tuple]:
+        """Все игроки из player_index под фильтр /find, в порядке PLAYER_INDEX_COLUMNS."""
+        sql, params = self._find_sql(query)
+        return self._stream(sql, params)
+
+    def iter_accounts(self) -> AsyncIterator[tuple]:
+        """Привязанные аккаунты вместе с колонками player_index (если снапшот есть)."""
+        return self._stream(
+            f"""
+            SELECT a.telegram_user_id, a.player_tag, COALESCE(a.player_name_cached, ''), a.linked_at,
+                   pi.trophies, pi.best_trophies, pi.exp_level, pi.clan_tag,
+                   pi.cards_14, pi.cards_15, pi.cards_16, pi.evo_count, pi.hero_count, pi.updated_at
+            FROM accounts a
+            LEFT JOIN player_index pi ON pi.player_tag = a.player_tag
+            ORDER BY a.id
+            """
+        )
+
+    async def _player_raw(self, tag: str, max_age_seconds: Optional[float], cache: str) -> str | None:
+        sql, params = "SELECT json FROM player_cache WHERE player_tag=?", [tag]
+        if max_age_seconds is not None:
+            sql += " AND updated_at>=?"
+            params.append(datetime.utcfromtimestamp(time.time() - max_age_seconds).isoformat())
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(sql, params)
+            row = await cur.fetchone()
+            cache_hit(cache, row is not None)
+            return row[0] if row else None
+
+    async def get_cached_player_raw(self, tag: str) -> str | None:
+        """JSON снапшота как есть, без разбора (по нему считается хеш для profile_text)."""
+        return await self._player_raw(tag, None, "db_player_cache")
+
+    async def get_fresh_player_raw(self, tag: str, max_age_seconds: float) -> str | None:
+        return await self._player_raw(tag, max_age_seconds, "db_player_fresh")
+
+    async def get_cached_player_json(self, tag: str) -> dict | None:
+        raw = await self._player_raw(tag, None, "db_player_cache")
+        return codec.loads(raw) if raw else None
+
+    async def get_fresh_player_json(self, tag: str, max_age_seconds: float) -> dict | None:
+        """Снапшот из кеша, только если он не старше max_age_seconds."""
+        raw = await self._player_raw(tag, max_age_seconds, "db_player_fresh")
+        return codec.loads(raw) if raw else None
 
     async def delete_player_cache(self, tag: str) -> None:
         async with aiosqlite.connect(self.path) as db:
             await db.execute("DELETE FROM player_cache WHERE player_tag=?", (tag,))
+            await db.execute("DELETE FROM player_index WHERE player_tag=?", (tag,))
+            await db.execute("DELETE FROM profile_text WHERE player_tag=?", (tag,))
+            await db.commit()
+
+    # -------- profile_text --------
+
+    async def get_profile_text(self, tag: str, snapshot_hash: str) -> Optional[tuple]:
+        """(text, aggregates) для снапшота с этим хешем, если уже считали."""
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                "SELECT text, aggregates FROM profile_text WHERE player_tag=? AND snapshot_hash=?",
+                (tag, snapshot_hash),
+            )
+            row = await cur.fetchone()
+            cache_hit("db_profile_text", row is not None)
+            return (row[0], codec.loads(row[1])) if row else None
+
+    async def save_profile_text(self, tag: str, snapshot_hash: str, text: str, aggregates: dict) -> None:
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO profile_text(player_tag, snapshot_hash, text, aggregates) VALUES(?, ?, ?, ?)",
+                (tag, snapshot_hash, text, codec.dumps(aggregates)),
+            )
+            await db.commit()
+
+    # -------- battlelog --------
+
+    async def get_battlelog_cursor(self, tag: str) -> int:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                "SELECT last_battle_time FROM battlelog_cursor WHERE player_tag=?", (tag,)
+            )
+            row = await cur.fetchone()
+            return int(row[0]) if row else 0
+
+    async def save_battles(self, tag: str, battles: List[Dict[str, Any]], cursor: int) -> int:
+        """
+        Сохраняет разобранные бои (см. app.services.battlelog.parse_battle) одной транзакцией
+        и сдвигает курсор тега. Уже известные бои пропускаются. Возвращает число новых боёв.
+        """
+        added = 0
+        async with aiosqlite.connect(self.path) as db:
+            names = {cid: name for b in battles for p in b["players"] for cid, name in p["card_names"]}
+            if names:
+                await db.executemany(
+                    "INSERT OR IGNORE INTO cards(id, name) VALUES(?, ?)", list(names.items())
+                )
+
+            for b in battles:
+                cur = await db.execute(
+                    """
+                    INSERT OR IGNORE INTO battles(battle_key, battle_time, type, game_mode_id, is_war)
+                    VALUES(?, ?, ?, ?, ?)
+                    """,
+                    (b["key"], b["time"], b["type"], b["game_mode_id"], int(b["is_war"])),
+                )
+                if not cur.rowcount:
+                    continue  # бой уже записан из battlelog другого нашего игрока
+                battle_id = cur.lastrowid
+                added += 1
+
+                rows = []
+                for p in b["players"]:
+                    deck_id = None
+                    if p["deck"]:
+                        cur = await db.execute(
+                            """
+                            INSERT INTO decks(cards) VALUES(?)
+                            ON CONFLICT(cards) DO UPDATE SET cards=excluded.cards
+                            RETURNING id
+                            """,
+                            (p["deck"],),
+                        )
+                        deck_id = (await cur.fetchone())[0]
+                    rows.append((battle_id, p["tag"], p["side"], p["crowns"], p["outcome"], deck_id))
+                await db.executemany(
+                    """
+                    INSERT OR IGNORE INTO battle_players(battle_id, player_tag, side, crowns, outcome, deck_id)
+                    VALUES(?, ?, ?, ?, ?, ?)
+                    """,
+                    rows,
+                )
+
+            await db.execute(
+                """
+                INSERT INTO battlelog_cursor(player_tag, last_battle_time, polled_at) VALUES(?, ?, ?)
+                ON CONFLICT(player_tag) DO UPDATE SET
+                    last_battle_time=MAX(last_battle_time, excluded.last_battle_time),
+                    polled_at=excluded.polled_at
+                """,
+                (tag, cursor, datetime.utcnow().isoformat()),
+            )
             await db.commit()
+        return added
+
+    async def deck_winrates(self, tag: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Самые частые колоды игрока: число боёв и побед (считается по idx_battle_players_deck)."""
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(DECK_WINRATES_SQL, (tag, limit))
+            rows = await cur.fetchall()
+            return [{"deck_id": r[0], "cards": r[1], "battles": r[2], "wins": r[3]} for r in rows]
+
+    async def get_card_names(self, card_ids: List[int]) -> Dict[int, str]:
+        if not card_ids:
+            return {}
+        marks = ",".join("?" * len(card_ids))
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(f"SELECT id, name FROM cards WHERE id IN ({marks})", list(card_ids))
+            return {r[0]: r[1] for r in await cur.fetchall()}
+
+    async def war_day_battles(self, tag: str, since: int, day_offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Бои КВ игрока по дням начиная с unix-времени since.
+        day_offset (секунды) сдвигает границу суток: день КВ начинается не в полночь UTC.
+        """
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(WAR_DAY_BATTLES_SQL, (day_offset, tag, since))
+            rows = await cur.fetchall()
+            return [{"day": r[0], "battles": r[1], "wins": r[2]} for r in rows]
+
+    # -------- watches (подписки на события по игрокам и кланам) --------
+
+    async def add_watch(
+        self, telegram_user_id: int, kind: str, target_tag: str, threshold: int, state: Any
+    ) -> Optional[Dict[str, Any]]:
+        """Новая подписка; None, если такая же у пользователя уже есть."""
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                """
+                INSERT INTO watches(telegram_user_id, kind, target_tag, threshold, state, created_at)
+                VALUES(?, ?, ?, ?, ?, ?)
+                ON CONFLICT(telegram_user_id, kind, target_tag, threshold) DO NOTHING
+                RETURNING id
+                """,
+                (
+                    telegram_user_id,
+                    kind,
+                    target_tag,
+                    threshold,
+                    codec.dumps(state) if state is not None else None,
+                    datetime.utcnow().isoformat(),
+                ),
+            )
+            row = await cur.fetchone()
+            await db.commit()
+            if not row:
+                return None
+            return {
+                "id": row[0],
+                "user_id": telegram_user_id,
+                "kind": kind,
+                "tag": target_tag,
+                "threshold": threshold,
+                "state": state,
+            }
+
+    @staticmethod
+    def _watch_row(r) -> Dict[str, Any]:
+        return {
+            "id": r[0],
+            "user_id": r[1],
+            "kind": r[2],
+            "tag": r[3],
+            "threshold": r[4],
+            "state": codec.loads(r[5]) if r[5] is not None else None,
+        }
+
+    async def list_watches(self, telegram_user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Подписки пользователя или (без аргумента) все — для планировщика."""
+        sql = "SELECT id, telegram_user_id, kind, target_tag, threshold, state FROM watches"
+        params: tuple = ()
+        if telegram_user_id is not None:
+            sql += " WHERE telegram_user_id=?"
+            params = (telegram_user_id,)
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(sql + " ORDER BY id", params)
+            return [self._watch_row(r) for r in await cur.fetchall()]
+
+    async def count_watches(self, telegram_user_id: int) -> int:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute("SELECT COUNT(*) FROM watches WHERE telegram_user_id=?", (telegram_user_id,))
+            row = await cur.fetchone()
+            return int(row[0]) if row else 0
+
+    async def delete_watch(self, telegram_user_id: int, watch_id: int) -> bool:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                "DELETE FROM watches WHERE id=? AND telegram_user_id=?", (watch_id, telegram_user_id)
+            )
+            await db.commit()
+            return cur.rowcount > 0
+
+    async def save_watch_states(self, states: Dict[int, Any]) -> None:
+        """Новые state пачкой — все подписки на один тег после одного опроса."""
+        if not states:
+            return
+        async with aiosqlite.connect(self.path) as db:
+            await db.executemany(
+                "UPDATE watches SET state=? WHERE id=?",
+                [(codec.dumps(st), wid) for wid, st in states.items()],
+            )
+            await db.commit()
+
+    # -------- outbox (исходящие уведомления и рассылки) --------
+
+    async def outbox_put(self, chat_id: int, text: str, priority: int) -> int:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                "INSERT INTO outbox(chat_id, text, priority, status, available_at) VALUES(?, ?, ?, 'queued', ?)",
+                (chat_id, text, priority, time.time()),
+            )
+            await db.commit()
+            return int(cur.lastrowid)
+
+    async def create_broadcast(self, text: str, created_by: int, priority: int) -> Dict[str, int]:
+        """Рассылка всем из users: одна строка outbox на адресата, вставка одним запросом."""
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                "INSERT INTO broadcasts(text, created_by, created_at) VALUES(?, ?, ?)",
+                (text, created_by, datetime.utcnow().isoformat()),
+            )
+            broadcast_id = int(cur.lastrowid)
+            cur = await db.execute(
+                """
+                INSERT INTO outbox(chat_id, broadcast_id, priority, status, available_at)
+                SELECT telegram_user_id, ?, ?, 'queued', ? FROM users
+                """,
+                (broadcast_id, priority, time.time()),
+            )
+            total = cur.rowcount
+            await db.execute("UPDATE broadcasts SET total=? WHERE id=?", (total, broadcast_id))
+            await db.commit()
+            return {"id": broadcast_id, "total": total}
+
+    async def outbox_recover(self) -> int:
+        """
+        После рестарта: leased — ещё не отправлялись, возвращаем в очередь.
+        sending — запрос в Telegram ушёл, а ответа мы не дождались; скорее всего сообщение
+        доставлено, поэтому считаем отправленным: лучше потерять одно, чем задублировать.
+        """
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute("UPDATE outbox SET status='queued' WHERE status='leased'")
+            await db.execute(
+                """
+                UPDATE broadcasts SET sent = sent + (
+                    SELECT COUNT(*) FROM outbox o WHERE o.broadcast_id = broadcasts.id AND o.status='sending'
+                )
+                WHERE id IN (SELECT broadcast_id FROM outbox WHERE status='sending')
+                """
+            )
+            cur = await db.execute("DELETE FROM outbox WHERE status='sending'")
+            await db.commit()
+            return cur.rowcount
+
+    async def outbox_lease(self, limit: int) -> List[Dict[str, Any]]:
+        """Забирает в память до limit готовых сообщений, самые приоритетные первыми."""
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                """
+                UPDATE outbox SET status='leased'
+                WHERE id IN (
+                    SELECT id FROM outbox
+                    WHERE status='queued' AND available_at<=?
+                    ORDER BY priority, id
+                    LIMIT ?
+                )
+                RETURNING id, chat_id, COALESCE(text, (SELECT b.text FROM broadcasts b WHERE b.id = broadcast_id)),
+                          broadcast_id, priority, attempts
+                """,
+                (time.time(), limit),
+            )
+            rows = await cur.fetchall()
+            await db.commit()
+            out = [
+                {"id": r[0], "chat_id": r[1], "text": r[2], "broadcast_id": r[3], "priority": r[4], "attempts": r[5]}
+                for r in rows
+            ]
+            out.sort(key=lambda m: (m["priority"], m["id"]))
+            return out
+
+    async def outbox_mark_sending(self, message_id: int) -> None:
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute(
+                "UPDATE outbox SET status='sending', attempts=attempts+1 WHERE id=?", (message_id,)
+            )
+            await db.commit()
+
+    async def outbox_retry(self, message_id: int, delay: float) -> None:
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute(
+                "UPDATE outbox SET status='queued', available_at=? WHERE id=?", (time.time() + delay, message_id)
+            )
+            await db.commit()
+
+    async def outbox_finish(self, message_id: int, broadcast_id: Optional[int], ok: bool) -> None:
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute("DELETE FROM outbox WHERE id=?", (message_id,))
+            if broadcast_id is not None:
+                col = "sent" if ok else "failed"
+                await db.execute(f"UPDATE broadcasts SET {col} = {col} + 1 WHERE id=?", (broadcast_id,))
+            await db.commit()
+
+    async def list_broadcasts(self, limit: int = 5) -> List[Dict[str, Any]]:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                "SELECT id, text, total, sent, failed, created_at FROM broadcasts ORDER BY id DESC LIMIT ?",
+                (limit,),
+            )
+            return [
+                {"id": r[0], "text": r[1], "total": r[2], "sent": r[3], "failed": r[4], "created_at": r[5]}
+                for r in await cur.fetchall()
+            ]
+
+    # -------- jobs (очередь тяжёлых задач для воркеров) --------
+    # status: queued -> running -> done | failed (или обратно в queued для ретрая)
+
+    async def enqueue_job(
+        self, kind: str, payload: dict, priority: int = 0, max_attempts: int = 3
+    ) -> int:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                """
+                INSERT INTO jobs(kind, payload, priority, status, max_attempts, available_at, created_at)
+                VALUES(?, ?, ?, 'queued', ?, ?, ?)
+                """,
+                (
+                    kind,
+                    codec.dumps(payload),
+                    priority,
+                    max_attempts,
+                    time.time(),
+                    datetime.utcnow().isoformat(),
+                ),
+            )
+            await db.commit()
+            return int(cur.lastrowid)
+
+    async def lease_job(self, worker_id: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """
+        Атомарно забирает самую приоритетную готовую задачу (или задачу с протухшей арендой —
+        значит, воркер умер) и отдаёт её воркеру на lease_seconds.
+        """
+        now = time.time()
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(
+                """
+                UPDATE jobs
+                SET status='running', attempts=attempts+1, lease_until=?, worker_id=?
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE (status='queued' AND available_at<=?)
+                       OR (status='running' AND lease_until<? AND attempts<max_attempts)
+                    ORDER BY priority DESC, id ASC
+                    LIMIT 1
+                )
+                RETURNING id, kind, payload, attempts, max_attempts
+                """,
+                (now + lease_seconds, worker_id, now, now),
+            )
+            row = await cur.fetchone()
+            await db.commit()
+            if not row:
+                return None
+            return {
+                "id": row[0],
+                "kind": row[1],
+                "payload": codec.loads(row[2]),
+                "attempts": row[3],
+                "max_attempts": row[4],
+            }
+
+    async def extend_job_lease(self, job_id: int, worker_id: str, lease_seconds: float) -> None:
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute(
+                "UPDATE jobs SET lease_until=? WHERE id=? AND worker_id=? AND status='running'",
+                (time.time() + lease_seconds, job_id, worker_id),
+            )
+            await db.commit()
+
+    async def complete_job(self, job_id: int, worker_id: str, result: Any) -> None:
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute(
+                """
+                UPDATE jobs
+                SET status='done', result=?, error=NULL, lease_until=NULL, finished_at=?
+                WHERE id=? AND worker_id=?
+                """,
+                (codec.dumps(result), datetime.utcnow().isoformat(), job_id, worker_id),
+            )
+            await db.commit()
+
+    async def fail_job(self, job_id: int, worker_id: str, error: str, retry_in: float) -> None:
+        """Ошибка: если попытки остались — вернём в очередь через retry_in секунд, иначе failed."""
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute(
+                """
+                UPDATE jobs
+                SET status=CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                    available_at=?,
+                    error=?,
+                    lease_until=NULL,
+                    finished_at=CASE WHEN attempts < max_attempts THEN NULL ELSE ? END
+                WHERE id=? AND worker_id=?
+                """,
+                (time.time() + retry_in, error[:2000], datetime.utcnow().isoformat(), job_id, worker_id),
+            )
+            await db.commit()
+
+    async def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute("SELECT status, result, error FROM jobs WHERE id=?", (job_id,))
+            row = await cur.fetchone()
+            if not row:
+                return None
+            return {
+                "status": row[0],
+                "result": codec.loads(row[1]) if row[1] is not None else None,
+                "error": row[2],
+            }
+
+    async def delete_job(self, job_id: int) -> None:
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute("DELETE FROM jobs WHERE id=?", (job_id,))
+            await db.commit()
+
+    async def purge_jobs(self, older_than_seconds: float) -> int:
+        """
+        Чистит завершённые задачи, результат которых уже никто не заберёт,
+        и задачи с протухшей арендой, исчерпавшие попытки.
+        """
+        now = time.time()
+        cutoff = datetime.utcfromtimestamp(now - older_than_seconds).isoformat()
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute(
+                """
+                UPDATE jobs SET status='failed', error='lease expired', finished_at=?
+                WHERE status='running' AND lease_until<? AND attempts>=max_attempts
+                """,
+                (datetime.utcnow().isoformat(), now),
+            )
+            cur = await db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at<?",
+                (cutoff,),
+            )
+            await db.commit()
+            return cur.rowcount
+
+    # -------- обслуживание файла (app/services/maintenance.py) --------
+
+    async def storage_stats(self) -> Dict[str, int]:
+        async with aiosqlite.connect(self.path) as db:
+            out = {}
+            for name in ("page_size", "page_count", "freelist_count", "auto_vacuum"):
+                cur = await db.execute(f"PRAGMA {name}")
+                out[name] = int((await cur.fetchone())[0])
+            return out
+
+    async def wal_checkpoint(self, mode: str = "PASSIVE") -> Tuple[int, int, int]:
+        """(busy, страниц в WAL, перенесено в базу); busy=1 — читатели или писатели не дали закончить."""
+        if mode not in WAL_CHECKPOINT_MODES:
+            raise ValueError(f"unknown checkpoint mode {mode!r}")
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute(f"PRAGMA wal_checkpoint({mode})")
+            busy, log_pages, checkpointed = await cur.fetchone()
+            return int(busy), int(log_pages), int(checkpointed)
+
+    async def incremental_vacuum(self, pages: int) -> int:
+        """Отдаёт системе до pages свободных страниц (нужен auto_vacuum=INCREMENTAL); возвращает сколько отдал."""
+        async with aiosqlite.connect(self.path) as db:
+            cur = await db.execute("PRAGMA freelist_count")
+            before = int((await cur.fetchone())[0])
+            # прагма освобождает по странице на шаг, а execute делает только первый;
+            # executescript шагает до конца
+            await db.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            cur = await db.execute("PRAGMA freelist_count")
+            return before - int((await cur.fetchone())[0])
+
+    async def analyze(self, limit: int = ANALYZE_LIMIT) -> None:
+        """Статистика для планировщика; analysis_limit — сколько строк индекса смотреть, а не все."""
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute(f"PRAGMA analysis_limit={int(limit)}")
+            if sqlite3.sqlite_version_info >= (3, 46, 0):
+                # с 3.46 optimize сам решает, какие таблицы пересчитать, и на свежем соединении
+                await db.execute("PRAGMA optimize=0x10002")
+            else:
+                await db.execute("ANALYZE")
+            await db.commit()
+
+
+# -------- миграции схемы (см. app/migrations.py) --------
+# версии идут подряд с 1; уже выпущенную миграцию не меняем — исправление делается следующей
+
+
+async def _backfill_player_index(
+    db: aiosqlite.Connection, cursor: Optional[str], batch: int
+) -> Tuple[Optional[str], int]:
+    # снапшоты, сохранённые до появления player_index, — в поиск /find.
+    # Идём по первичному ключу, а не «первые N без индекса» — иначе каждая пачка
+    # заново пробегала бы уже проиндексированные строки
+    cur = await db.execute(
+        """
+        SELECT pc.player_tag, pc.json, pc.updated_at, pi.player_tag IS NULL
+        FROM player_cache pc
+        LEFT JOIN player_index pi ON pi.player_tag = pc.player_tag
+        WHERE pc.player_tag > ?
+        ORDER BY pc.player_tag
+        LIMIT ?
+        """,
+        (cursor or "", batch),
+    )
+    rows = await cur.fetchall()
+    done = 0
+    for tag, raw, updated_at, missing in rows:
+        if missing:
+            await Database._upsert_player_index(db, tag, codec.loads(raw), updated_at)
+            done += 1
+    return (rows[-1][0] if len(rows) == batch else None), done
+
+
+MIGRATIONS: List[migrations.Migration] = [
+    migrations.Migration(1, "player_index for snapshots cached before it existed", backfill=_backfill_player_index),
+    # страницы, освобождённые удалениями, можно возвращать системе через incremental_vacuum;
+    # режим меняется только полным VACUUM (один раз, при старте, до приёма апдейтов;
+    # DB_AUTO_VACUUM_MIGRATION=0 откладывает его)
+    migrations.Migration(
+        AUTO_VACUUM_MIGRATION,
+        "auto_vacuum=INCREMENTAL",
+        sql=("PRAGMA auto_vacuum=INCREMENTAL", "VACUUM"),
+        transaction=False,
+    ),
+    # бои КВ считаются по игроку (idx_battle_players_deck), индекс по всем боям КВ не нужен планировщику
+    migrations.Migration(3, "drop unused idx_battles_war", sql=("DROP INDEX IF EXISTS idx_battles_war",)),
+]
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Sequence, Union
+
+from aiogram.filters import BaseFilter
+from aiogram.types import CallbackQuery, TelegramObject
+
+from app.config import Config
+
+
+class AdminFilter(BaseFilter):
+    """Пропускает только пользователей из ADMIN_IDS."""
+
+    async def __call__(self, event: TelegramObject, config: Config) -> bool:
+        user = getattr(event, "from_user", None)
+        return user is not None and user.id in config.admin_ids
+
+
+class OwnedAccountFilter(BaseFilter):
+    """
+    Кнопка «prefix<тег>»: пропускает, только если тег привязан к нажавшему, и отдаёт его хендлеру (tag).
+    ints=("days",) — перед тегом идут целые через «:» («prefix<days>:<тег>»), они тоже уходят хендлеру.
+    callback_data прислал клиент: не разобралась — кнопку молча закрываем. Проверка в фильтре идёт
+    до ExpensiveGuardMiddleware, поэтому чужой тег не тратит ни ведро, ни слоты тяжёлых запросов.
+    """
+
+    def __init__(self, prefix: str, ints: Sequence[str] = ()):
+        self.prefix = prefix
+        self.ints = tuple(ints)
+
+    async def __call__(self, call: CallbackQuery, db) -> Union[bool, Dict[str, Any]]:
+        if not call.data or not call.data.startswith(self.prefix):
+            return False
+        parts = call.data[len(self.prefix):].split(":", len(self.ints))
+        if len(parts) != len(self.ints) + 1 or not all(p.isdigit() for p in parts[:-1]):
+            await call.answer()
+            return False
+        tag = parts[-1]
+        if not await db.owns_account(call.from_user.id, tag):
+            await call.answer("Этот аккаунт не привязан к тебе.", show_alert=True)
+            return False
+        out: Dict[str, Any] = dict(zip(self.ints, map(int, parts)))
+        out["tag"] = tag
+        return out
@@ -6,6 +6,15 @@ from .link import router as link_router
 from .profile import router as profile_router
 from .upgrade import router as upgrade_router
 from .war_history import router as war_router
+from .clan_war import router as clan_war_router
+from .find import router as find_router
+from .progress import router as progress_router
+from .decks import router as decks_router
+from .export import router as export_router
+from .watch import router as watch_router
+from .broadcast import router as broadcast_router
+from .inline import router as inline_router
+from .stats import router as stats_router
 
 
 def setup_routers() -> Router:
@@ -16,4 +25,13 @@ def setup_routers() -> Router:
     router.include_router(help_router)
     router.include_router(upgrade_router)
     router.include_router(war_router)
+    router.include_router(clan_war_router)
+    router.include_router(find_router)
+    router.include_router(progress_router)
+    router.include_router(decks_router)
+    router.include_router(export_router)
+    router.include_router(watch_router)
+    router.include_router(broadcast_router)
+    router.include_router(inline_router)
+    router.include_router(stats_router)
     return router
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from html import escape
+from typing import Dict
+
+from aiogram import F, Router
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, Message
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from app.filters import AdminFilter
+from app.services.outbox import Outbox
+
+router = Router(name="broadcast")
+router.message.filter(AdminFilter())
+router.callback_query.filter(AdminFilter())
+
+USAGE = (
+    "/broadcast текст — рассылка всем пользователям бота (HTML-разметка, сначала превью)\n"
+    "/broadcast — последние рассылки и сколько уже доставлено"
+)
+
+# текст, ждущий подтверждения: админ -> текст
+_PENDING: Dict[int, str] = {}
+
+
+def _status_text(rows) -> str:
+    if not rows:
+        return "Рассылок ещё не было.\n\n" + USAGE
+    lines = ["<b>Последние рассылки:</b>"]
+    for b in rows:
+        done = b["sent"] + b["failed"]
+        preview = escape(b["text"][:40].replace("\n", " "))
+        lines.append(
+            f"#{b['id']} {b['created_at'][:16]} — {done}/{b['total']} "
+            f"(доставлено {b['sent']}, ошибок {b['failed']}): {preview}"
+        )
+    return "\n".join(lines)
+
+
+@router.message(Command("broadcast"))
+async def broadcast_cmd(message: Message, command: CommandObject, db):
+    if not command.args:
+        await message.answer(_status_text(await db.list_broadcasts()))
+        return
+
+    text = command.args.strip()
+    b = InlineKeyboardBuilder()
+    b.button(text="📣 Разослать всем", callback_data="broadcast_go")
+    b.button(text="Отмена", callback_data="broadcast_cancel")
+    # превью заодно проверяет разметку: с битым HTML Telegram отклонил бы каждое сообщение рассылки
+    try:
+        await message.answer(text, reply_markup=b.as_markup())
+    except TelegramBadRequest as e:
+        await message.answer(f"Telegram не принял текст: {escape(str(e))}")
+        return
+    _PENDING[message.from_user.id] = text
+
+
+@router.callback_query(F.data == "broadcast_go")
+async def broadcast_go_cb(call: CallbackQuery, outbox: Outbox):
+    text = _PENDING.pop(call.from_user.id, None)
+    if text is None:
+        await call.answer("Нечего рассылать — пришли /broadcast текст ещё раз.", show_alert=True)
+        return
+    b = await outbox.broadcast(text, call.from_user.id)
+    await call.message.edit_reply_markup(reply_markup=None)
+    await call.message.answer(f"📣 Рассылка #{b['id']} поставлена в очередь: {b['total']} получателей.")
+    await call.answer()
+
+
+@router.callback_query(F.data == "broadcast_cancel")
+async def broadcast_cancel_cb(call: CallbackQuery):
+    _PENDING.pop(call.from_user.id, None)
+    await call.message.edit_reply_markup(reply_markup=None)
+    await call.answer("Отменено")
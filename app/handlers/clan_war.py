@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import time
+from contextlib import suppress
+from html import escape
+from typing import List
+
+from aiogram import Router, flags
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from app.services.clan_report import ClanWarReport, PlayerWarSummary
+from app.services.clash_api import ClashApi
+from app.services.cw2_history import CW2HistoryService
+from app.utils import is_valid_tag, normalize_player_tag
+
+router = Router(name="clan_war")
+
+USAGE = (
+    "Использование:\n"
+    "/clanwar #CLANTAG — отчёт по КВ всего клана\n"
+    "/clanwar #TAG1 #TAG2 ... — отчёт по списку игроков (до 50)"
+)
+
+# не чаще раза в столько секунд правим статус (у Telegram лимит на редактирования)
+PROGRESS_EVERY = 1.5
+
+
+def build_report_text(title: str, rows: List[PlayerWarSummary]) -> str:
+    lines = [f"<b>{escape(title)}</b>", "Сумма за 10 недель: медали, колоды (% от 16 в неделю), недель", ""]
+    table = []
+    for i, r in enumerate(rows, 1):
+        name = (r.name or r.tag)[:14]
+        table.append(f"{i:>2}. {name:<14} {r.medals:>6} {r.decks_used:>4} ({r.decks_pct:>3}%) {r.weeks:>2}")
+    lines.append("<pre>" + escape("\n".join(table)) + "</pre>")
+    no_data = sum(1 for r in rows if not r.weeks)
+    if no_data:
+        lines.append(f"Без данных по КВ: {no_data}")
+    return "\n".join(lines)
+
+
+@router.message(Command("clanwar"))
+@flags.expensive("clanwar")
+async def clanwar_cmd(message: Message, command: CommandObject, clash_api: ClashApi, cw2_history: CW2HistoryService):
+    tags = [normalize_player_tag(t) for t in (command.args or "").replace(",", " ").split()]
+    if not tags or not all(is_valid_tag(t) for t in tags):
+        await message.answer(USAGE)
+        return
+
+    status = await message.answer("⏳ Собираю историю КВ…")
+    last_edit = 0.0
+
+    async def progress(done: int, total: int) -> None:
+        nonlocal last_edit
+        now = time.monotonic()
+        if done < total and now - last_edit < PROGRESS_EVERY:
+            return
+        last_edit = now
+        with suppress(TelegramBadRequest):  # "message is not modified" и т.п.
+            await status.edit_text(f"⏳ Собираю историю КВ: {done}/{total}")
+
+    report = ClanWarReport(clash_api, cw2_history)
+    if len(tags) == 1:
+        rows = await report.for_clan(tags[0], progress)
+        if rows is None:
+            await status.edit_text(f"Клан {escape(tags[0])} не найден.")
+            return
+        title = f"КВ клана {tags[0]}"
+    else:
+        rows = await report.for_players(tags, progress)
+        title = f"КВ игроков: {len(rows)}"
+
+    if not rows:
+        await status.edit_text("В клане нет участников.")
+        return
+    await status.edit_text(build_report_text(title, rows))
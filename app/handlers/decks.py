@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import time
+from html import escape
+from typing import Any, Dict, List
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import CallbackQuery, Message
+
+from app.filters import OwnedAccountFilter
+from app.keyboards import main_menu_kb, profile_accounts_picker_inline
+from app.services.battlelog import WAR_DAY_OFFSET, unpack_deck
+
+router = Router(name="decks")
+
+TOP_DECKS = 5
+WAR_DAYS = 7
+
+
+def _rate(wins: int, battles: int) -> str:
+    return f"{round(100 * wins / battles)}%" if battles else "—"
+
+
+def build_decks_text(
+    tag: str, decks: List[Dict[str, Any]], names: Dict[int, str], war_days: List[Dict[str, Any]]
+) -> str:
+    lines = [f"🃏 <b>Колоды</b> <code>{escape(tag)}</code>", ""]
+    for i, d in enumerate(decks, start=1):
+        cards = ", ".join(escape(names.get(cid) or str(cid)) for cid in unpack_deck(d["cards"]))
+        lines.append(f"{i}. {d['battles']} боёв, побед {_rate(d['wins'], d['battles'])}")
+        lines.append(f"<i>{cards}</i>")
+
+    lines += ["", f"⚔️ <b>Бои КВ за {WAR_DAYS} дн.</b>"]
+    if war_days:
+        lines += [f"{w['day']}: {w['battles']} (побед {w['wins']})" for w in war_days]
+    else:
+        lines.append("Боёв КВ нет.")
+    return "\n".join(lines)
+
+
+async def _send_decks(message: Message, db, tag: str) -> None:
+    decks = await db.deck_winrates(tag, limit=TOP_DECKS)
+    if not decks:
+        await message.answer(
+            "Боёв пока нет: история копится при фоновом обновлении профиля.",
+            reply_markup=main_menu_kb(),
+        )
+        return
+    names = await db.get_card_names(sorted({cid for d in decks for cid in unpack_deck(d["cards"])}))
+    war_days = await db.war_day_battles(tag, int(time.time()) - WAR_DAYS * 24 * 3600, day_offset=WAR_DAY_OFFSET)
+    await message.answer(build_decks_text(tag, decks, names, war_days), reply_markup=main_menu_kb())
+
+
+@router.message(Command("decks"))
+async def decks_cmd(message: Message, db):
+    user_id = message.from_user.id
+    await db.ensure_user(user_id)
+    accounts = await db.list_accounts(user_id)
+    if not accounts:
+        await message.answer("Сначала привяжи аккаунт (нужен тег игрока).", reply_markup=main_menu_kb())
+        return
+
+    if len(accounts) > 1:
+        await message.answer(
+            "Выбери аккаунт:",
+            reply_markup=profile_accounts_picker_inline(
+                accounts,
+                prefix="decks_open:",
+                allow_unlink=False,
+                allow_link_more=False,
+            ),
+        )
+        return
+
+    await _send_decks(message, db, accounts[0]["tag"])
+
+
+@router.callback_query(OwnedAccountFilter("decks_open:"))
+async def decks_open_cb(call: CallbackQuery, tag: str, db):
+    await _send_decks(call.message, db, tag)
+    await call.answer()
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import logging
+import os
+from html import escape
+
+from aiogram import Router, flags
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile, Message
+
+from app.config import Config
+from app.services import export
+from app.services.clash_api import ClashApi
+from app.player_index import FindQueryError, parse_find_args
+from app.services.river_race import RiverRaceHistoryService
+from app.utils import is_valid_tag, normalize_player_tag
+
+log = logging.getLogger(__name__)
+
+router = Router(name="export")
+
+USAGE = (
+    "Выгрузка в таблицу (добавь xlsx для Excel, по умолчанию csv):\n"
+    "/export candidates [фильтры /find] — игроки из поиска\n"
+    "/export war #CLANTAG — история КВ участников клана\n"
+    "/export accounts — все привязанные аккаунты (только админы)"
+)
+
+
+@router.message(Command("export"))
+@flags.expensive("export")
+async def export_cmd(message: Message, command: CommandObject, db, clash_api: ClashApi, config: Config):
+    tokens = (command.args or "").split()
+    fmt = export.FORMAT_CSV
+    for f in (export.FORMAT_XLSX, export.FORMAT_CSV):
+        if f in tokens:
+            fmt = f
+            tokens.remove(f)
+    if not tokens:
+        await message.answer(USAGE)
+        return
+    if fmt == export.FORMAT_XLSX and not export.xlsx_available():
+        await message.answer("XLSX сейчас недоступен — выгружаю CSV.")
+        fmt = export.FORMAT_CSV
+
+    kind, rest = tokens[0].lower(), tokens[1:]
+    if kind == "candidates":
+        try:
+            query = parse_find_args(" ".join(rest))
+        except FindQueryError as e:
+            await message.answer(escape(str(e)))
+            return
+        header, rows, name = export.CANDIDATE_HEADER, db.iter_candidates(query), "candidates"
+    elif kind == "war":
+        clan_tag = normalize_player_tag(rest[0]) if rest else ""
+        if not is_valid_tag(clan_tag):
+            await message.answer("Укажи тег клана: /export war #CLANTAG")
+            return
+        histories = await RiverRaceHistoryService(clash_api).clan_history(clan_tag)
+        if not histories:
+            await message.answer("Лог КВ клана пуст или клан не найден.")
+            return
+        header, rows, name = export.WAR_HEADER, export.war_rows(histories), f"war_{clan_tag.lstrip('#')}"
+    elif kind == "accounts":
+        if message.from_user is None or message.from_user.id not in config.admin_ids:
+            await message.answer("Выгрузка аккаунтов доступна только админам.")
+            return
+        header, rows, name = export.ACCOUNT_HEADER, db.iter_accounts(), "accounts"
+    else:
+        await message.answer(USAGE)
+        return
+
+    status = await message.answer("⏳ Готовлю файл…")
+    path = None
+    try:
+        path, count = await export.export_rows(fmt, header, rows, name)
+        if not count:
+            await status.edit_text("Нечего выгружать: строк нет.")
+            return
+        await message.answer_document(
+            FSInputFile(path, filename=f"{name}.{fmt}"),
+            caption=f"Строк: {count}",
+        )
+        await status.delete()
+    except export.ExportError as e:
+        await status.edit_text(f"Не получилось выгрузить: {escape(str(e))}")
+    except Exception:
+        log.exception("Export %s failed", name)
+        await status.edit_text("Не получилось подготовить файл, попробуй ещё раз.")
+    finally:
+        if path is not None:
+            os.remove(path)
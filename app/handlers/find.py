@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import hashlib
+from html import escape
+from typing import Dict, List, Optional
+
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from app.player_index import FindQuery, FindQueryError, parse_find_args
+
+router = Router(name="find")
+
+PAGE_SIZE = 10
+
+USAGE = (
+    "Поиск по уже загруженным игрокам:\n"
+    "/find tr>=7000 l16>=5 evo>=3 noclan sort=l16\n\n"
+    "Фильтры: tr, best, exp, l14, l15, l16 (карт уровня ≥N), evo, hero — с операторами >= <= = > <\n"
+    "noclan — только без клана; sort=tr|best|l16 (по умолчанию tr)"
+)
+
+# запросы, по которым листают страницы: id -> FindQuery (в callback_data целиком не влезают)
+_QUERIES: Dict[str, FindQuery] = {}
+_QUERIES_MAX = 1000
+
+
+def _remember(q: FindQuery) -> str:
+    qid = hashlib.sha1(q.key().encode("utf-8")).hexdigest()[:10]
+    if qid not in _QUERIES and len(_QUERIES) >= _QUERIES_MAX:
+        _QUERIES.pop(next(iter(_QUERIES)))
+    _QUERIES[qid] = q
+    return qid
+
+
+def _fmt_row(i: int, r: dict) -> str:
+    clan = "в клане" if r["clan_tag"] else "без клана"
+    return (
+        f"{i}. <b>{escape(r['name'] or '—')}</b> <code>{r['player_tag']}</code>\n"
+        f"   🏆 {r['trophies']} (best {r['best_trophies']}) | exp {r['exp_level']} | {clan}\n"
+        f"   16: {r['cards_16']} | 15+: {r['cards_15']} | 14+: {r['cards_14']} | "
+        f"эво {r['evo_count']} | героев {r['hero_count']}"
+    )
+
+
+def _page(q: FindQuery, qid: str, rows: List[dict], offset: int) -> tuple[str, Optional[InlineKeyboardMarkup]]:
+    if not rows:
+        return ("Больше никого не нашлось." if offset else "Никого не нашлось."), None
+
+    lines = [f"<b>Кандидаты {offset + 1}–{offset + len(rows)}</b>", ""]
+    lines += [_fmt_row(offset + i, r) for i, r in enumerate(rows, 1)]
+
+    kb = None
+    if len(rows) == PAGE_SIZE:
+        last = rows[-1]
+        b = InlineKeyboardBuilder()
+        tag = last["player_tag"].lstrip("#")
+        b.button(text="Дальше ▶", callback_data=f"find:{qid}:{offset + len(rows)}:{last[q.sort]}:{tag}")
+        kb = b.as_markup()
+    return "\n".join(lines), kb
+
+
+@router.message(Command("find"))
+async def find_cmd(message: Message, command: CommandObject, db):
+    if not command.args:
+        await message.answer(USAGE)
+        return
+    try:
+        q = parse_find_args(command.args)
+    except FindQueryError as e:
+        await message.answer(f"{escape(str(e))}\n\n{USAGE}")
+        return
+
+    rows = await db.find_players(q, limit=PAGE_SIZE)
+    text, kb = _page(q, _remember(q), rows, 0)
+    await message.answer(text, reply_markup=kb)
+
+
+@router.callback_query(F.data.startswith("find:"))
+async def find_next_cb(call: CallbackQuery, db):
+    _, qid, offset, value, tag = call.data.split(":", 4)
+    q = _QUERIES.get(qid)
+    if q is None:
+        await call.answer("Поиск устарел — повтори /find", show_alert=True)
+        return
+
+    rows = await db.find_players(q, after=(int(value), "#" + tag), limit=PAGE_SIZE)
+    text, kb = _page(q, qid, rows, int(offset))
+    await call.message.answer(text, reply_markup=kb)
+    await call.answer()
@@ -3,14 +3,21 @@ from aiogram.filters import Command
 from aiogram.types import Message
 from app.keyboards import main_menu_kb
 
-router = Router()
+router = Router(name="help")
 
 HELP_TEXT = (
     "Команды naborbot:\n"
     "/start — запуск\n"
     "/help — помощь\n"
     "/link — привязать аккаунт (пришли тег)\n"
-    "/profile — профиль (если аккаунтов несколько — выбор)\n\n"
+    "/profile — профиль (если аккаунтов несколько — выбор)\n"
+    "/progress [дней] — прогресс аккаунта за период (по умолчанию 7 дней)\n"
+    "/decks — частые колоды с винрейтом и бои КВ по дням (из истории боёв)\n"
+    "/clanwar #CLANTAG — КВ всего клана (или список тегов игроков)\n"
+    "/find — поиск кандидатов среди загруженных игроков\n"
+    "/export — выгрузка кандидатов и истории КВ в CSV/XLSX\n"
+    "/watch — подписки: уход из клана, порог трофеев, пропущенные колоды КВ\n"
+    "@бот #TAG в любом чате — карточка игрока (пустой запрос — твои аккаунты)\n\n"
     "Также можно пользоваться кнопками меню."
 )
 
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import asyncio
+
+from aiogram import Router
+from aiogram.types import InlineQuery, InlineQueryResultsButton
+
+from app.services.inline import RESULT_TTL, InlineAnswers
+from app.utils import is_valid_tag, normalize_player_tag
+
+router = Router(name="inline")
+
+# пустой запрос — карточки своих аккаунтов
+MAX_ACCOUNTS = 5
+
+LINK_BUTTON = InlineQueryResultsButton(text="Привязать аккаунт в боте", start_parameter="inline")
+
+
+@router.inline_query()
+async def inline_query(query: InlineQuery, db, inline: InlineAnswers):
+    text = query.query.strip()
+    if not text:
+        accounts = (await db.list_accounts(query.from_user.id))[:MAX_ACCOUNTS]
+        per_tag = await asyncio.gather(*(inline.results(a["tag"]) for a in accounts))
+        results = [r for rs in per_tag for r in rs]
+        await query.answer(
+            results,
+            cache_time=int(RESULT_TTL),
+            is_personal=True,
+            button=None if accounts else LINK_BUTTON,
+        )
+        return
+
+    tag = normalize_player_tag(text.split()[0])
+    if not is_valid_tag(tag):
+        # тег ещё печатают — отвечаем сразу и пусто, в БД и API не ходим
+        await query.answer([], cache_time=300)
+        return
+
+    results = inline.cached(tag)
+    if results is None:
+        if not await inline.debounce(query.from_user.id):
+            return
+        results = await inline.results(tag)
+    await query.answer(results, cache_time=int(RESULT_TTL))
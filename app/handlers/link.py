@@ -4,7 +4,7 @@ from aiogram.types import Message
 from app.keyboards import main_menu_kb
 from app.utils import normalize_player_tag, is_valid_tag
 
-router = Router()
+router = Router(name="link")
 
 @router.message(Command("link"))
 @router.message(F.text == "Привязать аккаунт")
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import time
+from html import escape
+
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, Message
+
+from app.filters import OwnedAccountFilter
+from app.keyboards import main_menu_kb, profile_accounts_picker_inline
+from app import progression
+
+router = Router(name="progress")
+
+DEFAULT_DAYS = 7
+MAX_DAYS = 365
+
+
+def _signed(n: int) -> str:
+    return f"+{n}" if n > 0 else str(n)
+
+
+def build_progress_text(tag: str, s: progression.ProgressSummary, days: int, partial: bool) -> str:
+    t0, t1 = s.trophies
+    lines = [
+        f"📈 <b>Прогресс за {days} дн.</b> <code>{escape(tag)}</code>",
+        "",
+        f"🏆 Трофеи: {t0} → <b>{t1}</b> ({_signed(t1 - t0)}), максимум {s.trophies_peak}",
+    ]
+    if s.best_trophies[1] != s.best_trophies[0]:
+        lines.append(f"🥇 Лучший результат: {s.best_trophies[0]} → <b>{s.best_trophies[1]}</b>")
+    if s.exp_level[1] != s.exp_level[0]:
+        lines.append(f"👑 Уровень: {s.exp_level[0]} → <b>{s.exp_level[1]}</b>")
+
+    lines.append("")
+    reached = [f"{lv} ур. — <b>+{n}</b>" for lv, n in sorted(s.reached.items()) if n]
+    if s.upgrades or s.new_cards or s.new_evos:
+        lines.append(f"🃏 Прокачано уровней: <b>{s.upgrades}</b>, новых карт: <b>{s.new_cards}</b>")
+        if reached:
+            lines.append("Дошли до уровня: " + ", ".join(reached))
+        if s.new_evos:
+            lines.append(f"🧬 Новых эволюций: <b>{s.new_evos}</b>")
+    else:
+        lines.append("🃏 Карты без изменений.")
+
+    if partial:
+        lines += ["", "<i>История копится с момента, как бот начал следить за аккаунтом — она короче периода.</i>"]
+    return "\n".join(lines)
+
+
+async def _send_progress(message: Message, db, tag: str, days: int) -> None:
+    now_ms = int(time.time() * 1000)
+    since_ms = now_ms - days * 24 * 3600 * 1000
+    timeline = progression.replay(await db.get_progress(tag, since_ms))
+    summary = progression.summarize(timeline, since_ms)
+    if summary is None:
+        await message.answer(
+            "Истории пока нет: она начнёт копиться после следующего обновления профиля.",
+            reply_markup=main_menu_kb(),
+        )
+        return
+    partial = timeline[0][0] > since_ms
+    await message.answer(build_progress_text(tag, summary, days, partial), reply_markup=main_menu_kb())
+
+
+@router.message(Command("progress"))
+async def progress_cmd(message: Message, command: CommandObject, db):
+    days = DEFAULT_DAYS
+    if command.args:
+        if not command.args.strip().isdigit():
+            await message.answer("Использование: /progress [дней], например /progress 30")
+            return
+        days = max(1, min(MAX_DAYS, int(command.args.strip())))
+
+    user_id = message.from_user.id
+    await db.ensure_user(user_id)
+    accounts = await db.list_accounts(user_id)
+    if not accounts:
+        await message.answer("Сначала привяжи аккаунт (нужен тег игрока).", reply_markup=main_menu_kb())
+        return
+
+    if len(accounts) > 1:
+        await message.answer(
+            "Выбери аккаунт:",
+            reply_markup=profile_accounts_picker_inline(
+                accounts,
+                prefix=f"progress_open:{days}:",
+                allow_unlink=False,
+                allow_link_more=False,
+            ),
+        )
+        return
+
+    await _send_progress(message, db, accounts[0]["tag"], days)
+
+
+@router.callback_query(OwnedAccountFilter("progress_open:", ints=("days",)))
+async def progress_open_cb(call: CallbackQuery, tag: str, days: int, db):
+    await _send_progress(call.message, db, tag, max(1, min(MAX_DAYS, days)))
+    await call.answer()
@@ -3,7 +3,7 @@ from aiogram.filters import CommandStart
 from aiogram.types import Message
 from app.keyboards import main_menu_kb
 
-router = Router()
+router = Router(name="start")
 
 @router.message(CommandStart())
 async def start(message: Message, db):
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from html import escape
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from app.filters import AdminFilter
+from app import metrics
+
+router = Router(name="stats")
+
+
+def _fmt_hist(h: metrics.Histogram, key: tuple) -> str:
+    data = h.values[key]
+    labels = dict(zip(h.labelnames, key))
+    p50 = h.quantile(0.5, **labels) or 0.0
+    p95 = h.quantile(0.95, **labels) or 0.0
+    return f"{data.count} шт, p50 {p50:.2f}с, p95 {p95:.2f}с"
+
+
+def build_stats_text() -> str:
+    lines = ["<b>📊 Статистика процесса (с запуска)</b>", "", "<b>Хендлеры:</b>"]
+    for key in sorted(metrics.HANDLER_SECONDS.values):
+        errors = int(metrics.HANDLER_ERRORS.values.get(key, 0))
+        err = f", ошибок {errors}" if errors else ""
+        lines.append(f"{escape('/'.join(key))} — {_fmt_hist(metrics.HANDLER_SECONDS, key)}{err}")
+
+    lines += ["", "<b>Внешние запросы:</b>"]
+    for key in sorted(metrics.UPSTREAM_SECONDS.values):
+        statuses = [
+            f"{st}×{int(v)}"
+            for (svc, ep, st), v in sorted(metrics.UPSTREAM_REQUESTS.values.items())
+            if (svc, ep) == key
+        ]
+        lines.append(
+            f"{escape(' '.join(key))} — {_fmt_hist(metrics.UPSTREAM_SECONDS, key)} [{', '.join(statuses)}]"
+        )
+
+    lines += ["", "<b>Кеши:</b>"]
+    caches = sorted({cache for cache, _ in metrics.CACHE_REQUESTS.values})
+    for cache in caches:
+        hit = metrics.CACHE_REQUESTS.values.get((cache, "hit"), 0)
+        miss = metrics.CACHE_REQUESTS.values.get((cache, "miss"), 0)
+        total = hit + miss
+        pct = hit / total * 100 if total else 0.0
+        lines.append(f"{escape(cache)} — {pct:.0f}% попаданий ({int(hit)}/{int(total)})")
+
+    lines += ["", "<b>Рендер / скрейп:</b>"]
+    for h in (metrics.RENDER_SECONDS, metrics.SCRAPE_SECONDS):
+        for key in sorted(h.values):
+            lines.append(f"{escape(' '.join(key))} — {_fmt_hist(h, key)}")
+
+    lines += ["", "<b>БД (топ-5 по суммарному времени):</b>"]
+    top = sorted(metrics.DB_QUERY_SECONDS.values.items(), key=lambda kv: kv[1].sum, reverse=True)[:5]
+    for key, data in top:
+        lines.append(f"{escape(key[0])} — {_fmt_hist(metrics.DB_QUERY_SECONDS, key)}, всего {data.sum:.2f}с")
+
+    return "\n".join(lines)
+
+
+@router.message(Command("stats"), AdminFilter())
+async def stats_cmd(message: Message):
+    await message.answer(build_stats_text())
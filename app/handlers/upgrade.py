@@ -1,17 +1,20 @@
-import os
-from aiogram import Router, F
+from aiogram import Router, F, flags
 from aiogram.filters import Command
-from aiogram.types import Message, FSInputFile
+from aiogram.types import Message, CallbackQuery, FSInputFile
 
-from app.keyboards import main_menu_kb
-from app.services.upgrade_image import render_upgrade_image
+from app.filters import OwnedAccountFilter
+from app.keyboards import main_menu_kb, profile_accounts_picker_inline
+from app.services.inline import FILE_UPGRADE, InlineAnswers
+from app.services.job_queue import JobError
+from app.services.upgrade_renders import UpgradeRenders
 
-router = Router()
+router = Router(name="upgrade")
 
 
 @router.message(Command("upgrade"))
 @router.message(F.text == "Прокачка (картинкой)")
-async def upgrade_image_entry(message: Message, db, clash_api):
+@flags.expensive("upgrade")
+async def upgrade_image_entry(message: Message, db, renders: UpgradeRenders, inline: InlineAnswers):
     user_id = message.from_user.id
     await db.ensure_user(user_id)
 
@@ -23,26 +26,48 @@ async def upgrade_image_entry(message: Message, db, clash_api):
         )
         return
 
-    # если аккаунт один — берём его, если несколько — позже сделаем выбор как в профиле
-    tag = accounts[0]["tag"]
+    if len(accounts) > 1:
+        await message.answer(
+            "Выбери аккаунт:",
+            reply_markup=profile_accounts_picker_inline(
+                accounts,
+                prefix="upgrade_open:",
+                allow_unlink=False,
+                allow_link_more=False,
+            ),
+        )
+        # пока пользователь выбирает — рендерим все его аккаунты, выбор отдаст готовую картинку
+        renders.speculate(user_id, [a["tag"] for a in accounts])
+        return
+
+    await _send_upgrade(message, accounts[0]["tag"], user_id, db=db, renders=renders, inline=inline)
 
-    player = await clash_api.get_player(tag)
-    if not player:
-        cached = await db.get_cached_player_json(tag)
-        if cached:
-            player = cached
-        else:
-            await message.answer("API временно недоступен и кеша нет.", reply_markup=main_menu_kb())
-            return
 
-    # сохраним кеш
-    await db.cache_player_json(tag, player)
+@router.callback_query(OwnedAccountFilter("upgrade_open:"))
+@flags.expensive("upgrade")
+async def upgrade_open_cb(call: CallbackQuery, tag: str, db, renders: UpgradeRenders, inline: InlineAnswers):
+    await call.answer()
+    await _send_upgrade(call.message, tag, call.from_user.id, db=db, renders=renders, inline=inline)
 
-    out_path = os.path.join("cache", "renders", f"upgrade_{tag.replace('#','')}.png")
-    await render_upgrade_image(player, out_path=out_path)
 
-    await message.answer_photo(
-        photo=FSInputFile(out_path),
+async def _send_upgrade(message: Message, tag: str, user_id: int, db, renders: UpgradeRenders, inline: InlineAnswers):
+    # снапшот (свежий/живой/последний сохранённый) лежит в player_cache — оттуда его берёт рендер
+    try:
+        rendered = await renders.get(tag, user_id)
+    except JobError:
+        await message.answer("Не получилось построить картинку, попробуй ещё раз.", reply_markup=main_menu_kb())
+        return
+    if rendered is None:
+        await message.answer("API временно недоступен и кеша нет.", reply_markup=main_menu_kb())
+        return
+
+    sent = await message.answer_photo(
+        photo=rendered.file_id or FSInputFile(rendered.path),
         caption="📈 Прокачка карт (картинкой)",
         reply_markup=main_menu_kb()
     )
+    # загруженная картинка остаётся у Telegram — по file_id её отдаёт inline-режим и повторный /upgrade
+    if sent.photo and rendered.file_id is None:
+        rendered.file_id = sent.photo[-1].file_id
+        await db.save_file_id(tag, FILE_UPGRADE, rendered.file_id)
+        inline.forget(tag)
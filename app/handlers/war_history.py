@@ -1,14 +1,16 @@
 from __future__ import annotations
 
-from aiogram import Router, F
+from aiogram import Router, F, flags
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 
+from app.filters import OwnedAccountFilter
 from app.keyboards import main_menu_kb, profile_accounts_picker_inline
 from app.utils import normalize_player_tag
-from app.services.cw2_history import CW2HistoryService, CW2WeekEntry
+from app.services.cw2_history import CW2WeekEntry
+from app.services.job_queue import JobError, JobQueue
 
-router = Router()
+router = Router(name="war_history")
 
 
 def fmt_line(w: CW2WeekEntry) -> str:
@@ -19,7 +21,8 @@ def fmt_line(w: CW2WeekEntry) -> str:
 
 @router.message(Command("warhistory"))
 @router.message(F.text == "Клановые войны (10 недель)")
-async def warhistory_entry(message: Message, db, cw2_history: CW2HistoryService):
+@flags.expensive("warhistory")
+async def warhistory_entry(message: Message, db, jobs: JobQueue):
     user_id = message.from_user.id
     await db.ensure_user(user_id)
 
@@ -42,20 +45,23 @@ async def warhistory_entry(message: Message, db, cw2_history: CW2HistoryService)
         return
 
     tag = accounts[0]["tag"]
-    await _send_warhistory(message, tag, cw2_history)
+    await _send_warhistory(message, tag, jobs)
 
 
-@router.callback_query(F.data.startswith("war_open:"))
-async def war_open_cb(call: CallbackQuery, cw2_history: CW2HistoryService):
-    tag = call.data.split(":", 1)[1]
-    await _send_warhistory(call.message, tag, cw2_history)
+@router.callback_query(OwnedAccountFilter("war_open:"))
+@flags.expensive("warhistory")
+async def war_open_cb(call: CallbackQuery, tag: str, jobs: JobQueue):
+    await _send_warhistory(call.message, tag, jobs)
     await call.answer()
 
 
-async def _send_warhistory(message: Message, player_tag: str, cw2_history: CW2HistoryService):
+async def _send_warhistory(message: Message, player_tag: str, jobs: JobQueue):
     player_tag = normalize_player_tag(player_tag)
 
-    weeks = await cw2_history.get_last_10_weeks_player(player_tag)
+    try:
+        weeks = await jobs.cw2_history(player_tag)
+    except JobError:
+        weeks = []
     if not weeks:
         await message.answer(
             "Не смог получить историю CW2 игрока.\n"
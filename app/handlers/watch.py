@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from html import escape
+from typing import Any, Dict, List
+
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from app.config import Config
+from app.services.clash_api import ClashApi
+from app.services.snapshots import PlayerSnapshots
+from app.services.watcher import (
+    KIND_LEFT_CLAN,
+    KIND_TROPHIES,
+    KIND_WAR_DECKS,
+    WatchScheduler,
+    player_state,
+    war_state,
+)
+from app.utils import is_valid_tag, normalize_player_tag
+
+router = Router(name="watch")
+
+MAX_WATCHES = 20
+
+USAGE = (
+    "Подписки на события (бот пришлёт сообщение):\n"
+    "/watch clan #PLAYER — игрок ушёл из клана\n"
+    "/watch trophies #PLAYER 9000 — игрок дошёл до порога трофеев\n"
+    "/watch war #CLANTAG — кто в клане не отыграл колоды КВ за день\n"
+    "/watch — список подписок (там же удаление)"
+)
+
+_KINDS = {"clan": KIND_LEFT_CLAN, "trophies": KIND_TROPHIES, "war": KIND_WAR_DECKS}
+
+
+def _describe(w: Dict[str, Any]) -> str:
+    tag = escape(w["tag"])
+    if w["kind"] == KIND_LEFT_CLAN:
+        return f"уход из клана <code>{tag}</code>"
+    if w["kind"] == KIND_TROPHIES:
+        return f"<code>{tag}</code> ≥ {w['threshold']} трофеев"
+    return f"колоды КВ клана <code>{tag}</code>"
+
+
+def _list(watches: List[Dict[str, Any]]) -> tuple[str, InlineKeyboardMarkup | None]:
+    if not watches:
+        return "Подписок нет.\n\n" + USAGE, None
+    lines = ["<b>Твои подписки:</b>"]
+    b = InlineKeyboardBuilder()
+    for i, w in enumerate(watches, 1):
+        lines.append(f"{i}. {_describe(w)}")
+        b.button(text=f"❌ {i}", callback_data=f"watch_del:{w['id']}")
+    b.adjust(5)
+    return "\n".join(lines), b.as_markup()
+
+
+@router.message(Command("watch"))
+async def watch_cmd(
+    message: Message,
+    command: CommandObject,
+    db,
+    clash_api: ClashApi,
+    snapshots: PlayerSnapshots,
+    watcher: WatchScheduler,
+    config: Config,
+):
+    user_id = message.from_user.id
+    args = (command.args or "").split()
+    if not args:
+        text, kb = _list(await db.list_watches(user_id))
+        await message.answer(text, reply_markup=kb)
+        return
+
+    kind = _KINDS.get(args[0].lower())
+    tag = normalize_player_tag(args[1]) if len(args) > 1 else ""
+    if kind is None or not is_valid_tag(tag):
+        await message.answer(USAGE)
+        return
+    threshold = 0
+    if kind == KIND_TROPHIES:
+        if len(args) < 3 or not args[2].isdigit():
+            await message.answer("Укажи порог: /watch trophies #PLAYER 9000")
+            return
+        threshold = int(args[2])
+
+    if config.watch_rate <= 0:
+        await message.answer("Подписки сейчас выключены.")
+        return
+    if await db.count_watches(user_id) >= MAX_WATCHES:
+        await message.answer(f"Не больше {MAX_WATCHES} подписок — удали лишние через /watch.")
+        return
+
+    # начальный state — текущее значение: событием станет только изменение после подписки
+    if kind == KIND_WAR_DECKS:
+        race = await clash_api.get_current_river_race(tag)
+        if race is None:
+            await message.answer("Клан не найден или не участвует в КВ.")
+            return
+        state, title = war_state(race), race.clan.name
+    else:
+        player, _ = await snapshots.get(tag)
+        if not player:
+            await message.answer("Игрок не найден.")
+            return
+        state, title = player_state(kind, player), player.get("name") or tag
+        if kind == KIND_LEFT_CLAN and not state["clan_tag"]:
+            await message.answer("Игрок сейчас не в клане — следить не за чем.")
+            return
+        if kind == KIND_TROPHIES and state["trophies"] >= threshold:
+            await message.answer(f"У игрока уже {state['trophies']} трофеев — порог пройден.")
+            return
+
+    await db.ensure_user(user_id)
+    w = await db.add_watch(user_id, kind, tag, threshold, state)
+    if w is None:
+        await message.answer("Такая подписка уже есть.")
+        return
+    watcher.add(w)
+    await message.answer(f"✅ Подписка: {_describe(w)} ({escape(title)}).")
+
+
+@router.callback_query(F.data.startswith("watch_del:"))
+async def watch_del_cb(call: CallbackQuery, db, watcher: WatchScheduler):
+    raw_id = call.data.split(":", 1)[1]
+    if not raw_id.isdigit():
+        await call.answer()
+        return
+    watch_id = int(raw_id)
+    if await db.delete_watch(call.from_user.id, watch_id):
+        watcher.remove(watch_id)
+    text, kb = _list(await db.list_watches(call.from_user.id))
+    await call.message.edit_text(text, reply_markup=kb)
+    await call.answer("Подписка удалена")
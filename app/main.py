@@ -1,55 +1,206 @@
 import asyncio
+import logging
+import time
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
-from app.config import load_config
+from app import cassette
+from app.config import Config, load_config
 from app.db import Database
 from app.services.clash_api import ClashApi
 from app.services.cw2_history import CW2HistoryService
+from app.services.inline import InlineAnswers
+from app.services.job_queue import JobContext, JobQueue
+from app.services.maintenance import DbMaintenance
+from app.services.profile_text import ProfileTexts
+from app.services.outbox import Outbox
+from app.services.battlelog import BattlelogIngestor
+from app.services.refresher import PlayerRefresher
+from app.services.snapshots import PlayerSnapshots
+from app.services.upgrade_renders import UpgradeRenders
+from app.services.watcher import WatchScheduler
 from app.handlers import setup_routers
+from app.metrics import STARTUP_SECONDS
+from app.ratelimit import PriorityRateLimiter
+from app.middlewares import setup_middlewares
+from app.middlewares.outbound import OutboundLimitMiddleware, chat_limits
+from app.middlewares.startup import FirstUpdateMiddleware
+from app.warmup import warm_up_renderer
 
+log = logging.getLogger(__name__)
 
-def run():
-    asyncio.run(main())
+
+async def _run_backfills(db: Database) -> None:
+    # фоновая часть миграций схемы: пачками, пока бот уже отвечает
+    try:
+        await db.run_backfills()
+    except Exception:
+        log.exception("schema backfill failed")
+
+
+def run(started_at: float | None = None):
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    asyncio.run(main(time.perf_counter() if started_at is None else started_at))
+
+
+def _setup_cassette(cfg: Config) -> None:
+    c = cassette.configure(cfg.http_cassette_mode, cfg.http_cassette, cfg.http_cassette_latency)
+    if c is not None:
+        log.warning("HTTP cassette: %s %s", cfg.http_cassette_mode, cfg.http_cassette)
 
 
-async def main():
+def build_dispatcher(cfg: Config) -> Dispatcher:
+    dp = Dispatcher()
+    setup_middlewares(dp, cfg)
+    dp.include_router(setup_routers())
+    return dp
+
+
+async def main(started_at: float):
+    STARTUP_SECONDS.set(time.perf_counter() - started_at, phase="imports")
     cfg = load_config()
 
     # ---------- DB ----------
     db = Database(cfg.db_path)
-    await db.init()
+    await db.init(auto_vacuum_migration=cfg.db_auto_vacuum_migration)
 
     # ---------- BOT ----------
     bot = Bot(
         token=cfg.bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
+    # все исходящие запросы в чаты — через общий лимит (ответы хендлеров впереди рассылок)
+    bot.session.middleware(
+        OutboundLimitMiddleware(PriorityRateLimiter(cfg.outbound_rate, burst=5, key_limits=chat_limits))
+    )
 
-    dp = Dispatcher()
+    dp = build_dispatcher(cfg)
+    dp.update.outer_middleware(FirstUpdateMiddleware(started_at))
 
     # ---------- SERVICES ----------
+    # запись/воспроизведение HTTP — до создания клиентов
+    _setup_cassette(cfg)
+
     # Supercell API (профиль, прокачка и т.п.)
     clash_api = ClashApi(
         token=cfg.clash_api_token,
         base_url=cfg.clash_api_base,
+        rate=cfg.clash_api_rate,
+        trim_players=cfg.trim_player_json,
     )
 
-    # CW2 history (ТОЛЬКО RoyaleAPI, без Supercell)
-    cw2_history = CW2HistoryService(timeout=12.0)
+    # CW2 history: скрейп RoyaleAPI — запасной путь, если в riverracelog клана игрока нет
+    # лимит скрейпа — на весь бот: с воркерами процесс бота берёт свою долю
+    cw2_history = CW2HistoryService(
+        timeout=12.0, base_url=cfg.royaleapi_base, rate=cfg.royaleapi_rate / (cfg.job_workers + 1)
+    )
+
+    # Снапшоты игроков: свежий из БД → API → последний сохранённый
+    snapshots = PlayerSnapshots(db, clash_api, max_age=cfg.snapshot_max_age)
+    # inline-режим (@naborbot #TAG): кеш готовых ответов поверх снапшотов
+    inline = InlineAnswers(db, snapshots, max_age=cfg.snapshot_max_age)
+
+    # Тяжёлые задачи: в процессе бота или в отдельных процессах-воркерах
+    jobs = JobQueue(
+        db,
+        JobContext(db=db, clash_api=clash_api, cw2_history=cw2_history),
+        use_workers=cfg.job_workers > 0,
+        timeout=cfg.job_timeout,
+    )
+    # Исходящие уведомления и рассылки (через таблицу outbox) и подписки /watch
+    outbox = Outbox(db, bot, concurrency=cfg.outbox_concurrency)
+    watcher = WatchScheduler(db, clash_api, outbox, rate=cfg.watch_rate)
+
+    workers = []
+    if cfg.job_workers > 0:
+        from app.worker import start_workers
+
+        workers = start_workers(cfg)
 
     # ---------- DEPENDENCIES ----------
     dp["db"] = db
     dp["clash_api"] = clash_api
     dp["cw2_history"] = cw2_history
+    dp["jobs"] = jobs
+    dp["snapshots"] = snapshots
+    dp["inline"] = inline
+    dp["profiles"] = ProfileTexts(db)
+    dp["renders"] = UpgradeRenders(jobs, snapshots, limit=cfg.upgrade_prerender, idle=cfg.upgrade_prerender_idle)
+    dp["watcher"] = watcher
+    dp["outbox"] = outbox
+    dp["config"] = cfg
 
-    # ---------- ROUTERS ----------
-    dp.include_router(setup_routers())
+    # ---------- METRICS ----------
+    metrics_runner = None
+    if cfg.metrics_port:
+        from app.metrics_server import start_metrics_server
+
+        metrics_runner = await start_metrics_server(cfg.metrics_host, cfg.metrics_port)
+
+    # ---------- WARM-UP ----------
+    # с воркерами рендерят они — там и прогреваем
+    warmup_task = None
+    if cfg.warmup and cfg.job_workers == 0:
+        warmup_task = asyncio.create_task(warm_up_renderer())
+
+    # ---------- BACKGROUND ----------
+    background: list[asyncio.Task] = [
+        asyncio.create_task(_run_backfills(db)),
+        asyncio.create_task(outbox.run()),
+    ]
+    if cfg.refresh_rate > 0:
+        refresher = PlayerRefresher(
+            db,
+            clash_api,
+            rate=cfg.refresh_rate,
+            cycle_seconds=cfg.refresh_cycle_seconds,
+            battlelog=BattlelogIngestor(db, clash_api) if cfg.battlelog_ingest else None,
+            # с воркерами пачку цикла обновляют они
+            jobs=jobs if cfg.job_workers > 0 else None,
+        )
+        background.append(asyncio.create_task(refresher.run()))
+    if cfg.watch_rate > 0:
+        background.append(asyncio.create_task(watcher.run()))
+    if cfg.db_maintenance_interval > 0:
+        maintenance = DbMaintenance(
+            db,
+            interval=cfg.db_maintenance_interval,
+            analyze_interval=cfg.db_analyze_interval,
+            wal_max_bytes=cfg.db_wal_max_mb * 2**20,
+        )
+        background.append(asyncio.create_task(maintenance.run()))
+
+    ready = time.perf_counter() - started_at
+    STARTUP_SECONDS.set(ready, phase="ready")
+    log.info("Startup: ready to receive updates %.0f ms after process start", ready * 1000)
 
     # ---------- RUN ----------
     try:
-        await dp.start_polling(bot)
+        if cfg.bot_mode == "webhook":
+            from app.webhook import run_webhook
+
+            await run_webhook(bot, dp, cfg)
+        else:
+            # если раньше стоял вебхук — getUpdates с ним не работает
+            await bot.delete_webhook(drop_pending_updates=False)
+            await dp.start_polling(bot)
     finally:
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
         await clash_api.close()
+        await cw2_history.close()
+        await bot.session.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if workers:
+            from app.worker import stop_workers
+
+            await asyncio.to_thread(stop_workers, workers, cfg.shutdown_timeout)
@@ -0,0 +1,264 @@
+"""
+Минимальный реестр метрик без внешних зависимостей + вывод в текстовом формате Prometheus.
+Метрики живут в памяти процесса: у процессов-воркеров (app.worker) они свои и через /metrics бота
+не отдаются — с JOB_WORKERS > 0 время рендера и скрейпа (naborbot_render_seconds,
+naborbot_scrape_seconds) не экспортируется; видно только общее время хендлеров в боте.
+"""
+from __future__ import annotations
+
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Разбивка времени текущего апдейта по стадиям (api/db/render/...).
+# Включается профилирующим middleware; без него здесь None и запись ничего не стоит.
+STAGES: ContextVar[Optional[Dict[str, float]]] = ContextVar("naborbot_stages", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        out = super().render()
+        for key, v in sorted(self.values.items()):
+            out.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_value(v)}")
+        return out
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[self._key(labels)] = float(value)
+
+    def render(self) -> List[str]:
+        out = super().render()
+        for key, v in sorted(self.values.items()):
+            out.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_value(v)}")
+        return out
+
+
+class _HistogramData:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n: int):
+        self.counts = [0] * n  # по корзинам, без накопления; последняя — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        stage: str = "",
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.stage = stage
+        self.values: Dict[LabelValues, _HistogramData] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        if self.stage:
+            stages = STAGES.get()
+            if stages is not None:
+                name = ":".join((self.stage, *key))
+                stages[name] = stages.get(name, 0.0) + value
+        data = self.values.get(key)
+        if data is None:
+            data = self.values[key] = _HistogramData(len(self.buckets) + 1)
+        data.counts[bisect.bisect_left(self.buckets, value)] += 1
+        data.sum += value
+        data.count += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """Оценка квантиля по корзинам (линейная интерполяция внутри корзины)."""
+        data = self.values.get(self._key(labels))
+        if not data or not data.count:
+            return None
+        rank = q * data.count
+        seen = 0
+        lower = 0.0
+        for i, c in enumerate(data.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else lower
+            if c and seen + c >= rank:
+                return lower + (upper - lower) * ((rank - seen) / c)
+            seen += c
+            lower = upper
+        return lower
+
+    def render(self) -> List[str]:
+        out = super().render()
+        for key, data in sorted(self.values.items()):
+            acc = 0
+            for i, c in enumerate(data.counts):
+                acc += c
+                le = self.buckets[i] if i < len(self.buckets) else float("inf")
+                labels = _fmt_labels(self.labelnames, key, f'le="{_fmt_value(le)}"')
+                out.append(f"{self.name}_bucket{labels} {acc}")
+            labels = _fmt_labels(self.labelnames, key)
+            out.append(f"{self.name}_sum{labels} {_fmt_value(data.sum)}")
+            out.append(f"{self.name}_count{labels} {data.count}")
+        return out
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        stage: str = "",
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets, stage))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics.values():
+            lines += m.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    "naborbot_handler_seconds", "Handler latency", ("router", "handler"), stage="handler"
+)
+HANDLER_ERRORS = REGISTRY.counter(
+    "naborbot_handler_errors_total", "Handler exceptions", ("router", "handler")
+)
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "naborbot_upstream_requests_total", "Upstream HTTP requests", ("service", "endpoint", "status")
+)
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "naborbot_upstream_seconds", "Upstream HTTP latency", ("service", "endpoint"), stage="upstream"
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "naborbot_db_query_seconds", "Database operation latency", ("op",), stage="db"
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "naborbot_cache_requests_total", "Cache lookups", ("cache", "result")
+)
+RENDER_SECONDS = REGISTRY.histogram(
+    "naborbot_render_seconds", "Image render time", ("kind",), stage="render"
+)
+SCRAPE_SECONDS = REGISTRY.histogram(
+    "naborbot_scrape_seconds", "Scrape (fetch + parse) time", ("source",), stage="scrape"
+)
+WATCH_POLLS = REGISTRY.counter(
+    "naborbot_watch_polls_total", "Watch target polls", ("target", "source")
+)
+OUTBOX_MESSAGES = REGISTRY.counter(
+    "naborbot_outbox_messages_total", "Outbox deliveries and flood-control events", ("status",)
+)
+OUTBOUND_WAIT_SECONDS = REGISTRY.histogram(
+    "naborbot_outbound_wait_seconds", "Wait for Telegram send rate limit", ("priority",), stage="outbound"
+)
+INLINE_QUERIES = REGISTRY.counter(
+    "naborbot_inline_queries_total", "Inline query answers by outcome", ("outcome",)
+)
+UPGRADE_RENDERS = REGISTRY.counter(
+    "naborbot_upgrade_renders_total", "Upgrade image requests by mode and outcome", ("mode", "outcome")
+)
+DB_FILE_BYTES = REGISTRY.gauge(
+    "naborbot_db_file_bytes", "SQLite database and WAL file sizes", ("file",)
+)
+DB_FREELIST_PAGES = REGISTRY.gauge(
+    "naborbot_db_freelist_pages", "Unused pages inside the SQLite database file"
+)
+DB_MAINTENANCE_SECONDS = REGISTRY.histogram(
+    "naborbot_db_maintenance_seconds", "SQLite maintenance step time", ("task",)
+)
+DB_CHECKPOINTS = REGISTRY.counter(
+    "naborbot_db_checkpoints_total", "WAL checkpoints by mode and result", ("mode", "result")
+)
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    "naborbot_startup_seconds", "Seconds from process start to startup phase", ("phase",)
+)
+
+
+def cache_hit(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
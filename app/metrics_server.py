@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from aiohttp import web
+
+from app.metrics import REGISTRY
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        text=REGISTRY.render(),
+        content_type="text/plain",
+        charset="utf-8",
+        headers={"X-Content-Type-Options": "nosniff"},
+    )
+
+
+def add_metrics_route(app: web.Application, path: str = "/metrics") -> None:
+    app.router.add_get(path, metrics_handler)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Отдельный маленький HTTP-сервер для /metrics (в обоих режимах; на порт вебхука метрики не выставляются)."""
+    app = web.Application()
+    add_metrics_route(app)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
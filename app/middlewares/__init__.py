@@ -0,0 +1,34 @@
+from aiogram import Dispatcher
+
+from app.config import Config
+from .metrics import HandlerMetricsMiddleware
+from .throttling import ExpensiveGuardMiddleware
+
+
+def setup_middlewares(dp: Dispatcher, cfg: Config) -> None:
+    if cfg.profile_sample_rate > 0 or cfg.slow_update_ms > 0:
+        # импорт только при включении: при выключенном профилировании middleware нет вообще
+        from .profiling import ProfilingMiddleware
+
+        dp.update.outer_middleware(
+            ProfilingMiddleware(
+                out_dir=cfg.profile_dir,
+                sample_rate=cfg.profile_sample_rate,
+                slow_threshold=cfg.slow_update_ms / 1000,
+                max_files=cfg.profile_max_files,
+            )
+        )
+
+    handler_metrics = HandlerMetricsMiddleware()
+    dp.message.middleware(handler_metrics)
+    dp.callback_query.middleware(handler_metrics)
+    dp.inline_query.middleware(handler_metrics)
+
+    guard = ExpensiveGuardMiddleware(
+        max_inflight=cfg.expensive_max_inflight,
+        burst=cfg.expensive_burst,
+        refill_seconds=cfg.expensive_refill_seconds,
+    )
+    # inner-middleware: срабатывает только когда хендлер уже выбран (нужны его флаги)
+    dp.message.middleware(guard)
+    dp.callback_query.middleware(guard)
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+
+class UpdateConcurrencyMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на update: одновременно обрабатывается не больше limit апдейтов.
+    Заодно считает апдейты «в работе», чтобы при остановке дождаться их (drain).
+    """
+
+    def __init__(self, limit: int):
+        self._sem = asyncio.Semaphore(max(1, limit))
+        self._active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        self._active += 1
+        self._idle.clear()
+        try:
+            async with self._sem:
+                return await handler(event, data)
+        finally:
+            self._active -= 1
+            if self._active == 0:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Ждёт, пока все начатые апдейты доработают. False — не успели за timeout."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.metrics import HANDLER_ERRORS, HANDLER_SECONDS
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: время работы хендлера с метками router/handler."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        router = data.get("event_router")
+        handler_obj = data.get("handler")
+        labels = {
+            "router": getattr(router, "name", "") or "",
+            "handler": getattr(getattr(handler_obj, "callback", None), "__name__", "") or "",
+        }
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(**labels)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, **labels)
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import logging
+from typing import Hashable, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from app.metrics import OUTBOUND_WAIT_SECONDS, OUTBOX_MESSAGES
+from app.ratelimit import PriorityRateLimiter
+from app.services.outbox import OUTBOUND_PRIORITY
+
+log = logging.getLogger(__name__)
+
+# лимиты Telegram: ~1 сообщение в секунду в личный чат (короткие всплески можно), 20 в минуту в группу
+PRIVATE_CHAT_LIMITS = (1.0, 3.0)
+GROUP_CHAT_LIMITS = (20 / 60, 3.0)
+# дольше ждать в хендлере бессмысленно — пусть ошибка уйдёт наверх
+MAX_RETRY_AFTER = 60
+
+
+def chat_limits(chat_id: Hashable) -> Tuple[float, float]:
+    if isinstance(chat_id, int) and chat_id > 0:
+        return PRIVATE_CHAT_LIMITS
+    return GROUP_CHAT_LIMITS
+
+
+def _is_outgoing(method: TelegramMethod) -> bool:
+    # sendMessage/sendPhoto/editMessageText/copyMessage/... — всё, что пишет в чат
+    name = getattr(method, "__api_method__", "")
+    return name.startswith(("send", "edit", "copy", "forward")) and getattr(method, "chat_id", None) is not None
+
+
+class OutboundLimitMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: каждый исходящий запрос в чат ждёт токен в общем ведре и в ведре чата.
+    Ответы хендлеров идут с приоритетом 0, outbox выставляет свой через OUTBOUND_PRIORITY —
+    поэтому рассылка не задерживает ответы пользователям. На RetryAfter чат ставится на паузу
+    и запрос повторяется (не больше retries раз).
+    """
+
+    def __init__(self, limiter: PriorityRateLimiter, retries: int = 2):
+        self.limiter = limiter
+        self.retries = retries
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if not _is_outgoing(method):
+            return await make_request(bot, method)
+
+        chat_id = method.chat_id
+        priority = OUTBOUND_PRIORITY.get()
+        attempt = 0
+        while True:
+            with OUTBOUND_WAIT_SECONDS.time(priority=str(priority)):
+                await self.limiter.acquire(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                OUTBOX_MESSAGES.inc(status="flood")
+                self.limiter.pause(chat_id, e.retry_after)
+                if attempt >= self.retries or e.retry_after > MAX_RETRY_AFTER:
+                    raise
+                attempt += 1
+                log.warning("RetryAfter %ss for chat %s, retrying", e.retry_after, chat_id)
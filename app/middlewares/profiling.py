@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.metrics import STAGES
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на update (включается только из конфига).
+
+    - для каждого апдейта собирает разбивку времени по стадиям (upstream/db/render/...)
+      и, если апдейт дольше slow_threshold, пишет её строкой JSON в slow_updates.jsonl
+      (ротация по размеру);
+    - долю sample_rate апдейтов прогоняет под cProfile и сохраняет .pstats в out_dir,
+      оставляя последние max_files файлов.
+
+    cProfile глобален для потока: пока профилируется один апдейт, в профиль попадают и
+    параллельные корутины, поэтому одновременно профилируем не больше одного апдейта.
+    """
+
+    def __init__(self, out_dir: str, sample_rate: float, slow_threshold: float, max_files: int = 50):
+        self.out_dir = out_dir
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.max_files = max_files
+        self._profiling = False
+
+        os.makedirs(out_dir, exist_ok=True)
+        self._slow_log = logging.getLogger("naborbot.slow_updates")
+        self._slow_log.propagate = False
+        if not self._slow_log.handlers:
+            handler = RotatingFileHandler(
+                os.path.join(out_dir, "slow_updates.jsonl"),
+                maxBytes=5 * 1024 * 1024,
+                backupCount=5,
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._slow_log.addHandler(handler)
+            self._slow_log.setLevel(logging.INFO)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        stages: Dict[str, float] = {}
+        token = STAGES.set(stages)
+
+        profiler = None
+        if self.sample_rate > 0 and not self._profiling and random.random() < self.sample_rate:
+            self._profiling = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            STAGES.reset(token)
+
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                await asyncio.to_thread(self._dump_profile, profiler, event, elapsed)
+
+            if self.slow_threshold > 0 and elapsed >= self.slow_threshold:
+                self._log_slow(event, elapsed, stages)
+
+    def _log_slow(self, event: TelegramObject, elapsed: float, stages: Dict[str, float]) -> None:
+        record = {
+            "ts": datetime.utcnow().isoformat(),
+            "update_id": getattr(event, "update_id", None),
+            "type": event.event_type if isinstance(event, Update) else type(event).__name__,
+            "total_ms": round(elapsed * 1000, 1),
+            "unaccounted_ms": round(max(0.0, elapsed - _top_level_sum(stages)) * 1000, 1),
+            "stages_ms": {k: round(v * 1000, 1) for k, v in sorted(stages.items(), key=lambda kv: -kv[1])},
+        }
+        self._slow_log.info(json.dumps(record, ensure_ascii=False))
+
+    def _dump_profile(self, profiler: cProfile.Profile, event: TelegramObject, elapsed: float) -> None:
+        update_id = getattr(event, "update_id", 0)
+        name = f"update-{datetime.utcnow():%Y%m%d-%H%M%S}-{update_id}-{int(elapsed * 1000)}ms.pstats"
+        profiler.dump_stats(os.path.join(self.out_dir, name))
+
+        files = sorted(
+            (f for f in os.listdir(self.out_dir) if f.endswith(".pstats")),
+            key=lambda f: os.path.getmtime(os.path.join(self.out_dir, f)),
+        )
+        for old in files[: max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.out_dir, old))
+            except OSError:
+                pass
+
+
+def _top_level_sum(stages: Dict[str, float]) -> float:
+    # хендлер включает в себя всё остальное; если его нет — складываем стадии как есть
+    handler_total = sum(v for k, v in stages.items() if k.startswith("handler:"))
+    if handler_total:
+        return handler_total
+    return sum(stages.values())
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.metrics import STARTUP_SECONDS
+
+log = logging.getLogger(__name__)
+
+
+class FirstUpdateMiddleware(BaseMiddleware):
+    """Outer-middleware на update: время от старта процесса до обработки первого апдейта."""
+
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.done = False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if self.done:
+            return await handler(event, data)
+        try:
+            return await handler(event, data)
+        finally:
+            if not self.done:
+                self.done = True
+                elapsed = time.perf_counter() - self.started_at
+                STARTUP_SECONDS.set(elapsed, phase="first_update")
+                log.info("Startup: first update handled %.0f ms after process start", elapsed * 1000)
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+import math
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from app.ratelimit import TokenBucket
+
+
+class ExpensiveGuardMiddleware(BaseMiddleware):
+    """
+    Защита «тяжёлых» хендлеров (рендер картинки, скрейп RoyaleAPI).
+    Хендлер помечается флагом: @flags.expensive("upgrade").
+
+    - если такой же запрос пользователя ещё выполняется — новый не запускаем,
+      а ждём окончания текущего (ответ пользователь получит один);
+    - у одного пользователя одновременно не больше max_inflight тяжёлых операций;
+    - каждый новый запуск тратит токен из ведра пользователя (burst штук,
+      +1 раз в refill_seconds). Ведро пустое — отвечаем, что надо подождать.
+    """
+
+    def __init__(self, max_inflight: int = 2, burst: int = 3, refill_seconds: float = 10.0):
+        self.max_inflight = max(1, max_inflight)
+        self.burst = max(1, burst)
+        self.refill_rate = 1.0 / refill_seconds if refill_seconds > 0 else float("inf")
+
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._inflight: Dict[int, int] = {}
+        self._running: Dict[Tuple[int, str, str], asyncio.Future] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        kind = get_flag(data, "expensive")
+        user = data.get("event_from_user")
+        if not kind or user is None:
+            return await handler(event, data)
+
+        key = (user.id, str(kind), _event_key(event))
+
+        running = self._running.get(key)
+        if running is not None:
+            # такой же запрос уже в работе — присоединяемся к нему
+            await asyncio.shield(running)
+            if isinstance(event, CallbackQuery):
+                await event.answer()
+            return None
+
+        if self._inflight.get(user.id, 0) >= self.max_inflight:
+            await _reply_throttled(event, "⏳ Предыдущие запросы ещё выполняются, подожди немного.")
+            return None
+
+        bucket = self._bucket(user.id)
+        if not bucket.try_take():
+            wait = max(1, math.ceil(bucket.wait_time()))
+            await _reply_throttled(event, f"⏳ Слишком часто. Попробуй через {wait} сек.")
+            return None
+
+        done = asyncio.get_running_loop().create_future()
+        self._running[key] = done
+        self._inflight[user.id] = self._inflight.get(user.id, 0) + 1
+        try:
+            return await handler(event, data)
+        finally:
+            self._running.pop(key, None)
+            left = self._inflight.get(user.id, 1) - 1
+            if left > 0:
+                self._inflight[user.id] = left
+            else:
+                self._inflight.pop(user.id, None)
+            done.set_result(None)
+
+    def _bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) > 10_000:
+                self._prune()
+            bucket = TokenBucket(self.burst, self.refill_rate)
+            self._buckets[user_id] = bucket
+        return bucket
+
+    def _prune(self) -> None:
+        # полные вёдра ничем не отличаются от новых — их можно выкинуть
+        for uid in [u for u, b in self._buckets.items() if b.is_full() and u not in self._inflight]:
+            del self._buckets[uid]
+
+
+def _event_key(event: TelegramObject) -> str:
+    # объединяем только одинаковые запросы: у callback'ов аргумент (тег) — в data,
+    # у команд — в тексте (/clanwar #A и /clanwar #B — разные запросы)
+    if isinstance(event, CallbackQuery):
+        return event.data or ""
+    if isinstance(event, Message):
+        return " ".join((event.text or event.caption or "").split())
+    return ""
+
+
+async def _reply_throttled(event: TelegramObject, text: str) -> None:
+    if isinstance(event, CallbackQuery):
+        await event.answer(text)
+    elif isinstance(event, Message):
+        await event.answer(text)
@@ -0,0 +1,176 @@
+"""
+Версионные миграции схемы SQLite.
+
+SCHEMA_SQL в app/db.py — базовая схема (версия 0): её CREATE ... IF NOT EXISTS выполняются
+всегда. Всё, что меняет уже существующую базу (новые колонки, индексы, таблицы, перекодирование
+данных), — миграция с номером: версия применённой схемы лежит в PRAGMA user_version.
+
+Миграция состоит из двух частей:
+- sql — изменения схемы; выполняются в Database.init() в одной транзакции с записью
+  user_version, так что миграция либо применена целиком, либо нет. Сюда — только быстрое:
+  ALTER TABLE ADD COLUMN, CREATE TABLE, индекс на небольшой таблице. Что в транзакции
+  выполнять нельзя (VACUUM, смена auto_vacuum), — с transaction=False: такие операторы идут
+  по одному вне транзакции и должны быть идемпотентны (после сбоя выполнятся ещё раз).
+  Они могут идти долго (VACUUM переписывает весь файл), поэтому размер базы и время пишутся в лог,
+  а upgrade(skip=...) позволяет отложить такую миграцию: тогда upgrade на ней останавливается
+  (версии идут подряд, следующие тоже ждут), и она выполнится при следующем старте без skip;
+- backfill — заполнение данных. Идёт в фоне, когда бот уже работает, пачками: каждая пачка —
+  короткая транзакция, в той же транзакции сохраняется курсор (таблица schema_backfill),
+  между пачками пауза, чтобы запись хендлеров не ждала. После рестарта продолжает с курсора.
+
+Код, читающий новые данные, должен работать и с недозаполненной таблицей.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Collection, List, Optional, Sequence, Tuple
+
+import aiosqlite
+
+log = logging.getLogger(__name__)
+
+BACKFILL_BATCH = 200
+BACKFILL_PAUSE = 0.05
+
+# (соединение, курсор или None в начале, размер пачки) -> (новый курсор или None — готово, обработано строк)
+BackfillStep = Callable[[aiosqlite.Connection, Optional[str], int], Awaitable[Tuple[Optional[str], int]]]
+
+_BOOKKEEPING_SQL = """
+CREATE TABLE IF NOT EXISTS schema_backfill (
+  version INTEGER PRIMARY KEY,
+  cursor TEXT,
+  rows INTEGER NOT NULL DEFAULT 0,
+  done_at TEXT
+);
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: Sequence[str] = ()
+    backfill: Optional[BackfillStep] = None
+    transaction: bool = True
+
+
+def _check(migrations: Sequence[Migration]) -> None:
+    for i, m in enumerate(migrations, start=1):
+        if m.version != i:
+            raise ValueError(f"migration #{i} has version {m.version}: versions must go 1, 2, 3, ...")
+
+
+async def schema_version(db: aiosqlite.Connection) -> int:
+    cur = await db.execute("PRAGMA user_version")
+    row = await cur.fetchone()
+    return int(row[0]) if row else 0
+
+
+async def _db_bytes(db: aiosqlite.Connection) -> int:
+    out = 1
+    for name in ("page_count", "page_size"):
+        cur = await db.execute(f"PRAGMA {name}")
+        out *= int((await cur.fetchone())[0])
+    return out
+
+
+async def upgrade(
+    db: aiosqlite.Connection, migrations: Sequence[Migration], skip: Collection[int] = ()
+) -> List[int]:
+    """
+    Применяет sql недостающих миграций по порядку; возвращает версии, применённые сейчас.
+    Дойдя до версии из skip, останавливается: она и все следующие ждут следующего запуска.
+    """
+    _check(migrations)
+    await db.executescript(_BOOKKEEPING_SQL)
+    applied: List[int] = []
+    for m in migrations:
+        if m.version in skip and m.version > await schema_version(db):
+            log.warning(
+                "schema: migration %s (%s) is skipped; it and later migrations wait for a start without the skip",
+                m.version, m.name,
+            )
+            break
+        if not m.transaction and m.version > await schema_version(db):
+            size = await _db_bytes(db)
+            log.info("schema: running migration %s (%s) on a %.1f MiB database", m.version, m.name, size / 2**20)
+            started = time.monotonic()
+            for stmt in m.sql:
+                await db.execute(stmt)
+            log.info(
+                "schema: migration %s (%s) took %.1fs, database is %.1f MiB now",
+                m.version, m.name, time.monotonic() - started, await _db_bytes(db) / 2**20,
+            )
+        # IMMEDIATE: версию перечитываем уже под блокировкой записи — второй процесс,
+        # стартующий одновременно, увидит применённую миграцию и пропустит её
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            if m.version <= await schema_version(db):
+                await db.rollback()
+                continue
+            if m.transaction:
+                for stmt in m.sql:
+                    await db.execute(stmt)
+            if m.backfill is not None:
+                await db.execute(
+                    "INSERT OR REPLACE INTO schema_backfill(version, cursor, rows, done_at) VALUES(?, NULL, 0, NULL)",
+                    (m.version,),
+                )
+            await db.execute(f"PRAGMA user_version={int(m.version)}")
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+        log.info("schema: applied migration %s (%s)", m.version, m.name)
+        applied.append(m.version)
+
+    current = await schema_version(db)
+    if migrations and current > migrations[-1].version:
+        log.warning("schema: database is at version %s, code knows only up to %s", current, migrations[-1].version)
+    return applied
+
+
+async def run_backfills(
+    path: str,
+    migrations: Sequence[Migration],
+    batch: int = BACKFILL_BATCH,
+    pause: float = BACKFILL_PAUSE,
+) -> int:
+    """Доделывает незавершённые backfill по порядку версий; возвращает число обработанных строк."""
+    by_version = {m.version: m for m in migrations}
+    async with aiosqlite.connect(path) as db:
+        cur = await db.execute(
+            "SELECT version, cursor FROM schema_backfill WHERE done_at IS NULL ORDER BY version"
+        )
+        pending = await cur.fetchall()
+
+    total = 0
+    for version, cursor in pending:
+        m = by_version.get(version)
+        if m is None or m.backfill is None:
+            continue
+        rows = 0
+        while True:
+            async with aiosqlite.connect(path) as db:
+                await db.execute("BEGIN IMMEDIATE")
+                try:
+                    cursor, n = await m.backfill(db, cursor, batch)
+                    await db.execute(
+                        "UPDATE schema_backfill SET cursor=?, rows=rows+?, done_at=? WHERE version=?",
+                        (cursor, n, None if cursor is not None else datetime.utcnow().isoformat(), version),
+                    )
+                    await db.commit()
+                except BaseException:
+                    await db.rollback()
+                    raise
+            rows += n
+            if cursor is None:
+                break
+            await asyncio.sleep(pause)
+        log.info("schema: backfill of migration %s (%s) done, %s rows", version, m.name, rows)
+        total += rows
+    return total
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from app.cards import display_level
+
+# фильтр /find -> колонка player_index
+FILTER_COLUMNS = {
+    "tr": "trophies",
+    "best": "best_trophies",
+    "exp": "exp_level",
+    "l14": "cards_14",
+    "l15": "cards_15",
+    "l16": "cards_16",
+    "evo": "evo_count",
+    "hero": "hero_count",
+}
+
+# сортировки — только по колонкам с индексом (col, player_tag): иначе keyset-пагинация не дешёвая
+SORT_COLUMNS = {
+    "tr": "trophies",
+    "best": "best_trophies",
+    "l16": "cards_16",
+}
+
+_FILTER_RE = re.compile(r"^([a-z0-9]+)(>=|<=|=|>|<)(\d+)$")
+
+
+class FindQueryError(ValueError):
+    pass
+
+
+def player_index_row(player: Dict[str, Any]) -> Dict[str, Any]:
+    """Колонки для поиска из снапшота /players/{tag}."""
+    cards = player.get("cards") or []
+    levels = [dl for dl in (display_level(c) for c in cards) if dl is not None]
+    evo = [c for c in cards if isinstance(c.get("evolutionLevel"), int) and c["evolutionLevel"] > 0]
+    # герои — как в картинке прокачки: heroMedium без evolutionMedium и открытый уровень
+    heroes = [
+        c for c in evo
+        if (c.get("iconUrls") or {}).get("heroMedium") and not (c.get("iconUrls") or {}).get("evolutionMedium")
+    ]
+    return {
+        "name": player.get("name") or "",
+        "trophies": int(player.get("trophies") or 0),
+        "best_trophies": int(player.get("bestTrophies") or 0),
+        "exp_level": int(player.get("expLevel") or 0),
+        "clan_tag": (player.get("clan") or {}).get("tag"),
+        "cards_14": sum(1 for dl in levels if dl >= 14),
+        "cards_15": sum(1 for dl in levels if dl >= 15),
+        "cards_16": sum(1 for dl in levels if dl >= 16),
+        "evo_count": len(evo),
+        "hero_count": len(heroes),
+    }
+
+
+@dataclass
+class FindQuery:
+    filters: List[Tuple[str, str, int]] = field(default_factory=list)  # (колонка, оператор, значение)
+    no_clan: bool = False
+    sort: str = "trophies"
+
+    def key(self) -> str:
+        """Нормализованный вид запроса — по нему храним состояние пагинации."""
+        parts = [f"{c}{op}{v}" for c, op, v in sorted(self.filters)]
+        if self.no_clan:
+            parts.append("noclan")
+        parts.append(f"sort={self.sort}")
+        return " ".join(parts)
+
+
+def parse_find_args(text: str) -> FindQuery:
+    """
+    'tr>=7000 l16>=5 evo>=3 noclan sort=l16' -> FindQuery.
+    Неизвестный фильтр или оператор — FindQueryError с понятным текстом.
+    """
+    q = FindQuery()
+    for token in (text or "").lower().split():
+        if token == "noclan":
+            q.no_clan = True
+            continue
+        if token.startswith("sort="):
+            sort = token[5:]
+            if sort not in SORT_COLUMNS:
+                raise FindQueryError(f"сортировка: {', '.join(SORT_COLUMNS)}")
+            q.sort = SORT_COLUMNS[sort]
+            continue
+        m = _FILTER_RE.match(token)
+        if not m or m.group(1) not in FILTER_COLUMNS:
+            raise FindQueryError(f"не понял фильтр «{token}»")
+        q.filters.append((FILTER_COLUMNS[m.group(1)], m.group(2), int(m.group(3))))
+    return q
@@ -0,0 +1,169 @@
+"""
+История прогресса игрока без хранения полных снапшотов.
+
+Состояние = трофеи, лучший результат, уровень (exp) и по каждой карте (уровень как в игре, уровень эво).
+В таблицу progress пишутся ключевые кадры (всё состояние) и между ними дельты — только то,
+что изменилось. Состояние на момент T = последний кадр до T + дельты по порядку.
+
+Формат записи (little-endian): заголовок <iiHH (трофеи, лучший, exp, число карт),
+затем по карте <iBB (id, уровень, эво). В дельте — только изменившиеся карты; заголовок всегда целиком.
+"""
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.cards import display_level
+
+KIND_KEYFRAME = 0
+KIND_DELTA = 1
+
+# новый ключевой кадр — после стольких дельт или если прошлый кадр старше KEYFRAME_MAX_AGE.
+# Большинство дельт — только трофеи (12 байт), кадр — ~700 байт: частые кадры дороже самих дельт
+KEYFRAME_EVERY = 200
+KEYFRAME_MAX_AGE_MS = 7 * 24 * 3600 * 1000
+
+_HEADER = struct.Struct("<iiHH")
+_CARD = struct.Struct("<iBB")
+
+Cards = Dict[int, Tuple[int, int]]
+
+
+@dataclass
+class PlayerState:
+    trophies: int = 0
+    best_trophies: int = 0
+    exp_level: int = 0
+    cards: Cards = field(default_factory=dict)  # id -> (уровень как в игре, уровень эво)
+
+
+def state_from_player(player: Dict[str, Any]) -> PlayerState:
+    cards: Cards = {}
+    for c in player.get("cards") or []:
+        cid, lv = c.get("id"), display_level(c)
+        if not isinstance(cid, int) or lv is None:
+            continue
+        evo = c.get("evolutionLevel")
+        cards[cid] = (max(0, min(255, lv)), evo if isinstance(evo, int) and 0 <= evo < 256 else 0)
+    return PlayerState(
+        trophies=int(player.get("trophies") or 0),
+        best_trophies=int(player.get("bestTrophies") or 0),
+        exp_level=int(player.get("expLevel") or 0),
+        cards=cards,
+    )
+
+
+def encode(state: PlayerState, cards: Optional[Cards] = None) -> bytes:
+    """Запись: заголовок state + cards (по умолчанию — все карты state, это ключевой кадр)."""
+    cards = state.cards if cards is None else cards
+    parts = [_HEADER.pack(state.trophies, state.best_trophies, min(state.exp_level, 0xFFFF), len(cards))]
+    parts += [_CARD.pack(cid, lv, evo) for cid, (lv, evo) in sorted(cards.items())]
+    return b"".join(parts)
+
+
+def _decode(blob: bytes) -> Tuple[int, int, int, Cards]:
+    trophies, best, exp, n = _HEADER.unpack_from(blob, 0)
+    cards: Cards = {}
+    off = _HEADER.size
+    for _ in range(n):
+        cid, lv, evo = _CARD.unpack_from(blob, off)
+        cards[cid] = (lv, evo)
+        off += _CARD.size
+    return trophies, best, exp, cards
+
+
+def diff(old: PlayerState, new: PlayerState) -> Optional[Cards]:
+    """Изменившиеся карты (новые и прокачанные) или None, если не изменилось вообще ничего."""
+    changed = {cid: v for cid, v in new.cards.items() if old.cards.get(cid) != v}
+    same_header = (old.trophies, old.best_trophies, old.exp_level) == (
+        new.trophies,
+        new.best_trophies,
+        new.exp_level,
+    )
+    if not changed and same_header:
+        return None
+    return changed
+
+
+def apply(state: Optional[PlayerState], kind: int, blob: bytes) -> PlayerState:
+    trophies, best, exp, cards = _decode(blob)
+    if kind == KIND_KEYFRAME or state is None:
+        return PlayerState(trophies, best, exp, cards)
+    if not cards:
+        # словарь карт состояний не меняется на месте — можно делить между соседними состояниями
+        return PlayerState(trophies, best, exp, state.cards)
+    merged = dict(state.cards)
+    merged.update(cards)
+    return PlayerState(trophies, best, exp, merged)
+
+
+def replay(rows: Iterable[Tuple[int, int, bytes]]) -> List[Tuple[int, PlayerState]]:
+    """(ts, kind, data) по возрастанию ts, начиная с ключевого кадра -> [(ts, состояние)]."""
+    out: List[Tuple[int, PlayerState]] = []
+    state: Optional[PlayerState] = None
+    for ts, kind, blob in rows:
+        state = apply(state, kind, blob)
+        out.append((ts, state))
+    return out
+
+
+def state_at(timeline: List[Tuple[int, PlayerState]], ts: int) -> Optional[PlayerState]:
+    """Последнее состояние не позже ts (timeline — результат replay)."""
+    found = None
+    for t, state in timeline:
+        if t > ts:
+            break
+        found = state
+    return found
+
+
+# -------- сводка для /progress --------
+
+
+@dataclass
+class ProgressSummary:
+    since_ts: int
+    trophies: Tuple[int, int]
+    trophies_peak: int
+    best_trophies: Tuple[int, int]
+    exp_level: Tuple[int, int]
+    new_cards: int
+    upgrades: int                      # сколько раз карты поднялись на уровень (сумма по картам)
+    reached: Dict[int, int]            # уровень -> сколько карт впервые дошли до него (14, 15, 16)
+    new_evos: int
+
+
+def summarize(timeline: List[Tuple[int, PlayerState]], since_ts: int) -> Optional[ProgressSummary]:
+    if not timeline:
+        return None
+    start = state_at(timeline, since_ts) or timeline[0][1]
+    end = timeline[-1][1]
+    peak = max((s.trophies for t, s in timeline if t >= since_ts), default=end.trophies)
+
+    reached = {14: 0, 15: 0, 16: 0}
+    upgrades = new_cards = new_evos = 0
+    for cid, (lv, evo) in end.cards.items():
+        old = start.cards.get(cid)
+        old_lv, old_evo = old if old else (0, 0)
+        if old is None:
+            new_cards += 1
+        else:
+            upgrades += max(0, lv - old_lv)
+        for target in reached:
+            if old_lv < target <= lv:
+                reached[target] += 1
+        if evo > 0 and old_evo == 0:
+            new_evos += 1
+
+    return ProgressSummary(
+        since_ts=since_ts,
+        trophies=(start.trophies, end.trophies),
+        trophies_peak=max(peak, start.trophies),
+        best_trophies=(start.best_trophies, end.best_trophies),
+        exp_level=(start.exp_level, end.exp_level),
+        new_cards=new_cards,
+        upgrades=upgrades,
+        reached=reached,
+        new_evos=new_evos,
+    )
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import suppress
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class TokenBucket:
+    """
+    Ведро токенов: вмещает capacity токенов, пополняется со скоростью rate токенов/сек.
+    Не асинхронное — только считает, сколько можно потратить прямо сейчас.
+    """
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def try_take(self, n: float = 1.0) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    def wait_time(self, n: float = 1.0) -> float:
+        """Сколько секунд ждать, пока в ведре появится n токенов."""
+        self._refill(time.monotonic())
+        if self.tokens >= n:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (n - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class AsyncRateLimiter:
+    """
+    Асинхронный лимитер на ведре токенов: acquire() ждёт, пока появится токен.
+    При burst=1 вызовы идут равномерно — не чаще одного раза в 1/rate секунд.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self._bucket = TokenBucket(burst, rate)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, n: float = 1.0) -> None:
+        # лок — чтобы ждущие получали токены по очереди, а не все разом
+        async with self._lock:
+            while not self._bucket.try_take(n):
+                await asyncio.sleep(self._bucket.wait_time(n))
+
+
+class PriorityRateLimiter:
+    """
+    Общее ведро (rate/burst) плюс отдельное ведро на каждый ключ (например, чат Telegram).
+    Лимиты ключа задаёт key_limits(key) -> (rate, burst); без него вёдер по ключам нет.
+
+    Пока токенов в общем ведре хватает — пропускает сразу. Когда не хватает, ждущие встают
+    в очередь по (priority, порядок прихода): меньший priority получает токен первым.
+    Своё ведро ключ ждёт отдельно и общую очередь при этом не держит.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float = 1.0,
+        key_limits: Optional[Callable[[Hashable], Tuple[float, float]]] = None,
+        max_keys: int = 10_000,
+    ):
+        self._bucket = TokenBucket(burst, rate)
+        self._key_limits = key_limits
+        self._keys: Dict[Hashable, TokenBucket] = {}
+        self._max_keys = max_keys
+        self._paused: Dict[Hashable, float] = {}
+        self._waiting: List[List[int]] = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+
+    def _key_bucket(self, key: Hashable) -> Optional[TokenBucket]:
+        if self._key_limits is None or key is None:
+            return None
+        bucket = self._keys.get(key)
+        if bucket is None:
+            if len(self._keys) >= self._max_keys:
+                # полные вёдра ничем не отличаются от новых — их можно выкинуть
+                for k in [k for k, b in self._keys.items() if b.is_full()]:
+                    del self._keys[k]
+            rate, burst = self._key_limits(key)
+            bucket = self._keys[key] = TokenBucket(burst, rate)
+        return bucket
+
+    def pause(self, key: Hashable, seconds: float) -> None:
+        """Ключ не получает токенов seconds секунд (например, после RetryAfter); общее ведро — осушаем."""
+        now = time.monotonic()
+        self._paused[key] = max(self._paused.get(key, 0.0), now + seconds)
+        if len(self._paused) > self._max_keys:
+            self._paused = {k: t for k, t in self._paused.items() if t > now}
+        self._bucket.tokens = min(self._bucket.tokens, 0.0)
+
+    async def _acquire_key(self, key: Hashable) -> None:
+        bucket = self._key_bucket(key)
+        while True:
+            paused = self._paused.get(key, 0.0) - time.monotonic()
+            if paused <= 0 and (bucket is None or bucket.try_take()):
+                return
+            await asyncio.sleep(max(paused, bucket.wait_time() if bucket is not None else 0.0, 0.001))
+
+    async def acquire(self, key: Hashable = None, priority: int = 0) -> None:
+        await self._acquire_key(key)
+        if not self._waiting and self._bucket.try_take():
+            return
+        entry = [priority, next(self._seq)]
+        async with self._cond:
+            heapq.heappush(self._waiting, entry)
+            self._cond.notify_all()
+            try:
+                while True:
+                    if self._waiting[0] is entry:
+                        wait = self._bucket.wait_time()
+                        if wait <= 0 and self._bucket.try_take():
+                            return
+                        # проснёмся раньше, если придёт ждущий с более высоким приоритетом
+                        with suppress(asyncio.TimeoutError):
+                            await asyncio.wait_for(self._cond.wait(), wait)
+                    else:
+                        await self._cond.wait()
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import struct
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.db import Database
+from app.services.clash_api import ClashApi
+
+log = logging.getLogger(__name__)
+
+# типы боёв клановой войны (river race): обычные, дуэли, колизей и лодочные
+WAR_BATTLE_TYPES = frozenset({
+    "riverRacePvP",
+    "riverRaceDuel",
+    "riverRaceDuelColosseum",
+    "boatBattle",
+})
+
+# день КВ начинается не в полночь UTC, а около 10:00 UTC (см. Database.war_day_battles)
+WAR_DAY_OFFSET = 10 * 3600
+
+
+def parse_battle_time(value: str) -> int:
+    """'20240131T101530.000Z' -> unix-время (секунды)."""
+    dt = datetime.strptime(value.split(".")[0], "%Y%m%dT%H%M%S")
+    return int(dt.replace(tzinfo=timezone.utc).timestamp())
+
+
+def pack_deck(card_ids: List[int]) -> bytes:
+    ids = sorted(card_ids)
+    return struct.pack(f"<{len(ids)}i", *ids)
+
+
+def unpack_deck(blob: bytes) -> List[int]:
+    return list(struct.unpack(f"<{len(blob) // 4}i", blob))
+
+
+def battle_key(battle_time: str, tags: List[str]) -> int:
+    """
+    Один и тот же бой приходит в battlelog каждого участника —
+    ключ из времени и отсортированных тегов совпадает у всех. 64 бита хеша, со знаком (INTEGER в SQLite).
+    """
+    raw = battle_time + "|" + ",".join(sorted(tags))
+    return struct.unpack("<q", hashlib.sha1(raw.encode("utf-8")).digest()[:8])[0]
+
+
+def _side_crowns(side: List[Dict[str, Any]]) -> int:
+    # в 2v2 короны у напарников одинаковые — берём максимум
+    return max((int(p.get("crowns") or 0) for p in side), default=0)
+
+
+def parse_battle(raw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Бой из /battlelog -> компактная запись для Database.save_battles (None, если бой неполный)."""
+    team = raw.get("team") or []
+    opponent = raw.get("opponent") or []
+    time_str = raw.get("battleTime")
+    if not time_str or not team or not opponent:
+        return None
+
+    crowns = (_side_crowns(team), _side_crowns(opponent))
+    players = []
+    for side, members in enumerate((team, opponent)):
+        mine, theirs = crowns[side], crowns[1 - side]
+        outcome = (mine > theirs) - (mine < theirs)
+        for p in members:
+            if not p.get("tag"):
+                continue
+            card_names: List[Tuple[int, str]] = [
+                (c["id"], c.get("name", "")) for c in p.get("cards") or [] if isinstance(c.get("id"), int)
+            ]
+            players.append({
+                "tag": p["tag"],
+                "side": side,
+                "crowns": int(p.get("crowns") or 0),
+                "outcome": outcome,
+                "deck": pack_deck([cid for cid, _ in card_names]) if card_names else None,
+                "card_names": card_names,
+            })
+
+    btype = raw.get("type") or ""
+    return {
+        "key": battle_key(time_str, [p["tag"] for p in players]),
+        "time": parse_battle_time(time_str),
+        "type": btype,
+        "game_mode_id": (raw.get("gameMode") or {}).get("id"),
+        "is_war": btype in WAR_BATTLE_TYPES,
+        "players": players,
+    }
+
+
+class BattlelogIngestor:
+    """
+    Инкрементальная загрузка battlelog: API отдаёт только ~25 последних боёв,
+    поэтому забираем их регулярно (вместе с фоновым обновлением профилей) и
+    сохраняем только то, что новее курсора тега.
+    """
+
+    def __init__(self, db: Database, clash_api: ClashApi):
+        self.db = db
+        self.clash_api = clash_api
+
+    async def ingest(self, tag: str) -> int:
+        raw = await self.clash_api.get_battlelog(tag)
+        if not isinstance(raw, list):
+            return 0
+
+        cursor = await self.db.get_battlelog_cursor(tag)
+        battles = []
+        for item in raw:
+            try:
+                b = parse_battle(item)
+            except (KeyError, TypeError, ValueError):
+                log.debug("Skip malformed battle for %s", tag, exc_info=True)
+                continue
+            # равные курсору тоже берём: в ту же секунду мог закончиться и другой бой, дубли отсеет battle_key
+            if b is not None and b["time"] >= cursor:
+                battles.append(b)
+
+        if not battles:
+            return 0
+        return await self.db.save_battles(tag, battles, max(b["time"] for b in battles))
@@ -0,0 +1,136 @@
+"""
+Аналитика уровней карт сразу по многим игрокам на NumPy.
+
+Уровни раскладываются в матрицу игроки × карты (int8, уровень как в игре, 0 — карты нет),
+дальше гистограммы, «карт уровня ≥N», перцентили и сравнение считаются целыми массивами,
+без цикла по словарям каждого игрока. Функции для одного профиля — частный случай (1 × карты).
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.cards import MAX_LEVEL
+
+N_LEVELS = MAX_LEVEL + 1  # индекс = уровень, 0 — «нет карты / уровень неизвестен»
+
+# веса для сравнительного балла: карта 16 уровня стоит больше, чем 14
+SCORE_WEIGHTS = {14: 1.0, 15: 2.0, 16: 4.0}
+
+
+def _levels_from_arrays(lv: np.ndarray, mx: np.ndarray) -> np.ndarray:
+    out = np.where((mx > 0) & (lv > 0), lv + (MAX_LEVEL - mx), 0)
+    return np.clip(out, 0, MAX_LEVEL).astype(np.int8)
+
+
+def _int_or_zero(v: Any) -> int:
+    return v if isinstance(v, int) else 0
+
+
+def display_levels(cards: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Уровни карт одного игрока (как app.cards.display_level, векторно); 0 — если посчитать нельзя."""
+    lv = np.array([_int_or_zero(c.get("level")) for c in cards], dtype=np.int16)
+    mx = np.array([_int_or_zero(c.get("maxLevel")) for c in cards], dtype=np.int16)
+    return _levels_from_arrays(lv, mx)
+
+
+def level_matrix(players: Sequence[Dict[str, Any]]) -> Tuple[np.ndarray, List[int]]:
+    """
+    Матрица игроки × карты по снапшотам /players/{tag}.
+    Столбцы — объединение id карт всех игроков (возвращается вторым значением).
+    Сборка — единственный проход по словарям, и он же самый дорогой: матрицу пула
+    стоит собрать один раз и считать по ней сколько угодно срезов.
+    """
+    # один проход по словарям в плоские списки, дальше — только массивы
+    card_ids: Dict[Any, int] = {}
+    counts: List[int] = []
+    cols: List[int] = []
+    lv: List[int] = []
+    mx: List[int] = []
+    for p in players:
+        cards = p.get("cards") or []
+        counts.append(len(cards))
+        for c in cards:
+            cols.append(card_ids.setdefault(c.get("id"), len(card_ids)))
+            lv.append(_int_or_zero(c.get("level")))
+            mx.append(_int_or_zero(c.get("maxLevel")))
+
+    m = np.zeros((len(players), len(card_ids)), dtype=np.int8)
+    rows = np.repeat(np.arange(len(players)), counts)
+    m[rows, np.fromiter(cols, dtype=np.int64, count=len(cols))] = _levels_from_arrays(
+        np.fromiter(lv, dtype=np.int16, count=len(lv)),
+        np.fromiter(mx, dtype=np.int16, count=len(mx)),
+    )
+    return m, list(card_ids)
+
+
+def level_histograms(m: np.ndarray) -> np.ndarray:
+    """(игроки × карты) -> (игроки × N_LEVELS): сколько карт каждого уровня у каждого игрока."""
+    n_players = m.shape[0]
+    # сдвигаем уровни строки i на i * N_LEVELS — одна bincount на всю матрицу
+    flat = m.astype(np.int64) + (np.arange(n_players, dtype=np.int64) * N_LEVELS)[:, None]
+    return np.bincount(flat.ravel(), minlength=n_players * N_LEVELS).reshape(n_players, N_LEVELS)
+
+
+def count_ge(hist: np.ndarray, level: int) -> np.ndarray:
+    """Сколько карт уровня ≥ level (по гистограммам игроков)."""
+    return hist[..., max(1, level):].sum(axis=-1)
+
+
+def cumulative_ge(hist: np.ndarray) -> np.ndarray:
+    """[..., lv] = карт уровня ≥ lv — для всех уровней сразу (уровень 0 не считается)."""
+    h = hist.copy()
+    h[..., 0] = 0
+    return h[..., ::-1].cumsum(axis=-1)[..., ::-1]
+
+
+def level_distribution(m: np.ndarray) -> np.ndarray:
+    """Распределение уровней по всей группе (например, клану): N_LEVELS счётчиков."""
+    return np.bincount(m.ravel().astype(np.int64), minlength=N_LEVELS)
+
+
+def comparison_scores(hist: np.ndarray, weights: Optional[Dict[int, float]] = None) -> np.ndarray:
+    """Балл прокачки: взвешенное число карт 14, 15 и 16 уровня (веса по умолчанию — SCORE_WEIGHTS)."""
+    weights = weights or SCORE_WEIGHTS
+    w = np.zeros(N_LEVELS, dtype=np.float64)
+    for lv, weight in weights.items():
+        w[lv] = weight
+    return hist @ w
+
+
+def percentile_ranks(values: np.ndarray, pool: np.ndarray) -> np.ndarray:
+    """
+    Перцентиль каждого значения относительно пула (0..100):
+    доля пула ниже значения плюс половина равных.
+    """
+    pool = np.sort(np.asarray(pool))
+    values = np.asarray(values)
+    if pool.size == 0:
+        return np.zeros(values.shape, dtype=np.float64)
+    below = np.searchsorted(pool, values, side="left")
+    upto = np.searchsorted(pool, values, side="right")
+    return (below + (upto - below) / 2) * 100.0 / pool.size
+
+
+# -------- один игрок (обёртки для профиля и картинки прокачки) --------
+
+
+def level_counts(cards: Sequence[Dict[str, Any]]) -> Dict[int, int]:
+    """{уровень: сколько карт} для одного игрока; карты без уровня не считаются."""
+    hist = np.bincount(display_levels(cards).astype(np.int64), minlength=N_LEVELS)
+    return {lv: int(n) for lv, n in enumerate(hist) if lv and n}
+
+
+def group_by_level(cards: Sequence[Dict[str, Any]]) -> Dict[int, List[int]]:
+    """{уровень: индексы карт в cards} для одного игрока."""
+    levels = display_levels(cards)
+    order = np.argsort(levels, kind="stable")
+    sorted_levels = levels[order]
+    uniq, starts = np.unique(sorted_levels, return_index=True)
+    bounds = list(starts[1:]) + [len(order)]
+    return {
+        int(lv): order[s:e].tolist()
+        for lv, s, e in zip(uniq, starts, bounds)
+        if lv
+    }
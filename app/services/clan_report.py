@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.services.clash_api import ClashApi
+from app.services.cw2_history import CW2HistoryService, CW2WeekEntry
+from app.services.river_race import RiverRaceHistoryService
+from app.utils import normalize_player_tag
+
+log = logging.getLogger(__name__)
+
+MAX_PLAYERS = 50
+CONCURRENCY = 8
+DECKS_PER_WEEK = 16
+
+Progress = Callable[[int, int], Awaitable[None]]
+
+
+@dataclass
+class PlayerWarSummary:
+    tag: str
+    name: str
+    weeks: int
+    medals: int
+    decks_used: int
+
+    @property
+    def avg_medals(self) -> int:
+        return self.medals // self.weeks if self.weeks else 0
+
+    @property
+    def decks_pct(self) -> int:
+        return round(self.decks_used * 100 / (self.weeks * DECKS_PER_WEEK)) if self.weeks else 0
+
+
+def summarize(tag: str, name: str, weeks: List[CW2WeekEntry]) -> PlayerWarSummary:
+    return PlayerWarSummary(
+        tag=tag,
+        name=name,
+        weeks=len(weeks),
+        medals=sum(w.medals for w in weeks),
+        decks_used=sum(w.decks_used for w in weeks),
+    )
+
+
+def rank(rows: List[PlayerWarSummary]) -> List[PlayerWarSummary]:
+    return sorted(rows, key=lambda r: (r.medals, r.decks_used), reverse=True)
+
+
+class ClanWarReport:
+    """
+    Отчёт по КВ сразу для клана (или списка кандидатов).
+
+    1) riverracelog клана — одним запросом история всех, кто воевал в нём;
+    2) остальным (новички, кандидаты из других кланов) — по игроку: профиль -> лог его клана
+       (логи кешируются в ClashApi, соклановцы переиспользуют один запрос), и только если
+       и там пусто — скрейп RoyaleAPI (темп — общий лимитер CW2HistoryService).
+       Не больше CONCURRENCY игроков одновременно.
+    """
+
+    def __init__(
+        self,
+        clash_api: ClashApi,
+        cw2_history: CW2HistoryService,
+        concurrency: int = CONCURRENCY,
+    ):
+        self.clash_api = clash_api
+        self.cw2_history = cw2_history
+        self.river_race = RiverRaceHistoryService(clash_api)
+        self.concurrency = concurrency
+
+    async def for_clan(self, clan_tag: str, progress: Optional[Progress] = None) -> Optional[List[PlayerWarSummary]]:
+        """None — клан не найден."""
+        clan_tag = normalize_player_tag(clan_tag)
+        members = await self.clash_api.get_clan_members(clan_tag)
+        if members is None:
+            return None
+        names = {m.tag: m.name for m in members[:MAX_PLAYERS]}
+        known = await self.river_race.clan_history(clan_tag)
+        return await self._collect(names, known, progress)
+
+    async def for_players(self, player_tags: List[str], progress: Optional[Progress] = None) -> List[PlayerWarSummary]:
+        names = {normalize_player_tag(t): "" for t in player_tags[:MAX_PLAYERS]}
+        return await self._collect(names, {}, progress)
+
+    async def _collect(
+        self,
+        names: Dict[str, str],
+        known: Dict[str, List[CW2WeekEntry]],
+        progress: Optional[Progress],
+    ) -> List[PlayerWarSummary]:
+        total = len(names)
+        done = 0
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(tag: str) -> PlayerWarSummary:
+            nonlocal done
+            weeks = known.get(tag)
+            if not weeks:
+                async with sem:
+                    weeks = await self._player_weeks(tag)
+                if not names[tag]:
+                    # профиль только что запрашивался для лога клана — берётся из кеша ClashApi
+                    player = await self.clash_api.get_player(tag)
+                    if player and not player.get("__error__"):
+                        names[tag] = player.get("name", "")
+            done += 1
+            if progress is not None:
+                await progress(done, total)
+            return summarize(tag, names[tag] or tag, weeks[:10])
+
+        rows = await asyncio.gather(*(one(t) for t in names))
+        return rank(list(rows))
+
+    async def _player_weeks(self, tag: str) -> List[CW2WeekEntry]:
+        try:
+            weeks = await self.river_race.get_last_10_weeks_player(tag)
+            if weeks:
+                return weeks
+            return await self.cw2_history.get_last_10_weeks_player(tag)
+        except Exception:
+            log.exception("War history failed for %s", tag)
+            return []
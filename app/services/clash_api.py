@@ -1,19 +1,188 @@
 # app/services/clash_api.py
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import re
 import time
 import httpx
 
+from app import codec
+from app.cassette import http_client
+from app.metrics import UPSTREAM_REQUESTS, UPSTREAM_SECONDS, cache_hit
+from app.ratelimit import AsyncRateLimiter
 from app.utils import encode_tag_for_url, normalize_tag
 
+# сколько секунд держим ответы клановых эндпоинтов
+CLAN_TTL = 300.0
+MEMBERS_TTL = 300.0
+CURRENT_RIVER_RACE_TTL = 60.0
+RIVER_RACE_LOG_TTL = 1800.0  # лог КВ меняется раз в неделю
+_CACHE_MAX = 2048
+
+
+def _endpoint_label(path: str) -> str:
+    # /players/%23ABC/battlelog -> /players/{tag}/battlelog (чтобы не плодить метки)
+    return re.sub(r"%23[0-9A-Za-z]+", "{tag}", path)
+
+
+# -------- типы ответов клановых эндпоинтов (только нужные нам поля) --------
+
+
+@dataclass
+class ClanMember:
+    tag: str
+    name: str
+    role: str
+    exp_level: int
+    trophies: int
+    donations: int
+    last_seen: str
+
+    @classmethod
+    def from_api(cls, d: Dict[str, Any]) -> "ClanMember":
+        return cls(
+            tag=d.get("tag", ""),
+            name=d.get("name", ""),
+            role=d.get("role", ""),
+            exp_level=int(d.get("expLevel") or 0),
+            trophies=int(d.get("trophies") or 0),
+            donations=int(d.get("donations") or 0),
+            last_seen=d.get("lastSeen", ""),
+        )
+
+
+@dataclass
+class Clan:
+    tag: str
+    name: str
+    clan_score: int
+    clan_war_trophies: int
+    members_count: int
+    members: List[ClanMember] = field(default_factory=list)
+
+    @classmethod
+    def from_api(cls, d: Dict[str, Any]) -> "Clan":
+        return cls(
+            tag=d.get("tag", ""),
+            name=d.get("name", ""),
+            clan_score=int(d.get("clanScore") or 0),
+            clan_war_trophies=int(d.get("clanWarTrophies") or 0),
+            members_count=int(d.get("members") or 0),
+            members=[ClanMember.from_api(m) for m in d.get("memberList") or []],
+        )
+
+
+@dataclass
+class RiverRaceParticipant:
+    tag: str
+    name: str
+    fame: int
+    repair_points: int
+    boat_attacks: int
+    decks_used: int
+    decks_used_today: int
+
+    @classmethod
+    def from_api(cls, d: Dict[str, Any]) -> "RiverRaceParticipant":
+        return cls(
+            tag=d.get("tag", ""),
+            name=d.get("name", ""),
+            fame=int(d.get("fame") or 0),
+            repair_points=int(d.get("repairPoints") or 0),
+            boat_attacks=int(d.get("boatAttacks") or 0),
+            decks_used=int(d.get("decksUsed") or 0),
+            decks_used_today=int(d.get("decksUsedToday") or 0),
+        )
+
+
+@dataclass
+class RiverRaceClan:
+    tag: str
+    name: str
+    fame: int
+    clan_score: int
+    participants: List[RiverRaceParticipant]
+
+    @classmethod
+    def from_api(cls, d: Dict[str, Any]) -> "RiverRaceClan":
+        return cls(
+            tag=d.get("tag", ""),
+            name=d.get("name", ""),
+            fame=int(d.get("fame") or 0),
+            clan_score=int(d.get("clanScore") or 0),
+            participants=[RiverRaceParticipant.from_api(p) for p in d.get("participants") or []],
+        )
+
+
+@dataclass
+class RiverRaceStanding:
+    rank: int
+    trophy_change: int
+    clan: RiverRaceClan
+
+    @classmethod
+    def from_api(cls, d: Dict[str, Any]) -> "RiverRaceStanding":
+        return cls(
+            rank=int(d.get("rank") or 0),
+            trophy_change=int(d.get("trophyChange") or 0),
+            clan=RiverRaceClan.from_api(d.get("clan") or {}),
+        )
+
+
+@dataclass
+class RiverRaceLogEntry:
+    season_id: int
+    section_index: int  # неделя сезона, с нуля
+    created_date: str
+    standings: List[RiverRaceStanding]
+
+    @classmethod
+    def from_api(cls, d: Dict[str, Any]) -> "RiverRaceLogEntry":
+        return cls(
+            season_id=int(d.get("seasonId") or 0),
+            section_index=int(d.get("sectionIndex") or 0),
+            created_date=d.get("createdDate", ""),
+            standings=[RiverRaceStanding.from_api(s) for s in d.get("standings") or []],
+        )
+
+
+@dataclass
+class CurrentRiverRace:
+    state: str
+    section_index: int
+    period_index: int
+    period_type: str
+    clan: RiverRaceClan
+    clans: List[RiverRaceClan]
+
+    @classmethod
+    def from_api(cls, d: Dict[str, Any]) -> "CurrentRiverRace":
+        return cls(
+            state=d.get("state", ""),
+            section_index=int(d.get("sectionIndex") or 0),
+            period_index=int(d.get("periodIndex") or 0),
+            period_type=d.get("periodType", ""),
+            clan=RiverRaceClan.from_api(d.get("clan") or {}),
+            clans=[RiverRaceClan.from_api(c) for c in d.get("clans") or []],
+        )
+
 
 class ClashApi:
-    def __init__(self, token: str, base_url: str = "https://api.clashroyale.com/v1"):
+    def __init__(
+        self,
+        token: str,
+        base_url: str = "https://api.clashroyale.com/v1",
+        rate: float = 0.0,
+        burst: float = 10.0,
+        trim_players: bool = True,
+    ):
         self.base_url = base_url.rstrip("/")
+        # профиль разбираем только в нужные боту поля (codec.PLAYER_FIELDS)
+        self._decode_player: Callable[[bytes], Any] = codec.decode_player if trim_players else codec.loads
         self.headers = {"Authorization": f"Bearer {token}"}
 
-        self.client = httpx.AsyncClient(
+        self.client = http_client(
             timeout=httpx.Timeout(8.0, connect=4.0),
             trust_env=False,
             http2=False,
@@ -22,23 +191,38 @@ class ClashApi:
 
         # кеш профиля на 30 секунд
         self._player_cache: Dict[str, Tuple[float, dict]] = {}
+        # кеш клановых эндпоинтов: путь -> (истекает, ответ)
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+
+        # лимит запросов к API (в секунду, на процесс; 0 — без лимита)
+        self._limiter = AsyncRateLimiter(rate, burst) if rate > 0 else None
 
     async def close(self):
         await self.client.aclose()
 
-    async def _get(self, path: str) -> Any:
+    async def _get(self, path: str, decode: Callable[[bytes], Any] = codec.loads) -> Any:
         url = f"{self.base_url}{path}"
+        endpoint = _endpoint_label(path)
+        status = "error"
+        if self._limiter is not None:
+            await self._limiter.acquire()
+        started = time.perf_counter()
         try:
             r = await self.client.get(url, headers=self.headers)
+            status = str(r.status_code)
             if r.status_code == 404:
                 return {"__error__": True, "status": 404, "body": r.text}
             if r.status_code >= 400:
                 return {"__error__": True, "status": r.status_code, "body": r.text}
-            return r.json()
+            return decode(r.content)
         except (httpx.ConnectTimeout, httpx.ReadTimeout) as e:
+            status = "timeout"
             return {"__error__": True, "status": None, "body": f"timeout: {e}"}
         except httpx.HTTPError as e:
             return {"__error__": True, "status": None, "body": f"http_error: {e}"}
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, service="clash_api", endpoint=endpoint)
+            UPSTREAM_REQUESTS.inc(service="clash_api", endpoint=endpoint, status=status)
 
     async def get_player(self, tag: str) -> Optional[Dict[str, Any]]:
         # кешируем по нормализованному тегу (без #)
@@ -46,13 +230,15 @@ class ClashApi:
         now = time.time()
         cached = self._player_cache.get(key)
         if cached and cached[0] > now:
+            cache_hit("clash_api_player", True)
             return cached[1]
+        cache_hit("clash_api_player", False)
 
         enc = encode_tag_for_url(tag)
         if not enc:
             return None
 
-        data = await self._get(f"/players/{enc}")
+        data = await self._get(f"/players/{enc}", self._decode_player)
         if isinstance(data, dict) and data.get("__error__"):
             return data  # чтобы ты видел причину в сообщении
 
@@ -68,3 +254,60 @@ class ClashApi:
         if isinstance(data, dict) and data.get("__error__"):
             return None
         return data
+
+    # -------- кланы --------
+
+    async def _get_cached(self, path: str, ttl: float, cache: str) -> Optional[Any]:
+        """GET с TTL-кешем в памяти; ошибки не кешируются и превращаются в None."""
+        now = time.time()
+        cached = self._cache.get(path)
+        if cached and cached[0] > now:
+            cache_hit(cache, True)
+            return cached[1]
+        cache_hit(cache, False)
+
+        data = await self._get(path)
+        if not data or (isinstance(data, dict) and data.get("__error__")):
+            return None
+
+        if len(self._cache) >= _CACHE_MAX:
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+        self._cache[path] = (now + ttl, data)
+        return data
+
+    async def get_clan(self, tag: str) -> Optional[Clan]:
+        enc = encode_tag_for_url(tag)
+        if not enc:
+            return None
+        data = await self._get_cached(f"/clans/{enc}", CLAN_TTL, "clash_api_clan")
+        return Clan.from_api(data) if data else None
+
+    async def get_clan_members(self, tag: str) -> Optional[List[ClanMember]]:
+        enc = encode_tag_for_url(tag)
+        if not enc:
+            return None
+        data = await self._get_cached(f"/clans/{enc}/members", MEMBERS_TTL, "clash_api_clan_members")
+        if data is None:
+            return None
+        return [ClanMember.from_api(m) for m in data.get("items") or []]
+
+    async def get_current_river_race(self, tag: str) -> Optional[CurrentRiverRace]:
+        enc = encode_tag_for_url(tag)
+        if not enc:
+            return None
+        data = await self._get_cached(
+            f"/clans/{enc}/currentriverrace", CURRENT_RIVER_RACE_TTL, "clash_api_current_river_race"
+        )
+        return CurrentRiverRace.from_api(data) if data else None
+
+    async def get_river_race_log(self, tag: str) -> Optional[List[RiverRaceLogEntry]]:
+        """Завершённые недели КВ клана, новые первыми (API отдаёт до 10 последних)."""
+        enc = encode_tag_for_url(tag)
+        if not enc:
+            return None
+        data = await self._get_cached(
+            f"/clans/{enc}/riverracelog", RIVER_RACE_LOG_TTL, "clash_api_river_race_log"
+        )
+        if data is None:
+            return None
+        return [RiverRaceLogEntry.from_api(e) for e in data.get("items") or []]
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
 import re
+import time
 from dataclasses import dataclass
 from typing import Optional, List
 
 import httpx
 
+from app.cassette import http_client
+from app.metrics import SCRAPE_SECONDS, UPSTREAM_REQUESTS, UPSTREAM_SECONDS
+from app.ratelimit import AsyncRateLimiter
 from app.utils import normalize_player_tag
 
 
@@ -37,25 +41,58 @@ def _parse_season_week(cell_text: str) -> tuple[Optional[int], Optional[int]]:
 class CW2HistoryService:
     """
     Достаём CW2 историю игрока из RoyaleAPI страницы игрока:
-    https://royaleapi.com/player/<TAG>
+    https://royaleapi.com/player/<TAG> (base_url можно подменить — например, на локальную заглушку)
+
+    Сервис один на процесс, и все скрейпы (/clanwar, /warhistory) идут через его лимитер:
+    не чаще rate страниц в секунду (0 — без лимита).
     """
 
-    def __init__(self, timeout: float = 15.0):
+    def __init__(self, timeout: float = 15.0, base_url: str = "https://royaleapi.com", rate: float = 0.0):
         self.timeout = timeout
+        self.base_url = base_url.rstrip("/")
+        self.limiter = AsyncRateLimiter(rate) if rate > 0 else None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # один клиент на сервис — соединение с royaleapi.com переиспользуется
+        if self._client is None:
+            self._client = http_client(timeout=self.timeout, follow_redirects=True)
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def get_last_10_weeks_player(self, player_tag: str) -> List[CW2WeekEntry]:
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        with SCRAPE_SECONDS.time(source="royaleapi_player"):
+            return await self._scrape_last_10_weeks(player_tag)
+
+    async def _fetch_html(self, url: str) -> Optional[str]:
+        status = "error"
+        started = time.perf_counter()
+        try:
+            r = await self._get_client().get(url, headers={"User-Agent": "Mozilla/5.0"})
+            status = str(r.status_code)
+            if r.status_code != 200:
+                return None
+            return r.text
+        except Exception:
+            return None
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, service="royaleapi", endpoint="/player/{tag}")
+            UPSTREAM_REQUESTS.inc(service="royaleapi", endpoint="/player/{tag}", status=status)
+
+    async def _scrape_last_10_weeks(self, player_tag: str) -> List[CW2WeekEntry]:
         player_tag = normalize_player_tag(player_tag)
         player_no_hash = player_tag.replace("#", "")
 
-        url = f"https://royaleapi.com/player/{player_no_hash}"
+        url = f"{self.base_url}/player/{player_no_hash}"
 
-        try:
-            async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=True) as client:
-                r = await client.get(url, headers={"User-Agent": "Mozilla/5.0"})
-                if r.status_code != 200:
-                    return []
-                html = r.text
-        except Exception:
+        html = await self._fetch_html(url)
+        if html is None:
             return []
 
         # Ищем таблицу CW2 history (на странице она реально есть)
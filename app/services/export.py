@@ -0,0 +1,127 @@
+"""
+Выгрузка таблиц в CSV/XLSX потоком: строки приходят асинхронным генератором
+(из БД — пачками, см. Database._stream) и сразу пишутся в файл, весь набор в памяти не держим.
+Запись в файл блокирующая (csv.writer, openpyxl и его zip в save), поэтому строки копятся
+пачками по WRITE_BATCH и пишутся в потоке (asyncio.to_thread) — цикл событий в это время свободен.
+
+XLSX — через openpyxl в режиме write_only (необязательная зависимость: pip install openpyxl).
+Без неё доступен только CSV.
+"""
+from __future__ import annotations
+
+import asyncio
+import csv
+import os
+import tempfile
+from dataclasses import asdict
+from typing import Any, AsyncIterator, Dict, Iterable, List, Sequence, Tuple
+
+from app.services.cw2_history import CW2WeekEntry
+
+FORMAT_CSV = "csv"
+FORMAT_XLSX = "xlsx"
+
+CANDIDATE_HEADER = [
+    "tag", "name", "trophies", "best_trophies", "exp_level", "clan_tag",
+    "cards_14", "cards_15", "cards_16", "evo", "heroes",
+]
+ACCOUNT_HEADER = [
+    "telegram_user_id", "tag", "name", "linked_at",
+    "trophies", "best_trophies", "exp_level", "clan_tag",
+    "cards_14", "cards_15", "cards_16", "evo", "heroes", "snapshot_at",
+]
+# строк на один заход в поток записи
+WRITE_BATCH = 2000
+
+WAR_HEADER = ["tag", "season", "week", "medals", "decks_used", "clan_name", "clan_tag", "clan_trophies"]
+
+
+class ExportError(Exception):
+    pass
+
+
+def xlsx_available() -> bool:
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def war_rows(histories: Dict[str, List[CW2WeekEntry]]) -> AsyncIterator[Tuple[Any, ...]]:
+    for tag, weeks in histories.items():
+        for w in weeks:
+            d = asdict(w)
+            yield (
+                tag, d["season_id"], d["week"], d["medals"], d["decks_used"],
+                d["clan_name"], d["clan_tag"], d["clan_trophies"],
+            )
+
+
+async def _batches(rows: AsyncIterator[Iterable[Any]], size: int = WRITE_BATCH) -> AsyncIterator[List[List[Any]]]:
+    batch: List[List[Any]] = []
+    async for row in rows:
+        batch.append(list(row))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _write_csv(path: str, header: Sequence[str], rows: AsyncIterator[Iterable[Any]]) -> int:
+    n = 0
+    # utf-8-sig и «;» — так Excel с русской локалью открывает файл без мастера импорта
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f, delimiter=";")
+        w.writerow(header)
+        async for batch in _batches(rows):
+            await asyncio.to_thread(w.writerows, batch)
+            n += len(batch)
+    return n
+
+
+async def _write_xlsx(path: str, header: Sequence[str], rows: AsyncIterator[Iterable[Any]]) -> int:
+    try:
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise ExportError("XLSX недоступен: не установлен openpyxl") from e
+
+    # write_only: строки сразу уходят во временный XML, а не копятся деревом ячеек
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("export")
+    ws.append(list(header))
+
+    def append(batch: List[List[Any]]) -> None:
+        for row in batch:
+            ws.append(row)
+
+    n = 0
+    # пачки пишутся по очереди: с листом в каждый момент работает один поток
+    async for batch in _batches(rows):
+        await asyncio.to_thread(append, batch)
+        n += len(batch)
+    await asyncio.to_thread(wb.save, path)
+    return n
+
+
+async def export_rows(
+    fmt: str,
+    header: Sequence[str],
+    rows: AsyncIterator[Iterable[Any]],
+    name: str,
+    directory: str = os.path.join("cache", "exports"),
+) -> Tuple[str, int]:
+    """Пишет rows во временный файл name.<fmt>; возвращает (путь, число строк). Файл удаляет вызывающий."""
+    if fmt not in (FORMAT_CSV, FORMAT_XLSX):
+        raise ExportError(f"неизвестный формат: {fmt}")
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{name}_", suffix=f".{fmt}", dir=directory)
+    os.close(fd)
+    try:
+        writer = _write_xlsx if fmt == FORMAT_XLSX else _write_csv
+        n = await writer(path, header, rows)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, n
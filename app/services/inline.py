@@ -0,0 +1,143 @@
+"""
+Ответы на inline-запросы: «@naborbot #TAG» в любом чате — карточка игрока и картинка прокачки.
+
+Inline-запрос приходит на каждое нажатие клавиши, поэтому:
+- готовые результаты по тегу держим в памяти RESULT_TTL секунд (ключ — нормализованный тег),
+  на один тег одновременно строится один ответ;
+- карточку собираем из агрегатов player_index, а не разбором сырого JSON снапшота;
+- если в кеше ответа нет, ждём DEBOUNCE секунд: пришёл за это время следующий запрос
+  того же пользователя — этот бросаем, недописанный тег в API не уходит;
+- картинку прокачки отдаём по file_id, сохранённому после /upgrade: загрузить файл inline-ответ не может.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from html import escape
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram.types import (
+    InlineQueryResultArticle,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultUnion,
+    InputTextMessageContent,
+)
+
+from app.db import Database
+from app.metrics import INLINE_QUERIES, cache_hit
+from app.player_index import player_index_row
+from app.services.snapshots import PlayerSnapshots
+
+RESULT_TTL = 60.0
+DEBOUNCE = 0.4
+_CACHE_MAX = 4096
+
+# под каким kind в telegram_files лежит картинка /upgrade
+FILE_UPGRADE = "upgrade"
+
+
+def summary_text(row: Dict[str, Any]) -> str:
+    clan = f"<code>{escape(row['clan_tag'])}</code>" if row.get("clan_tag") else "—"
+    return "\n".join(
+        [
+            f"👤 <b>{escape(row['name'] or 'Без ника')}</b> <code>{escape(row['player_tag'])}</code>",
+            f"🏆 Трофеи: <b>{row['trophies']}</b> (best: {row['best_trophies']})",
+            f"👑 Уровень (exp): <b>{row['exp_level']}</b>",
+            f"🏰 Клан: {clan}",
+            f"🃏 Карт 14+ / 15+ / 16: <b>{row['cards_14']}</b> / <b>{row['cards_15']}</b> / <b>{row['cards_16']}</b>",
+            f"✨ Эволюции: <b>{row['evo_count']}</b> | 🦸 Герои: <b>{row['hero_count']}</b>",
+        ]
+    )
+
+
+def build_results(row: Dict[str, Any], upgrade_file_id: Optional[str]) -> List[InlineQueryResultUnion]:
+    tag = row["player_tag"]
+    key = tag.lstrip("#")
+    title = f"{row['name'] or 'Без ника'} {tag}"
+    results: List[InlineQueryResultUnion] = [
+        InlineQueryResultArticle(
+            id=f"p:{key}",
+            title=title,
+            description=f"🏆 {row['trophies']} · 16 ур.: {row['cards_16']} · эво: {row['evo_count']}",
+            input_message_content=InputTextMessageContent(message_text=summary_text(row)),
+        )
+    ]
+    if upgrade_file_id:
+        results.append(
+            InlineQueryResultCachedPhoto(
+                id=f"u:{key}",
+                photo_file_id=upgrade_file_id,
+                title=f"Прокачка: {title}",
+                caption=f"📈 Прокачка карт {escape(title)}",
+            )
+        )
+    return results
+
+
+class InlineAnswers:
+    def __init__(self, db: Database, snapshots: PlayerSnapshots, max_age: float = 300.0):
+        self.db = db
+        self.snapshots = snapshots
+        self.max_age = max_age
+        # тег -> (истекает, результаты); пустой список — «такого игрока нет», тоже кешируется
+        self._cache: Dict[str, Tuple[float, List[InlineQueryResultUnion]]] = {}
+        self._building: Dict[str, asyncio.Task] = {}
+        # номер последнего запроса пользователя (для debounce)
+        self._seq: Dict[int, int] = {}
+
+    def _fresh(self, tag: str) -> Optional[List[InlineQueryResultUnion]]:
+        hit = self._cache.get(tag)
+        return hit[1] if hit is not None and hit[0] > time.monotonic() else None
+
+    def cached(self, tag: str) -> Optional[List[InlineQueryResultUnion]]:
+        results = self._fresh(tag)
+        cache_hit("inline_results", results is not None)
+        if results is not None:
+            INLINE_QUERIES.inc(outcome="cached")
+        return results
+
+    async def debounce(self, user_id: int) -> bool:
+        """False — пока ждали, пользователь допечатал запрос, и отвечать на этот уже незачем."""
+        seq = self._seq.get(user_id, 0) + 1
+        self._seq[user_id] = seq
+        await asyncio.sleep(DEBOUNCE)
+        if self._seq.get(user_id) != seq:
+            INLINE_QUERIES.inc(outcome="debounced")
+            return False
+        del self._seq[user_id]
+        return True
+
+    async def results(self, tag: str) -> List[InlineQueryResultUnion]:
+        cached = self._fresh(tag)
+        if cached is not None:
+            INLINE_QUERIES.inc(outcome="cached")
+            return cached
+        task = self._building.get(tag)
+        if task is None:
+            task = asyncio.create_task(self._build(tag))
+            self._building[tag] = task
+            task.add_done_callback(lambda _: self._building.pop(tag, None))
+        return await asyncio.shield(task)
+
+    async def _build(self, tag: str) -> List[InlineQueryResultUnion]:
+        row = await self.db.get_player_index(tag, self.max_age)
+        if row is None:
+            # агрегатов нет или устарели — снапшот (он же обновит player_index), посчитаем из него
+            player, _ = await self.snapshots.get(tag)
+            if player:
+                row = {**player_index_row(player), "player_tag": player.get("tag") or tag}
+        if row is None:
+            results: List[InlineQueryResultUnion] = []
+        else:
+            results = build_results(row, await self.db.get_file_id(tag, FILE_UPGRADE))
+        INLINE_QUERIES.inc(outcome="built" if results else "not_found")
+
+        now = time.monotonic()
+        if len(self._cache) >= _CACHE_MAX:
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+        self._cache[tag] = (now + RESULT_TTL, results)
+        return results
+
+    def forget(self, tag: str) -> None:
+        """Снапшот или картинка тега обновились — следующий запрос соберёт ответ заново."""
+        self._cache.pop(tag, None)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.db import Database
+from app.services.clash_api import ClashApi
+from app.services.cw2_history import CW2HistoryService, CW2WeekEntry
+
+# чем больше — тем раньше задачу заберёт воркер
+PRIORITY_INTERACTIVE = 10
+# предрендер, пока пользователь выбирает (app.services.upgrade_renders)
+PRIORITY_SPECULATIVE = 5
+PRIORITY_BACKGROUND = 0
+
+
+class JobError(Exception):
+    """Задача не выполнилась: ошибка в воркере или не дождались результата."""
+
+
+@dataclass
+class JobContext:
+    """Сервисы, доступные задаче (в воркере — свои экземпляры, в боте — общие)."""
+
+    db: Database
+    clash_api: ClashApi
+    cw2_history: CW2HistoryService
+
+
+JobHandler = Callable[[JobContext, Dict[str, Any]], Awaitable[Any]]
+
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+
+def job(kind: str) -> Callable[[JobHandler], JobHandler]:
+    def deco(fn: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = fn
+        return fn
+
+    return deco
+
+
+# -------- задачи --------
+# payload и результат должны сериализоваться в JSON — они ходят через таблицу jobs
+
+
+@job("upgrade_render")
+async def _upgrade_render(ctx: JobContext, payload: Dict[str, Any]) -> str:
+    from app.services.upgrade_image import render_upgrade_image
+
+    tag = payload["tag"]
+    # бот кладёт свежий снапшот в player_cache перед постановкой задачи
+    player = await ctx.db.get_cached_player_json(tag)
+    if not player:
+        player = await ctx.clash_api.get_player(tag)
+        if not player or player.get("__error__"):
+            raise JobError(f"no player data for {tag}")
+    return await render_upgrade_image(player, out_path=payload["out_path"])
+
+
+@job("cw2_history")
+async def _cw2_history(ctx: JobContext, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    from app.services.river_race import RiverRaceHistoryService, merge_weeks
+
+    # сначала официальный riverracelog текущего клана; в нём только недели в этом клане —
+    # если их меньше 10 (игрок без клана или недавно перешёл), остальное берём со страницы
+    # RoyaleAPI, где видны и прошлые кланы
+    weeks = await RiverRaceHistoryService(ctx.clash_api).get_last_10_weeks_player(payload["tag"])
+    if len(weeks) < 10:
+        weeks = merge_weeks(weeks, await ctx.cw2_history.get_last_10_weeks_player(payload["tag"]))
+    return [asdict(w) for w in weeks]
+
+
+@job("refresh_players")
+async def _refresh_players(ctx: JobContext, payload: Dict[str, Any]) -> int:
+    from app.services.battlelog import BattlelogIngestor
+    from app.services.refresher import PlayerRefresher
+
+    # пачка одного цикла PlayerRefresher бота: тот же темп запросов, что и в процессе бота
+    battlelog = BattlelogIngestor(ctx.db, ctx.clash_api) if payload.get("battlelog") else None
+    refresher = PlayerRefresher(ctx.db, ctx.clash_api, rate=payload["rate"], battlelog=battlelog)
+    return await refresher.refresh_batch(payload["tags"])
+
+
+async def run_job(ctx: JobContext, kind: str, payload: Dict[str, Any]) -> Any:
+    handler = JOB_HANDLERS.get(kind)
+    if handler is None:
+        raise JobError(f"unknown job kind: {kind}")
+    try:
+        return await handler(ctx, payload)
+    except JobError:
+        raise
+    except Exception as e:
+        raise JobError(f"{type(e).__name__}: {e}") from e
+
+
+class JobQueue:
+    """
+    Точка входа для тяжёлых задач из хендлеров.
+
+    use_workers=False — задача выполняется прямо в процессе бота (как раньше).
+    use_workers=True  — задача кладётся в таблицу jobs, её забирает один из процессов
+    app.worker, а мы ждём результат, периодически перечитывая строку задачи.
+    """
+
+    def __init__(self, db: Database, ctx: JobContext, use_workers: bool, timeout: float = 120.0):
+        self.db = db
+        self.ctx = ctx
+        self.use_workers = use_workers
+        self.timeout = timeout
+
+    async def submit(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        if not self.use_workers:
+            return await run_job(self.ctx, kind, payload)
+
+        job_id = await self.db.enqueue_job(kind, payload, priority=priority)
+        return await self._wait(job_id, self.timeout if timeout is None else timeout)
+
+    async def _wait(self, job_id: int, timeout: float) -> Any:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = 0.05
+
+        while True:
+            state = await self.db.get_job(job_id)
+            if state is None:
+                raise JobError(f"job {job_id} disappeared")
+            if state["status"] == "done":
+                await self.db.delete_job(job_id)
+                return state["result"]
+            if state["status"] == "failed":
+                await self.db.delete_job(job_id)
+                raise JobError(state["error"] or f"job {job_id} failed")
+            if loop.time() >= deadline:
+                # строку не трогаем: воркер может ещё доделать, потом её вычистит purge_jobs
+                raise JobError(f"timeout waiting for job {job_id}")
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, 0.5)
+
+    # -------- удобные обёртки для хендлеров --------
+
+    async def render_upgrade(self, tag: str, out_path: str, priority: int = PRIORITY_INTERACTIVE) -> str:
+        return await self.submit("upgrade_render", {"tag": tag, "out_path": out_path}, priority=priority)
+
+    async def cw2_history(self, tag: str) -> List[CW2WeekEntry]:
+        rows = await self.submit("cw2_history", {"tag": tag})
+        return [CW2WeekEntry(**r) for r in rows or []]
+
+    async def refresh_players(
+        self,
+        tags: List[str],
+        rate: float,
+        battlelog: bool = False,
+        priority: int = PRIORITY_BACKGROUND,
+        timeout: Optional[float] = None,
+    ) -> int:
+        payload = {"tags": list(tags), "rate": rate, "battlelog": battlelog}
+        return int(await self.submit("refresh_players", payload, priority=priority, timeout=timeout) or 0)
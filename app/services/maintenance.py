@@ -0,0 +1,120 @@
+"""
+Обслуживание файла SQLite в фоне, раз в interval секунд.
+
+- Свободные страницы (после delete_player_cache, чистки jobs и outbox) возвращаются системе
+  через incremental_vacuum, не больше VACUUM_PAGES за тик. auto_vacuum=INCREMENTAL включает
+  миграция 2 в app/db.py.
+- Статистика планировщика (ANALYZE с analysis_limit) пересчитывается в первый тихий тик,
+  потом раз в analyze_interval.
+- Автоматический чекпоинт SQLite переносит страницы в базу, но файл -wal не укорачивает,
+  а при постоянных читателях не доходит до конца, и WAL растёт. Поэтому в тихий тик
+  делаем wal_checkpoint(TRUNCATE). Если WAL больше wal_max_bytes — делаем и под нагрузкой.
+
+Тихий тик — с прошлого тика у Database было меньше QUIET_OPS_PER_SEC операций в секунду
+(по счётчику naborbot_db_query_seconds; запись воркеров в нём не видна).
+Размеры файлов, свободные страницы и время шагов уходят в метрики naborbot_db_*.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.db import Database
+from app.metrics import (
+    DB_CHECKPOINTS,
+    DB_FILE_BYTES,
+    DB_FREELIST_PAGES,
+    DB_MAINTENANCE_SECONDS,
+    DB_QUERY_SECONDS,
+)
+
+log = logging.getLogger(__name__)
+
+QUIET_OPS_PER_SEC = 1.0
+VACUUM_PAGES = 1000
+# меньше стольких свободных страниц — не трогаем
+VACUUM_MIN_PAGES = 256
+# PRAGMA auto_vacuum: 2 — INCREMENTAL
+_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _db_ops() -> int:
+    return sum(d.count for d in DB_QUERY_SECONDS.values.values())
+
+
+class DbMaintenance:
+    def __init__(
+        self,
+        db: Database,
+        interval: float = 60.0,
+        analyze_interval: float = 6 * 3600.0,
+        wal_max_bytes: int = 64 * 2**20,
+    ):
+        self.db = db
+        self.interval = interval
+        self.analyze_interval = analyze_interval
+        self.wal_max_bytes = wal_max_bytes
+        self._ops = _db_ops()
+        self._ops_at = time.monotonic()
+        self._analyzed_at: Optional[float] = None
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("DB maintenance failed")
+
+    async def run_once(self) -> Dict[str, Any]:
+        quiet = self._quiet()
+        done: Dict[str, Any] = {"quiet": quiet}
+
+        stats = await self.db.storage_stats()
+        DB_FREELIST_PAGES.set(stats["freelist_count"])
+        if quiet and stats["auto_vacuum"] == _AUTO_VACUUM_INCREMENTAL and stats["freelist_count"] >= VACUUM_MIN_PAGES:
+            with DB_MAINTENANCE_SECONDS.time(task="vacuum"):
+                done["vacuumed_pages"] = await self.db.incremental_vacuum(VACUUM_PAGES)
+
+        now = time.monotonic()
+        if quiet and (self._analyzed_at is None or now - self._analyzed_at >= self.analyze_interval):
+            with DB_MAINTENANCE_SECONDS.time(task="analyze"):
+                await self.db.analyze()
+            self._analyzed_at = now
+            done["analyzed"] = True
+
+        # после vacuum: файл базы укорачивается, когда освобождённые страницы уходят из WAL
+        _, wal = self._file_sizes()
+        if wal and (quiet or wal > self.wal_max_bytes):
+            with DB_MAINTENANCE_SECONDS.time(task="checkpoint"):
+                busy, _, _ = await self.db.wal_checkpoint("TRUNCATE")
+            DB_CHECKPOINTS.inc(mode="TRUNCATE", result="busy" if busy else "ok")
+            done["checkpoint"] = "busy" if busy else "ok"
+            if not quiet:
+                log.info("WAL is %.1f MiB, checkpointed under load (%s)", wal / 2**20, done["checkpoint"])
+
+        db_bytes, wal = self._file_sizes()
+        done["db_bytes"], done["wal_bytes"] = db_bytes, wal
+        return done
+
+    def _quiet(self) -> bool:
+        now, ops = time.monotonic(), _db_ops()
+        rate = (ops - self._ops) / max(now - self._ops_at, 1e-6)
+        self._ops, self._ops_at = ops, now
+        return rate < QUIET_OPS_PER_SEC
+
+    def _file_sizes(self) -> Tuple[int, int]:
+        sizes = []
+        for suffix, name in (("", "db"), ("-wal", "wal")):
+            try:
+                size = os.path.getsize(self.db.path + suffix)
+            except OSError:
+                size = 0
+            DB_FILE_BYTES.set(size, file=name)
+            sizes.append(size)
+        return sizes[0], sizes[1]
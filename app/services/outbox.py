@@ -0,0 +1,129 @@
+"""
+Исходящие сообщения, которые не являются ответом на апдейт: уведомления /watch и рассылки /broadcast.
+
+Сообщения сначала пишутся в таблицу outbox, поэтому рестарт их не теряет; отправители берут
+их пачками по приоритету. Лимиты Telegram (общий и на чат) и RetryAfter соблюдает
+OutboundLimitMiddleware на сессии бота — он же пропускает ответы хендлеров вперёд рассылок:
+приоритет запроса берётся из OUTBOUND_PRIORITY.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import suppress
+from contextvars import ContextVar
+from typing import Any, Dict
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+
+from app.db import Database
+from app.metrics import OUTBOX_MESSAGES
+
+log = logging.getLogger(__name__)
+
+# меньше — раньше (у ответов хендлеров 0: они не ходят через outbox, но делят с ним лимиты)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NOTIFY = 1
+PRIORITY_BROADCAST = 2
+
+OUTBOUND_PRIORITY: ContextVar[int] = ContextVar("naborbot_outbound_priority", default=PRIORITY_INTERACTIVE)
+
+MAX_ATTEMPTS = 5
+IDLE_POLL = 5.0  # как часто смотреть в таблицу без сигналов (отложенные ретраи)
+
+
+class Outbox:
+    def __init__(self, db: Database, bot: Bot, concurrency: int = 4):
+        self.db = db
+        self.bot = bot
+        self.concurrency = max(1, concurrency)
+        # в памяти держим немного: новое уведомление не должно ждать за тысячей строк рассылки
+        self._buffer: asyncio.PriorityQueue = asyncio.PriorityQueue(self.concurrency * 2)
+        self._wakeup = asyncio.Event()
+
+    async def send(self, chat_id: int, text: str, priority: int = PRIORITY_NOTIFY) -> None:
+        await self.db.outbox_put(chat_id, text, priority)
+        self._wakeup.set()
+
+    async def broadcast(self, text: str, created_by: int) -> Dict[str, int]:
+        b = await self.db.create_broadcast(text, created_by, PRIORITY_BROADCAST)
+        self._wakeup.set()
+        return b
+
+    async def run(self) -> None:
+        recovered = await self.db.outbox_recover()
+        if recovered:
+            log.warning("Outbox: %s messages were in flight at shutdown, counted as sent", recovered)
+        senders = [asyncio.create_task(self._sender()) for _ in range(self.concurrency)]
+        try:
+            while True:
+                try:
+                    await self._fill()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    log.exception("Outbox fetch failed")
+                    await asyncio.sleep(1.0)
+        finally:
+            for task in senders:
+                task.cancel()
+            await asyncio.gather(*senders, return_exceptions=True)
+
+    async def _fill(self) -> None:
+        self._wakeup.clear()
+        free = self._buffer.maxsize - self._buffer.qsize()
+        rows = await self.db.outbox_lease(free) if free > 0 else []
+        for m in rows:
+            self._buffer.put_nowait((m["priority"], m["id"], m))
+        if len(rows) < free or free <= 0:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), IDLE_POLL)
+
+    async def _sender(self) -> None:
+        while True:
+            _, _, m = await self._buffer.get()
+            if self._buffer.qsize() <= self.concurrency:
+                self._wakeup.set()
+            try:
+                await self._deliver(m)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Outbox delivery of %s failed", m["id"])
+
+    async def _deliver(self, m: Dict[str, Any]) -> None:
+        await self.db.outbox_mark_sending(m["id"])
+        token = OUTBOUND_PRIORITY.set(m["priority"])
+        try:
+            await self.bot.send_message(m["chat_id"], m["text"], disable_web_page_preview=True)
+        except TelegramRetryAfter as e:
+            # middleware уже подождал и повторил — вернём в очередь, ждать будет таблица, а не отправитель
+            OUTBOX_MESSAGES.inc(status="retry_after")
+            await self.db.outbox_retry(m["id"], e.retry_after)
+            return
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # бот заблокирован, чат удалён, битая разметка — повтор не поможет
+            OUTBOX_MESSAGES.inc(status="rejected")
+            log.info("Outbox message %s to %s rejected: %s", m["id"], m["chat_id"], e)
+            await self.db.outbox_finish(m["id"], m["broadcast_id"], ok=False)
+            return
+        except TelegramAPIError as e:
+            attempts = m["attempts"] + 1
+            if attempts >= MAX_ATTEMPTS:
+                OUTBOX_MESSAGES.inc(status="failed")
+                log.warning("Outbox message %s to %s failed: %s", m["id"], m["chat_id"], e)
+                await self.db.outbox_finish(m["id"], m["broadcast_id"], ok=False)
+            else:
+                OUTBOX_MESSAGES.inc(status="retry")
+                await self.db.outbox_retry(m["id"], 2.0 ** attempts)
+            return
+        finally:
+            OUTBOUND_PRIORITY.reset(token)
+        OUTBOX_MESSAGES.inc(status="sent")
+        await self.db.outbox_finish(m["id"], m["broadcast_id"], ok=True)
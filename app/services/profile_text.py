@@ -0,0 +1,174 @@
+"""
+Текст /profile и его агрегаты.
+
+Снапшот в player_cache между показами часто не меняется (фон обновил, а игрок не играл),
+поэтому готовый HTML и агрегаты хранятся по хешу JSON снапшота: в памяти (LRU)
+и в таблице profile_text — после рестарта тоже не пересчитываем. Повторный показ —
+хеш строки и поиск в словаре; разбор JSON и гистограмма уровней — только для нового снапшота.
+
+В ключ входит PROFILE_TEXT_VERSION: поменял format_profile или profile_aggregates — подними
+версию, иначе старый текст так и будет отдаваться из таблицы для неизменившихся снапшотов.
+"""
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+from app import codec
+from app.db import Database
+from app.metrics import cache_hit
+
+LRU_SIZE = 2048
+# версия текста и агрегатов; поднимать при любом изменении их вида (см. docstring модуля)
+PROFILE_TEXT_VERSION = 1
+
+
+def role_ru(role: str | None) -> str:
+    mapping = {
+        "leader": "Глава",
+        "coLeader": "Соруководитель",
+        "elder": "Старейшина",
+        "member": "Участник",
+    }
+    return mapping.get(role or "", role or "—")
+
+
+def safe_int(x, default=0) -> int:
+    try:
+        return int(x)
+    except Exception:
+        return default
+
+
+def count_display_levels(cards: list[dict]) -> dict[int, int]:
+    # numpy грузим при первом профиле, а не на старте бота
+    from app.services.card_analytics import level_counts
+
+    return level_counts(cards or [])
+
+
+def format_levels(levels: dict[int, int], total_cards: int) -> list[str]:
+    out: list[str] = []
+    for lv in sorted(levels.keys(), reverse=True):
+        cnt = levels[lv]
+        pct = (cnt / total_cards * 100) if total_cards else 0.0
+        out.append(f"{lv}лвл - <b>{cnt}</b> ({pct:.2f}%)")
+    return out
+
+
+def profile_aggregates(player: dict) -> Dict[str, Any]:
+    """Всё, что показывает профиль, посчитанное из снапшота (сериализуется в JSON)."""
+    wins = safe_int(player.get("wins"))
+    battle_count = safe_int(player.get("battleCount"))
+    clan = player.get("clan")
+    cards = player.get("cards", []) or []
+
+    return {
+        "name": player.get("name", "Без ника"),
+        "tag": player.get("tag", ""),
+        "trophies": safe_int(player.get("trophies")),
+        "best_trophies": safe_int(player.get("bestTrophies")),
+        "exp_level": player.get("expLevel"),
+        "wins": wins,
+        "losses": safe_int(player.get("losses")),
+        "battle_count": battle_count,
+        "winrate": (wins / battle_count * 100) if battle_count else 0.0,
+        "clan_name": clan.get("name") if clan else None,
+        "clan_tag": clan.get("tag") if clan else None,
+        "clan_role": role_ru(player.get("role") or (clan.get("role") if clan else None)),
+        "cards_count": len(cards),
+        # ✅ ПРОКАЧКА: считаем по display_level (как в игре); пары, а не dict — ключи JSON только строки
+        "levels": sorted(count_display_levels(cards).items(), reverse=True),
+        # ✅ БАШЕННЫЕ КАРТЫ (Tower Troops)
+        "support_count": len(player.get("supportCards", []) or []),
+        # ✅ ГЕРОИ: это карты с heroMedium
+        "hero_count": sum(1 for c in cards if (c.get("iconUrls") or {}).get("heroMedium")),
+        # ✅ ЭВОЛЮЦИИ: открытые — evolutionLevel > 0
+        "evo_count": sum(1 for c in cards if safe_int(c.get("evolutionLevel"), 0) > 0),
+    }
+
+
+def format_profile(agg: Dict[str, Any]) -> str:
+    exp = agg["exp_level"]
+    lines: list[str] = [
+        f"👤 <b>{agg['name']}</b>",
+        f"🏷 Тег: <code>{agg['tag']}</code>" if agg["tag"] else "",
+        "",
+        f"🏆 Трофеи: <b>{agg['trophies']}</b> (best: {agg['best_trophies']})",
+        f"👑 Уровень (exp): <b>{exp}</b>" if exp is not None else "",
+        f"⚔️ Бои: <b>{agg['battle_count']}</b> | Победы: <b>{agg['wins']}</b> | Поражения: <b>{agg['losses']}</b>",
+        f"📊 Процент побед: <b>{agg['winrate']:.2f}%</b>",
+        "",
+    ]
+
+    if agg["clan_name"]:
+        lines += [
+            f"🏰 Клан: <b>{agg['clan_name']}</b> ({agg['clan_tag']})",
+            f"🎖 Роль: <b>{agg['clan_role']}</b>",
+            "",
+        ]
+    else:
+        lines += ["🏰 Клан: —", ""]
+
+    lines += [
+        f"🃏 Открыто карт: <b>{agg['cards_count']}</b>",
+        "📈 Количество прокачанных карт (как в игре):",
+        *format_levels({lv: cnt for lv, cnt in agg["levels"]}, agg["cards_count"]),
+        "",
+        f"🗼 Башенные карты: <b>{agg['support_count']}</b>",
+        f"🦸 Герои (hero cards): <b>{agg['hero_count']}</b>",
+        f"✨ Эволюции (открытые): <b>{agg['evo_count']}</b>",
+    ]
+
+    return "\n".join([x for x in lines if x != ""])
+
+
+def build_profile_text(player: dict) -> str:
+    return format_profile(profile_aggregates(player))
+
+
+def snapshot_hash(raw: str) -> str:
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def profile_text_key(raw: str) -> str:
+    """Ключ готового текста: версия формата + хеш снапшота."""
+    return f"v{PROFILE_TEXT_VERSION}:{snapshot_hash(raw)}"
+
+
+@dataclass(frozen=True)
+class ProfileView:
+    text: str
+    aggregates: Dict[str, Any]
+
+
+class ProfileTexts:
+    """Текст профиля по JSON снапшота: LRU в памяти -> таблица profile_text -> расчёт."""
+
+    def __init__(self, db: Database, size: int = LRU_SIZE):
+        self.db = db
+        self.size = size
+        self._lru: "OrderedDict[Tuple[str, str], ProfileView]" = OrderedDict()
+
+    async def get(self, tag: str, raw: str) -> ProfileView:
+        key = (tag, profile_text_key(raw))
+        view = self._lru.get(key)
+        cache_hit("profile_text", view is not None)
+        if view is not None:
+            self._lru.move_to_end(key)
+            return view
+
+        stored = await self.db.get_profile_text(*key)
+        if stored is not None:
+            view = ProfileView(*stored)
+        else:
+            agg = profile_aggregates(codec.loads(raw))
+            view = ProfileView(format_profile(agg), agg)
+            await self.db.save_profile_text(key[0], key[1], view.text, view.aggregates)
+
+        self._lru[key] = view
+        if len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+        return view
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.db import Database
+from app.ratelimit import AsyncRateLimiter
+from app.services.battlelog import BattlelogIngestor
+from app.services.clash_api import ClashApi
+from app.services.job_queue import JobQueue
+
+log = logging.getLogger(__name__)
+
+# (владелец заходил не позже чем N секунд назад, обновлять раз в M секунд)
+REFRESH_TIERS = [
+    (3600, 5 * 60),
+    (24 * 3600, 30 * 60),
+    (7 * 24 * 3600, 3 * 3600),
+]
+IDLE_REFRESH_INTERVAL = 24 * 3600
+
+
+def _parse_ts(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return (datetime.fromisoformat(value) - datetime(1970, 1, 1)).total_seconds()
+    except ValueError:
+        return None
+
+
+def refresh_interval(last_seen: Optional[float], now: float) -> float:
+    if last_seen is not None:
+        ago = now - last_seen
+        for max_ago, interval in REFRESH_TIERS:
+            if ago <= max_ago:
+                return interval
+    return IDLE_REFRESH_INTERVAL
+
+
+def plan_refresh(candidates: List[Dict[str, Any]], now: float) -> List[str]:
+    """
+    Теги, которые пора обновить, самые «просроченные» первыми
+    (просрочка = сколько прошло с обновления / интервал для этого владельца).
+    """
+    due = []
+    for c in candidates:
+        interval = refresh_interval(_parse_ts(c["last_seen_at"]), now)
+        refreshed = _parse_ts(c["refreshed_at"])
+        overdue = float("inf") if refreshed is None else (now - refreshed) / interval
+        if overdue >= 1.0:
+            due.append((overdue, c["tag"]))
+    due.sort(key=lambda x: -x[0])
+    return [tag for _, tag in due]
+
+
+class PlayerRefresher:
+    """
+    Фоновое обновление снапшотов привязанных аккаунтов в player_cache.
+    Частота зависит от того, как давно владелец заходил в бота; запросы к API идут
+    равномерно, не чаще rate в секунду — так фон не съедает лимит интерактивных запросов.
+    С battlelog=... заодно подтягивается и история боёв (это ещё один запрос из того же бюджета).
+    С jobs=... пачку цикла обновляет воркер (задача refresh_players) с тем же rate:
+    цикл ждёт её окончания, так что общий темп запросов к API тот же.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        clash_api: ClashApi,
+        rate: float = 0.5,
+        cycle_seconds: float = 60.0,
+        battlelog: Optional[BattlelogIngestor] = None,
+        jobs: Optional[JobQueue] = None,
+    ):
+        self.db = db
+        self.clash_api = clash_api
+        self.rate = rate
+        self.cycle_seconds = cycle_seconds
+        self.battlelog = battlelog
+        self.jobs = jobs
+        self.limiter = AsyncRateLimiter(rate)
+
+    async def run(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                await self.run_cycle()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Player refresh cycle failed")
+            await asyncio.sleep(max(1.0, self.cycle_seconds - (time.monotonic() - started)))
+
+    async def run_cycle(self) -> int:
+        due = plan_refresh(await self.db.list_refresh_candidates(), time.time())
+        # за цикл — не больше, чем позволяет бюджет; остальные дождутся следующего
+        calls_per_tag = 2 if self.battlelog else 1
+        budget = max(1, int(self.rate * self.cycle_seconds) // calls_per_tag)
+        batch = due[:budget]
+        if self.jobs is not None and batch:
+            refreshed = await self.jobs.refresh_players(
+                batch, rate=self.rate, battlelog=self.battlelog is not None, timeout=2 * self.cycle_seconds
+            )
+        else:
+            refreshed = await self.refresh_batch(batch)
+        if due:
+            log.info("Refreshed %s/%s due players (%s waiting)", refreshed, min(len(due), budget), max(0, len(due) - budget))
+        return refreshed
+
+    async def refresh_batch(self, tags: List[str]) -> int:
+        refreshed = 0
+        for tag in tags:
+            await self.limiter.acquire()
+            if await self.refresh(tag):
+                refreshed += 1
+        return refreshed
+
+    async def refresh(self, tag: str) -> bool:
+        player = await self.clash_api.get_player(tag)
+        if not player or player.get("__error__"):
+            return False
+        await self.db.cache_player_json(tag, player)
+        await self.db.mark_refreshed(tag, player.get("name", "Без ника"))
+        if self.battlelog:
+            await self.limiter.acquire()
+            try:
+                await self.battlelog.ingest(tag)
+            except Exception:
+                log.exception("Battlelog ingest failed for %s", tag)
+        return True
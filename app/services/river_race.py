@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, Iterable, List
+
+from app.services.clash_api import ClashApi, RiverRaceLogEntry
+from app.services.cw2_history import CW2WeekEntry
+from app.utils import normalize_player_tag
+
+
+def entries_by_player(clan_tag: str, log: List[RiverRaceLogEntry]) -> Dict[str, List[CW2WeekEntry]]:
+    """
+    Разворачивает riverracelog клана в историю CW2 по каждому участнику.
+    Один запрос лога — вся история клана, а не одна HTML-страница на игрока.
+    """
+    out: Dict[str, List[CW2WeekEntry]] = {}
+    for week in log:
+        standing = next((s for s in week.standings if s.clan.tag == clan_tag), None)
+        if standing is None:
+            continue
+        clan = standing.clan
+        for p in clan.participants:
+            # в лог попадают все, кто был в клане на неделе; кто не играл — пропускаем
+            if not p.decks_used and not p.fame:
+                continue
+            out.setdefault(p.tag, []).append(
+                CW2WeekEntry(
+                    season_id=week.season_id,
+                    week=week.section_index + 1,
+                    medals=p.fame,
+                    decks_used=p.decks_used,
+                    clan_name=clan.name or "—",
+                    clan_tag=clan.tag or "—",
+                    clan_trophies=clan.clan_score or None,
+                )
+            )
+    return out
+
+
+def merge_weeks(primary: List[CW2WeekEntry], extra: List[CW2WeekEntry], limit: int = 10) -> List[CW2WeekEntry]:
+    """
+    Недели из primary плюс недостающие недели из extra (ключ — сезон и неделя),
+    свежие первыми. Так история из лога текущего клана дополняется неделями в прошлых кланах.
+    """
+    seen = {(w.season_id, w.week) for w in primary}
+    merged = list(primary) + [w for w in extra if (w.season_id, w.week) not in seen]
+    merged.sort(key=lambda x: ((x.season_id or 0), (x.week or 0)), reverse=True)
+    return merged[:limit]
+
+
+class RiverRaceHistoryService:
+    """
+    История CW2 из официального API (/clans/{tag}/riverracelog) вместо скрейпа RoyaleAPI.
+    Видны только недели в тех кланах, чьи логи запросили: по умолчанию — текущий клан игрока.
+    """
+
+    def __init__(self, clash_api: ClashApi):
+        self.clash_api = clash_api
+
+    async def clan_history(self, clan_tag: str) -> Dict[str, List[CW2WeekEntry]]:
+        clan_tag = normalize_player_tag(clan_tag)
+        log = await self.clash_api.get_river_race_log(clan_tag)
+        return entries_by_player(clan_tag, log or [])
+
+    async def players_history(
+        self, player_tags: Iterable[str], clan_tags: Iterable[str], limit: int = 10
+    ) -> Dict[str, List[CW2WeekEntry]]:
+        """История нескольких игроков по логам перечисленных кланов — по запросу на клан."""
+        wanted = {normalize_player_tag(t) for t in player_tags}
+        clans = sorted({normalize_player_tag(t) for t in clan_tags if t})
+        histories = await asyncio.gather(*(self.clan_history(t) for t in clans))
+
+        out: Dict[str, List[CW2WeekEntry]] = {t: [] for t in wanted}
+        for history in histories:
+            for tag, weeks in history.items():
+                if tag in wanted:
+                    out[tag].extend(weeks)
+        for tag, weeks in out.items():
+            weeks.sort(key=lambda x: ((x.season_id or 0), (x.week or 0)), reverse=True)
+            out[tag] = weeks[:limit]
+        return out
+
+    async def get_last_10_weeks_player(self, player_tag: str) -> List[CW2WeekEntry]:
+        player_tag = normalize_player_tag(player_tag)
+        player = await self.clash_api.get_player(player_tag)
+        if not player or player.get("__error__"):
+            return []
+        clan_tag = (player.get("clan") or {}).get("tag")
+        if not clan_tag:
+            return []
+        result = await self.players_history([player_tag], [clan_tag])
+        return result[player_tag]
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Tuple
+
+from app.db import Database
+from app.services.clash_api import ClashApi
+
+# откуда взят снапшот
+SOURCE_FRESH = "fresh"  # из player_cache, не старше max_age (его держит свежим PlayerRefresher)
+SOURCE_LIVE = "live"    # только что из API
+SOURCE_STALE = "stale"  # API не ответил — последний сохранённый
+
+
+class PlayerSnapshots:
+    """
+    Единая точка получения профиля игрока для хендлеров:
+    свежий снапшот из БД → живой запрос в API (с сохранением в кеш) → устаревший снапшот.
+    """
+
+    def __init__(self, db: Database, clash_api: ClashApi, max_age: float = 300.0):
+        self.db = db
+        self.clash_api = clash_api
+        self.max_age = max_age
+
+    async def get(self, tag: str) -> Tuple[Optional[Dict[str, Any]], str]:
+        if self.max_age > 0:
+            fresh = await self.db.get_fresh_player_json(tag, self.max_age)
+            if fresh:
+                return fresh, SOURCE_FRESH
+
+        player = await self.clash_api.get_player(tag)
+        if player and not player.get("__error__"):
+            await self.db.cache_player_json(tag, player)
+            return player, SOURCE_LIVE
+
+        cached = await self.db.get_cached_player_json(tag)
+        if cached:
+            return cached, SOURCE_STALE
+        return None, SOURCE_STALE
+
+    async def get_raw(self, tag: str) -> Tuple[Optional[str], str]:
+        """То же, что get, но JSON снапшота строкой, как он лежит в player_cache (без разбора)."""
+        if self.max_age > 0:
+            fresh = await self.db.get_fresh_player_raw(tag, self.max_age)
+            if fresh:
+                return fresh, SOURCE_FRESH
+
+        player = await self.clash_api.get_player(tag)
+        if player and not player.get("__error__"):
+            return await self.db.cache_player_json(tag, player), SOURCE_LIVE
+
+        cached = await self.db.get_cached_player_raw(tag)
+        if cached:
+            return cached, SOURCE_STALE
+        return None, SOURCE_STALE
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import functools
 import hashlib
 import os
+import time
 from dataclasses import dataclass
 from io import BytesIO
 from typing import Any, Dict, List, Tuple
@@ -10,6 +12,10 @@ import aiofiles
 import httpx
 from PIL import Image, ImageDraw, ImageFont
 
+from app.cassette import http_client
+from app.metrics import RENDER_SECONDS, UPSTREAM_REQUESTS, UPSTREAM_SECONDS, cache_hit
+from app.services import card_analytics
+
 
 @dataclass
 class RenderConfig:
@@ -28,6 +34,7 @@ class RenderConfig:
     sub: Tuple[int, int, int] = (80, 80, 90)
 
 
+@functools.lru_cache(maxsize=None)
 def _safe_font(size: int) -> ImageFont.ImageFont:
     for path in [
         "C:/Windows/Fonts/arial.ttf",
@@ -42,37 +49,82 @@ def _safe_font(size: int) -> ImageFont.ImageFont:
     return ImageFont.load_default()
 
 
-def display_level(card: Dict[str, Any]) -> int | None:
-    lv = card.get("level")
-    mx = card.get("maxLevel")
-    if isinstance(lv, int) and isinstance(mx, int) and mx > 0:
-        return lv + (16 - mx)
-    return None
+async def _download_bytes(url: str, client: httpx.AsyncClient) -> bytes:
+    status = "error"
+    started = time.perf_counter()
+    try:
+        r = await client.get(url, timeout=20, follow_redirects=True)
+        status = str(r.status_code)
+        r.raise_for_status()
+        return r.content
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, service="icons", endpoint="icon")
+        UPSTREAM_REQUESTS.inc(service="icons", endpoint="icon", status=status)
 
 
-async def _download_bytes(url: str, client: httpx.AsyncClient) -> bytes:
-    r = await client.get(url, timeout=20, follow_redirects=True)
-    r.raise_for_status()
-    return r.content
+# уже декодированные иконки (ключ — имя файла в дисковом кеше); карт всего пара сотен
+_ICON_MEMO: Dict[str, Image.Image] = {}
+_ICON_MEMO_MAX = 1024
 
 
-async def _get_icon_cached(url: str, cache_dir: str, client: httpx.AsyncClient) -> Image.Image:
-    os.makedirs(cache_dir, exist_ok=True)
+def _memo_icon(key: str, img: Image.Image) -> Image.Image:
+    if len(_ICON_MEMO) < _ICON_MEMO_MAX:
+        _ICON_MEMO[key] = img
+    return img
 
+
+async def _get_icon_cached(url: str, cache_dir: str, client: httpx.AsyncClient) -> Image.Image:
     # ✅ уникальное имя = hash от полного URL (исключает путаницу cards vs cardevolutions vs cardheroes)
     key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    img = _ICON_MEMO.get(key)
+    if img is not None:
+        cache_hit("icon_memory", True)
+        return img
+    cache_hit("icon_memory", False)
+
+    os.makedirs(cache_dir, exist_ok=True)
     fpath = os.path.join(cache_dir, f"{key}.png")
 
-    if os.path.exists(fpath):
+    hit = os.path.exists(fpath)
+    cache_hit("icon_disk", hit)
+    if hit:
         async with aiofiles.open(fpath, "rb") as f:
             data = await f.read()
-        return Image.open(BytesIO(data)).convert("RGBA")
+        return _memo_icon(key, Image.open(BytesIO(data)).convert("RGBA"))
 
     data = await _download_bytes(url, client)
     async with aiofiles.open(fpath, "wb") as f:
         await f.write(data)
 
-    return Image.open(BytesIO(data)).convert("RGBA")
+    return _memo_icon(key, Image.open(BytesIO(data)).convert("RGBA"))
+
+
+def warm_up(cache_dir: str = "cache/icons") -> int:
+    """
+    Прогрев рендера: шрифты и иконки из дискового кеша в память.
+    Синхронная — запускать в отдельном потоке (asyncio.to_thread). Возвращает число иконок.
+    """
+    for size in (18, 14):
+        _safe_font(size)
+
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    loaded = 0
+    for fname in os.listdir(cache_dir):
+        if len(_ICON_MEMO) >= _ICON_MEMO_MAX:
+            break
+        key, ext = os.path.splitext(fname)
+        if ext != ".png" or key in _ICON_MEMO:
+            continue
+        try:
+            with Image.open(os.path.join(cache_dir, fname)) as im:
+                _ICON_MEMO[key] = im.convert("RGBA")
+            loaded += 1
+        except Exception:
+            pass
+    return loaded
 
 
 def _icons(card: Dict[str, Any]) -> Dict[str, str]:
@@ -120,18 +172,15 @@ def _pick_icon_for_levels(card: Dict[str, Any]) -> str | None:
 
 
 def _group_by_display_level(cards: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
-    groups: Dict[int, List[Dict[str, Any]]] = {}
-    for c in cards or []:
-        dl = display_level(c)
-        if isinstance(dl, int):
-            groups.setdefault(dl, []).append(c)
-    for lv in list(groups.keys()):
-        groups[lv] = sorted(groups[lv], key=lambda x: x.get("name", ""))
-    return groups
+    cards = cards or []
+    return {
+        lv: sorted((cards[i] for i in idx), key=lambda x: x.get("name", ""))
+        for lv, idx in card_analytics.group_by_level(cards).items()
+    }
 
 
 def _count_ge(groups: Dict[int, List[Dict[str, Any]]], level: int) -> int:
-    return sum(len(groups.get(lv, [])) for lv in groups.keys() if lv >= level)
+    return sum(len(v) for lv, v in groups.items() if lv >= level)
 
 
 async def _render_icon_grid(img: Image.Image, x0: int, y0: int, icons: List[Image.Image], cfg: RenderConfig) -> int:
@@ -156,6 +205,16 @@ async def render_upgrade_image(
     out_path: str,
     cache_dir: str = "cache/icons",
     levels_to_show: List[int] | None = None,
+) -> str:
+    with RENDER_SECONDS.time(kind="upgrade"):
+        return await _render_upgrade_image(player, out_path, cache_dir, levels_to_show)
+
+
+async def _render_upgrade_image(
+    player: Dict[str, Any],
+    out_path: str,
+    cache_dir: str,
+    levels_to_show: List[int] | None,
 ) -> str:
     cfg = RenderConfig()
     font_h = _safe_font(18)
@@ -202,7 +261,7 @@ async def render_upgrade_image(
     img = Image.new("RGB", (canvas_w, h), cfg.bg)
     draw = ImageDraw.Draw(img)
 
-    async with httpx.AsyncClient() as client:
+    async with http_client() as client:
         y = cfg.pad
 
         async def render_collection(title: str, items: List[Dict[str, Any]], icon_picker) -> None:
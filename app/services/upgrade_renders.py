@@ -0,0 +1,140 @@
+"""
+Картинка /upgrade: кеш готовых рендеров и предрендер, пока пользователь выбирает аккаунт.
+
+Картинка зависит только от снапшота игрока, поэтому готовый файл привязан к хешу JSON
+снапшота (как текст профиля в profile_text): снапшот не менялся — рендер не нужен,
+а если картинку уже отправляли — хватает file_id.
+
+Когда аккаунтов несколько, /upgrade показывает выбор и сразу рендерит их все в фоне (speculate):
+одновременно не больше `limit` предрендеров на процесс, в очередь задач они идут
+с PRIORITY_SPECULATIVE — ниже интерактивных. Выбор аккаунта забирает готовый файл или
+присоединяется к идущему рендеру; предрендер, который ещё ждёт слота, отменяется, и рендер
+идёт как обычный. Ничего не выбрал за `idle` секунд — ещё не начатые предрендеры отменяются.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.metrics import UPGRADE_RENDERS
+from app.services.job_queue import PRIORITY_INTERACTIVE, PRIORITY_SPECULATIVE, JobQueue
+from app.services.profile_text import snapshot_hash
+from app.services.snapshots import PlayerSnapshots
+
+log = logging.getLogger(__name__)
+
+_DONE_MAX = 4096
+
+
+def render_path(tag: str) -> str:
+    return os.path.join("cache", "renders", f"upgrade_{tag.replace('#', '')}.png")
+
+
+@dataclass
+class Rendered:
+    tag: str
+    path: str
+    snapshot_hash: str
+    # после первой отправки картинка лежит у Telegram — дальше шлём по file_id
+    file_id: Optional[str] = None
+
+
+class UpgradeRenders:
+    def __init__(self, jobs: JobQueue, snapshots: PlayerSnapshots, limit: int = 2, idle: float = 60.0):
+        self.jobs = jobs
+        self.snapshots = snapshots
+        self.idle = idle
+        self._slots = asyncio.Semaphore(limit) if limit > 0 else None
+        self._done: Dict[str, Rendered] = {}
+        # тег -> идущий рендер (по тегу один за раз: все пишут в один файл)
+        self._building: Dict[str, asyncio.Task] = {}
+        # пользователь -> (предрендеры по тегам, таймер отмены)
+        self._speculative: Dict[int, Tuple[Dict[str, asyncio.Task], asyncio.TimerHandle]] = {}
+
+    async def get(self, tag: str, user_id: Optional[int] = None) -> Optional[Rendered]:
+        """Картинка для текущего снапшота тега; None — снапшота нет (API не ответил, кеша нет)."""
+        entry = self._speculative.get(user_id) if user_id is not None else None
+        task = entry[0].pop(tag, None) if entry else None
+        if task is not None and not task.done() and tag not in self._building:
+            # предрендер ещё ждёт слота — не стоим за ним в очереди
+            task.cancel()
+            UPGRADE_RENDERS.inc(mode="speculative", outcome="cancelled")
+
+        raw, _ = await self.snapshots.get_raw(tag)
+        if not raw:
+            return None
+        return await self._render(tag, snapshot_hash(raw), speculative=False)
+
+    # -------- предрендер --------
+
+    def speculate(self, user_id: int, tags: Iterable[str]) -> None:
+        """Начинает фоновый рендер тегов, из которых пользователь сейчас выбирает."""
+        if self._slots is None:
+            return
+        self.stop(user_id)
+        tasks = {tag: asyncio.create_task(self._prerender(tag)) for tag in tags}
+        timer = asyncio.get_running_loop().call_later(self.idle, self.stop, user_id)
+        self._speculative[user_id] = (tasks, timer)
+
+    def stop(self, user_id: int) -> None:
+        """Отменяет ещё не начатые предрендеры пользователя (уже идущие доделываются в кеш)."""
+        entry = self._speculative.pop(user_id, None)
+        if entry is None:
+            return
+        tasks, timer = entry
+        timer.cancel()
+        for tag, task in tasks.items():
+            if not task.done() and tag not in self._building:
+                task.cancel()
+                UPGRADE_RENDERS.inc(mode="speculative", outcome="cancelled")
+
+    async def _prerender(self, tag: str) -> None:
+        assert self._slots is not None
+        async with self._slots:
+            try:
+                raw, _ = await self.snapshots.get_raw(tag)
+                if raw:
+                    await self._render(tag, snapshot_hash(raw), speculative=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.debug("upgrade prerender %s failed: %s", tag, e)
+
+    # -------- рендер --------
+
+    async def _render(self, tag: str, digest: str, speculative: bool) -> Rendered:
+        mode = "speculative" if speculative else "interactive"
+        joined = False
+        while True:
+            done = self._done.get(tag)
+            if done is not None and done.snapshot_hash == digest and os.path.exists(done.path):
+                UPGRADE_RENDERS.inc(mode=mode, outcome="joined" if joined else "ready")
+                return done
+            task = self._building.get(tag)
+            if task is None:
+                break
+            # рендер этого тега уже идёт (чаще всего — предрендер): ждём его и смотрим в кеш
+            joined = True
+            with contextlib.suppress(Exception):
+                await asyncio.shield(task)
+
+        UPGRADE_RENDERS.inc(mode=mode, outcome="rendered")
+        task = asyncio.create_task(self._build(tag, digest, speculative))
+        self._building[tag] = task
+        task.add_done_callback(lambda _: self._building.pop(tag, None))
+        return await asyncio.shield(task)
+
+    async def _build(self, tag: str, digest: str, speculative: bool) -> Rendered:
+        path = render_path(tag)
+        priority = PRIORITY_SPECULATIVE if speculative else PRIORITY_INTERACTIVE
+        await self.jobs.render_upgrade(tag, path, priority=priority)
+        rendered = Rendered(tag, path, digest)
+        if len(self._done) >= _DONE_MAX:
+            self._done.pop(next(iter(self._done)))
+        self._done.pop(tag, None)
+        self._done[tag] = rendered
+        return rendered
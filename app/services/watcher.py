@@ -0,0 +1,300 @@
+"""
+Подписки на события: «игрок ушёл из клана», «игрок перешёл N трофеев», «участник клана
+не отыграл колоды КВ за день».
+
+Все подписки на один тег — одна цель: один запрос к API на всех подписчиков, интервал —
+самый короткий из их. Цели лежат в куче по времени следующего опроса, планировщик спит
+до ближайшей. Для игроков сначала смотрим player_cache: если снапшот свежее интервала
+(его обновил PlayerRefresher или чей-то /profile), в API не ходим вовсе.
+
+У каждой подписки в state — последнее увиденное значение; событие — это переход
+между ним и новым снапшотом, поэтому после рестарта старые события не повторяются.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from html import escape
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.db import Database
+from app.metrics import WATCH_POLLS
+from app.ratelimit import AsyncRateLimiter
+from app.services.clash_api import ClashApi, CurrentRiverRace
+from app.services.outbox import Outbox
+
+log = logging.getLogger(__name__)
+
+KIND_LEFT_CLAN = "left_clan"
+KIND_TROPHIES = "trophies"
+KIND_WAR_DECKS = "war_decks"
+
+TARGET_PLAYER = "player"
+TARGET_CLAN = "clan"
+
+# как часто опрашивать цель, секунд
+POLL_INTERVALS = {
+    KIND_LEFT_CLAN: 15 * 60,
+    KIND_TROPHIES: 10 * 60,
+    KIND_WAR_DECKS: 20 * 60,
+}
+
+WAR_DECKS_PER_DAY = 4
+WAR_PERIOD_TYPES = ("warDay", "colosseum")
+
+TargetKey = Tuple[str, str]
+
+
+def target_of(kind: str) -> str:
+    return TARGET_CLAN if kind == KIND_WAR_DECKS else TARGET_PLAYER
+
+
+# -------- игроки --------
+
+
+def player_state(kind: str, player: Dict[str, Any]) -> Dict[str, Any]:
+    if kind == KIND_LEFT_CLAN:
+        clan = player.get("clan") or {}
+        return {"clan_tag": clan.get("tag", ""), "clan_name": clan.get("name", "")}
+    return {"trophies": int(player.get("trophies") or 0)}
+
+
+def check_player(watch: Dict[str, Any], player: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """(новый state, текст уведомления или None)."""
+    kind, old = watch["kind"], watch["state"]
+    new = player_state(kind, player)
+    if not old:
+        return new, None
+
+    who = f"<b>{escape(player.get('name') or '')}</b> <code>{escape(watch['tag'])}</code>"
+    if kind == KIND_LEFT_CLAN:
+        if old["clan_tag"] and new["clan_tag"] != old["clan_tag"]:
+            text = f"🚪 {who} больше не в клане {escape(old['clan_name'])}"
+            if new["clan_tag"]:
+                text += f" — теперь в {escape(new['clan_name'])} <code>{escape(new['clan_tag'])}</code>"
+            return new, text
+    elif kind == KIND_TROPHIES:
+        threshold = watch["threshold"]
+        if old["trophies"] < threshold <= new["trophies"]:
+            return new, f"🏆 {who}: порог {threshold} пройден, сейчас {new['trophies']} трофеев"
+    return new, None
+
+
+# -------- КВ клана --------
+
+
+def war_state(race: CurrentRiverRace, old: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    base — сколько колод у участника было на начало текущего дня (decksUsed за всю гонку);
+    в течение дня он не меняется, на смене дня берётся заново.
+    """
+    same_day = bool(old) and (old["section"], old["period"]) == (race.section_index, race.period_index)
+    participants = race.clan.participants
+    return {
+        "section": race.section_index,
+        "period": race.period_index,
+        "type": race.period_type,
+        "base": old["base"] if same_day else {p.tag: p.decks_used - p.decks_used_today for p in participants},
+        "names": {p.tag: p.name for p in participants},
+    }
+
+
+def missed_war_decks(old: Optional[Dict[str, Any]], race: CurrentRiverRace) -> List[Tuple[str, str, int]]:
+    """
+    Кто не отыграл все колоды за только что закончившийся военный день: [(тег, ник, колод)].
+    Колоды за прошлый день = (decksUsed − decksUsedToday) сейчас − base на начало того дня,
+    так что неважно, в какой момент после смены дня мы опросили клан.
+    """
+    if not old or old["type"] not in WAR_PERIOD_TYPES:
+        return []
+    if old["section"] != race.section_index or race.period_index != old["period"] + 1:
+        # сменилась неделя (счётчики обнулены) или пропустили несколько дней — честно посчитать нельзя
+        return []
+    now = {p.tag: p for p in race.clan.participants}
+    out = []
+    for tag, base in old["base"].items():
+        p = now.get(tag)
+        used = (p.decks_used - p.decks_used_today - base) if p else 0
+        if used < WAR_DECKS_PER_DAY:
+            out.append((tag, old["names"].get(tag, ""), max(0, used)))
+    return out
+
+
+def war_text(clan_tag: str, clan_name: str, missed: List[Tuple[str, str, int]]) -> str:
+    lines = [f"⚔️ КВ, <b>{escape(clan_name)}</b> <code>{escape(clan_tag)}</code>: не все колоды за прошедший день"]
+    for tag, name, used in sorted(missed, key=lambda m: m[2]):
+        lines.append(f"• {escape(name or tag)} <code>{escape(tag)}</code> — {used}/{WAR_DECKS_PER_DAY}")
+    return "\n".join(lines)
+
+
+# -------- планировщик --------
+
+
+@dataclass
+class _Target:
+    kind: str
+    tag: str
+    interval: float
+    due: float = 0.0
+    watches: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+
+
+class WatchScheduler:
+    """
+    Опрос подписок: куча (время опроса, цель), один запрос на цель, запросы к API —
+    не чаще rate в секунду (отдельный бюджет, как у PlayerRefresher).
+    Хендлеры сообщают о новых и удалённых подписках через add()/remove().
+    """
+
+    def __init__(self, db: Database, clash_api: ClashApi, outbox: Outbox, rate: float = 1.0):
+        self.db = db
+        self.clash_api = clash_api
+        self.outbox = outbox
+        self.limiter = AsyncRateLimiter(rate)
+        self.targets: Dict[TargetKey, _Target] = {}
+        self._by_id: Dict[int, TargetKey] = {}
+        self._heap: List[Tuple[float, int, TargetKey]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def _schedule(self, t: _Target, due: float) -> None:
+        # старые записи той же цели в куче не удаляем: при извлечении их отсеет сверка с t.due
+        t.due = due
+        heapq.heappush(self._heap, (due, next(self._seq), (t.kind, t.tag)))
+        self._wakeup.set()
+
+    def add(self, watch: Dict[str, Any], spread: bool = False) -> None:
+        """spread=True — первый опрос в случайный момент интервала (загрузка после старта)."""
+        key = (target_of(watch["kind"]), watch["tag"])
+        interval = POLL_INTERVALS[watch["kind"]]
+        t = self.targets.get(key)
+        if t is None:
+            t = self.targets[key] = _Target(key[0], key[1], interval)
+            self._schedule(t, time.monotonic() + (random.uniform(0, interval) if spread else interval))
+        elif interval < t.interval:
+            t.interval = interval
+            if t.due > time.monotonic() + interval:
+                self._schedule(t, time.monotonic() + interval)
+        t.watches[watch["id"]] = watch
+        self._by_id[watch["id"]] = key
+
+    def remove(self, watch_id: int) -> None:
+        key = self._by_id.pop(watch_id, None)
+        t = self.targets.get(key) if key else None
+        if t is None:
+            return
+        t.watches.pop(watch_id, None)
+        if not t.watches:
+            del self.targets[key]
+            return
+        interval = min(POLL_INTERVALS[w["kind"]] for w in t.watches.values())
+        if interval > t.interval:
+            # ушла подписка с самым частым опросом: следующий — через новый интервал от прошлого опроса
+            self._schedule(t, t.due + (interval - t.interval))
+        t.interval = interval
+
+    async def load(self) -> None:
+        for w in await self.db.list_watches():
+            self.add(w, spread=True)
+        if self.targets:
+            log.info("Watches: %s subscriptions on %s targets", len(self._by_id), len(self.targets))
+
+    async def run(self) -> None:
+        await self.load()
+        while True:
+            try:
+                await self._step()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Watch scheduler step failed")
+                await asyncio.sleep(1.0)
+
+    async def _step(self) -> None:
+        if not self._heap:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+            return
+        due, _, key = self._heap[0]
+        t = self.targets.get(key)
+        if t is None or t.due != due:
+            heapq.heappop(self._heap)
+            return
+        delay = due - time.monotonic()
+        if delay > 0:
+            # проснёмся раньше, если add() поставит цель ближе
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            return
+        heapq.heappop(self._heap)
+        try:
+            await self.poll(t)
+        finally:
+            if self.targets.get(key) is t:
+                self._schedule(t, time.monotonic() + t.interval)
+
+    async def poll(self, t: _Target) -> None:
+        if t.kind == TARGET_CLAN:
+            events, states = await self._poll_clan(t)
+        else:
+            events, states = await self._poll_player(t)
+        await self.db.save_watch_states(states)
+        # несколько событий одному пользователю за опрос — одним сообщением
+        for user_id, texts in events.items():
+            await self.outbox.send(user_id, "\n\n".join(texts))
+
+    async def _poll_player(self, t: _Target) -> Tuple[Dict[int, List[str]], Dict[int, Any]]:
+        events: Dict[int, List[str]] = {}
+        states: Dict[int, Any] = {}
+        player = await self.db.get_fresh_player_json(t.tag, t.interval)
+        source = "cache"
+        if player is None:
+            await self.limiter.acquire()
+            player = await self.clash_api.get_player(t.tag)
+            if not player or player.get("__error__"):
+                WATCH_POLLS.inc(target=t.kind, source="error")
+                return events, states
+            await self.db.cache_player_json(t.tag, player)
+            source = "api"
+        WATCH_POLLS.inc(target=t.kind, source=source)
+
+        for w in list(t.watches.values()):
+            new, text = check_player(w, player)
+            if new != w["state"]:
+                w["state"] = states[w["id"]] = new
+            if text:
+                events.setdefault(w["user_id"], []).append(text)
+        return events, states
+
+    async def _poll_clan(self, t: _Target) -> Tuple[Dict[int, List[str]], Dict[int, Any]]:
+        events: Dict[int, List[str]] = {}
+        states: Dict[int, Any] = {}
+        await self.limiter.acquire()
+        race = await self.clash_api.get_current_river_race(t.tag)
+        if race is None:
+            WATCH_POLLS.inc(target=t.kind, source="error")
+            return events, states
+        WATCH_POLLS.inc(target=t.kind, source="api")
+
+        members: Optional[Set[str]] = None
+        for w in list(t.watches.values()):
+            missed = missed_war_decks(w["state"], race)
+            if missed:
+                if members is None:
+                    # ушедшие из клана остаются в participants до конца недели — их не считаем
+                    await self.limiter.acquire()
+                    members = {m.tag for m in await self.clash_api.get_clan_members(t.tag) or []}
+                if members:
+                    missed = [m for m in missed if m[0] in members]
+                if missed:
+                    events.setdefault(w["user_id"], []).append(war_text(t.tag, race.clan.name, missed))
+            w["state"] = states[w["id"]] = war_state(race, w["state"])
+        return events, states
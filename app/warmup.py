@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+async def warm_up_renderer() -> None:
+    """Фоновый прогрев рендера: Pillow, шрифты и иконки подгружаются не на первом запросе."""
+    started = time.perf_counter()
+    try:
+        from app.services.upgrade_image import warm_up
+
+        icons = await asyncio.to_thread(warm_up)
+    except Exception:
+        log.exception("Renderer warm-up failed")
+        return
+    log.info("Renderer warm-up: %s icons in %.0f ms", icons, (time.perf_counter() - started) * 1000)
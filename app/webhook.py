@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+from contextlib import suppress
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from app.config import Config
+from app.middlewares.concurrency import UpdateConcurrencyMiddleware
+
+log = logging.getLogger(__name__)
+
+
+def build_webhook_app(bot: Bot, dp: Dispatcher, cfg: Config) -> web.Application:
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=cfg.webhook_secret or None,
+    ).register(app, path=cfg.webhook_path)
+    setup_application(app, dp, bot=bot)
+    # /metrics здесь нет: этот порт смотрит наружу, метрики — только на METRICS_HOST:METRICS_PORT
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, cfg: Config) -> None:
+    """
+    Режим вебхука: aiohttp-сервер принимает апдейты от Telegram (обычно за reverse proxy),
+    апдейты обрабатываются в фоне, но не больше webhook_max_concurrency одновременно.
+    По SIGINT/SIGTERM перестаём принимать запросы и дожидаемся начатых апдейтов.
+    """
+    limiter = UpdateConcurrencyMiddleware(cfg.webhook_max_concurrency)
+    dp.update.outer_middleware(limiter)
+
+    app = build_webhook_app(bot, dp, cfg)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=cfg.webhook_host, port=cfg.webhook_port)
+    await site.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        # на Windows сигналов в loop нет — там остановит KeyboardInterrupt
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await bot.set_webhook(
+            url=cfg.webhook_url.rstrip("/") + cfg.webhook_path,
+            secret_token=cfg.webhook_secret or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        log.info("Webhook server listening on %s:%s%s", cfg.webhook_host, cfg.webhook_port, cfg.webhook_path)
+        await stop.wait()
+    finally:
+        await site.stop()
+        await asyncio.sleep(0)  # даём стартовать задачам уже принятых апдейтов
+        if not await limiter.drain(cfg.shutdown_timeout):
+            log.warning("Shutdown: %s updates still running after %.0fs", limiter.active, cfg.shutdown_timeout)
+        await runner.cleanup()
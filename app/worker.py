@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from contextlib import suppress
+from typing import List
+
+from app import cassette
+from app.config import Config, load_config
+from app.db import Database
+from app.services.clash_api import ClashApi
+from app.services.cw2_history import CW2HistoryService
+from app.services.job_queue import JobContext, JobError, run_job
+
+log = logging.getLogger(__name__)
+
+LEASE_SECONDS = 60.0
+POLL_MIN = 0.05
+POLL_MAX = 1.0
+PURGE_EVERY = 600.0
+PURGE_OLDER_THAN = 3600.0
+
+
+async def _execute(ctx: JobContext, worker_id: str, job: dict) -> None:
+    async def heartbeat() -> None:
+        # долгая задача не должна потерять аренду, пока воркер жив
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            await ctx.db.extend_job_lease(job["id"], worker_id, LEASE_SECONDS)
+
+    hb = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    try:
+        result = await run_job(ctx, job["kind"], job["payload"])
+    except JobError as e:
+        retry_in = min(60.0, 2.0 ** job["attempts"])
+        log.warning("job %s (%s) attempt %s failed: %s", job["id"], job["kind"], job["attempts"], e)
+        await ctx.db.fail_job(job["id"], worker_id, str(e), retry_in=retry_in)
+        return
+    finally:
+        hb.cancel()
+        with suppress(asyncio.CancelledError):
+            await hb
+
+    await ctx.db.complete_job(job["id"], worker_id, result)
+    log.info("job %s (%s) done in %.2fs", job["id"], job["kind"], time.perf_counter() - started)
+
+
+async def _slot_loop(ctx: JobContext, worker_id: str, stop: asyncio.Event, purge: bool) -> None:
+    idle = POLL_MIN
+    next_purge = time.monotonic()
+
+    while not stop.is_set():
+        if purge and time.monotonic() >= next_purge:
+            await ctx.db.purge_jobs(PURGE_OLDER_THAN)
+            next_purge = time.monotonic() + PURGE_EVERY
+
+        job = await ctx.db.lease_job(worker_id, LEASE_SECONDS)
+        if job is None:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop.wait(), idle)
+            idle = min(idle * 2, POLL_MAX)
+            continue
+
+        idle = POLL_MIN
+        await _execute(ctx, worker_id, job)
+
+
+async def worker_main(name: str) -> None:
+    """
+    Процесс-воркер: берёт задачи из таблицы jobs общей SQLite-базы.
+    В одном процессе крутится cfg.job_worker_concurrency слотов — скрейпы в основном ждут сеть.
+    """
+    cfg = load_config()
+    db = Database(cfg.db_path)
+    cassette.configure(cfg.http_cassette_mode, cfg.http_cassette, cfg.http_cassette_latency)
+    clash_api = ClashApi(
+        token=cfg.clash_api_token,
+        base_url=cfg.clash_api_base,
+        rate=cfg.clash_api_rate,
+        trim_players=cfg.trim_player_json,
+    )
+    # доля общего лимита скрейпа (процесс бота + job_workers воркеров, см. app.main)
+    cw2_history = CW2HistoryService(
+        timeout=12.0, base_url=cfg.royaleapi_base, rate=cfg.royaleapi_rate / (cfg.job_workers + 1)
+    )
+    ctx = JobContext(db=db, clash_api=clash_api, cw2_history=cw2_history)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+
+    slots = [
+        asyncio.create_task(_slot_loop(ctx, f"{name}:{os.getpid()}:{i}", stop, purge=(i == 0)))
+        for i in range(max(1, cfg.job_worker_concurrency))
+    ]
+    log.info("worker %s started (pid %s, %s slots)", name, os.getpid(), len(slots))
+    if cfg.warmup:
+        from app.warmup import warm_up_renderer
+
+        slots.append(asyncio.create_task(warm_up_renderer()))
+    try:
+        await asyncio.gather(*slots)
+    finally:
+        await clash_api.close()
+        await cw2_history.close()
+
+
+def worker_process(index: int) -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s %(levelname)s worker-{index} %(name)s: %(message)s",
+    )
+    with suppress(KeyboardInterrupt):
+        asyncio.run(worker_main(f"w{index}"))
+
+
+def start_workers(cfg: Config) -> List[multiprocessing.Process]:
+    # spawn, а не fork: форкать процесс с работающим event loop небезопасно
+    mp = multiprocessing.get_context("spawn")
+    procs = []
+    for i in range(cfg.job_workers):
+        p = mp.Process(target=worker_process, args=(i,), name=f"naborbot-worker-{i}", daemon=True)
+        p.start()
+        procs.append(p)
+    return procs
+
+
+def stop_workers(procs: List[multiprocessing.Process], timeout: float) -> None:
+    for p in procs:
+        if p.is_alive():
+            p.terminate()  # SIGTERM: воркер доделает текущие задачи и выйдет
+    deadline = time.monotonic() + timeout
+    for p in procs:
+        p.join(max(0.0, deadline - time.monotonic()))
+        if p.is_alive():
+            p.kill()
+            p.join()
+
+
+if __name__ == "__main__":
+    # отдельный запуск воркера (например, своим systemd-юнитом): python -m app.worker
+    worker_process(0)
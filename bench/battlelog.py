@@ -0,0 +1,113 @@
+"""
+Бенчмарк запросов по истории боёв (сеть не нужна):
+
+    python -m bench.battlelog [--players 200] [--days 30] [--per-day 20]
+
+Синтетический battlelog (часть боёв — КВ, колоды из небольшого пула) проходит через
+parse_battle и Database.save_battles, как у BattlelogIngestor. Дальше — время
+deck_winrates / war_day_battles для одного игрока и их планы (EXPLAIN QUERY PLAN):
+запрос по игроку должен идти по idx_battle_players_deck, а не сканировать таблицу.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import aiosqlite
+
+from app.db import DECK_WINRATES_SQL, WAR_DAY_BATTLES_SQL, Database
+from app.services.battlelog import WAR_BATTLE_TYPES, WAR_DAY_OFFSET, parse_battle
+
+N_CARDS = 110
+DECK_POOL = 12
+RUNS = 50
+
+
+def make_battle(tag: str, ts: int, rnd: random.Random, decks: List[List[int]]) -> Dict[str, Any]:
+    def side(player_tag: str, crowns: int) -> Dict[str, Any]:
+        cards = [{"id": cid, "name": f"Card {cid}"} for cid in rnd.choice(decks)]
+        return {"tag": player_tag, "crowns": crowns, "cards": cards}
+
+    mine, theirs = rnd.randint(0, 3), rnd.randint(0, 3)
+    btype = rnd.choice(sorted(WAR_BATTLE_TYPES)) if rnd.random() < 0.3 else "PvP"
+    return {
+        "type": btype,
+        "battleTime": datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m%dT%H%M%S.000Z"),
+        "gameMode": {"id": 72000006},
+        "team": [side(tag, mine)],
+        "opponent": [side(f"#O{rnd.randrange(10**9)}", theirs)],
+    }
+
+
+async def explain(path: str, sql: str, params: tuple) -> List[str]:
+    async with aiosqlite.connect(path) as db:
+        cur = await db.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [r[3] for r in await cur.fetchall()]
+
+
+async def run(players: int, days: int, per_day: int) -> None:
+    rnd = random.Random(1)
+    decks = [rnd.sample(range(26000000, 26000000 + N_CARDS), 8) for _ in range(DECK_POOL)]
+    now = int(time.time())
+    since = now - days * 86400
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = Database(path)
+        await db.init()
+
+        started = time.perf_counter()
+        saved = 0
+        for p in range(players):
+            tag = f"#P{p}"
+            times = sorted(rnd.randint(since, now) for _ in range(days * per_day))
+            battles = [parse_battle(make_battle(tag, ts, rnd, decks)) for ts in times]
+            saved += await db.save_battles(tag, [b for b in battles if b], times[-1])
+        save_s = time.perf_counter() - started
+        await db.analyze()
+
+        timings = {}
+        for name, call in (
+            ("deck_winrates", lambda: db.deck_winrates("#P0")),
+            ("war_day_battles", lambda: db.war_day_battles("#P0", since, day_offset=WAR_DAY_OFFSET)),
+        ):
+            t0 = time.perf_counter()
+            for _ in range(RUNS):
+                result = await call()
+            timings[name] = ((time.perf_counter() - t0) / RUNS * 1000, len(result))
+
+        plans = {
+            "deck_winrates": await explain(path, DECK_WINRATES_SQL, ("#P0", 10)),
+            "war_day_battles": await explain(path, WAR_DAY_BATTLES_SQL, (WAR_DAY_OFFSET, "#P0", since)),
+        }
+
+    print(f"{players} players × {days * per_day} battles ({days} days): saved {saved} in {save_s:.1f}s")
+    ok = True
+    for name, (ms, n) in timings.items():
+        print(f"  {name:16} {ms:8.2f} ms ({n} rows)")
+        for line in plans[name]:
+            print(f"      {line}")
+        if not any("idx_battle_players_deck" in line for line in plans[name]):
+            ok = False
+            print("      !! idx_battle_players_deck is not used")
+    if not ok:
+        raise SystemExit(1)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--players", type=int, default=200)
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--per-day", type=int, default=20)
+    args = ap.parse_args()
+    asyncio.run(run(args.players, args.days, args.per_day))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Бенчмарк аналитики уровней карт по пулу игроков (сеть не нужна):
+
+    python -m bench.card_analytics [--players 5000] [--runs 5]
+
+Сравнивает поигровой цикл по словарям (как считалось раньше для одного профиля)
+с app.services.card_analytics: гистограммы уровней, карт ≥14/15/16 и перцентиль балла.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from app.services import card_analytics as ca
+
+MAX_LEVELS = (16, 14, 12, 9)
+
+
+def make_players(n: int, n_cards: int = 110, seed: int = 1) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    players = []
+    for _ in range(n):
+        cards = []
+        for cid in range(n_cards):
+            mx = MAX_LEVELS[cid % len(MAX_LEVELS)]
+            cards.append({"id": 26000000 + cid, "level": rnd.randint(max(1, mx - 6), mx), "maxLevel": mx})
+        players.append({"cards": cards})
+    return players
+
+
+def python_loop(players: List[Dict[str, Any]]) -> List[float]:
+    scores = []
+    for p in players:
+        levels: Dict[int, int] = {}
+        for c in p["cards"]:
+            lv, mx = c.get("level"), c.get("maxLevel")
+            if isinstance(lv, int) and isinstance(mx, int) and mx > 0:
+                dl = lv + (16 - mx)
+                levels[dl] = levels.get(dl, 0) + 1
+        scores.append(sum(levels.get(lv, 0) * w for lv, w in ca.SCORE_WEIGHTS.items()))
+    ordered = sorted(scores)
+    # перцентиль каждого — бинпоиском, как и в векторной версии
+    import bisect
+
+    return [
+        (bisect.bisect_left(ordered, s) + bisect.bisect_right(ordered, s)) / 2 * 100 / len(ordered)
+        for s in scores
+    ]
+
+
+def vectorized(players: List[Dict[str, Any]]) -> List[float]:
+    m, _ = ca.level_matrix(players)
+    hist = ca.level_histograms(m)
+    ca.cumulative_ge(hist)
+    scores = ca.comparison_scores(hist)
+    return ca.percentile_ranks(scores, scores).tolist()
+
+
+def vectorized_prebuilt(players: List[Dict[str, Any]]) -> Callable[[], List[float]]:
+    """Только расчёт — матрица уже собрана (например, закеширована для пула)."""
+    m, _ = ca.level_matrix(players)
+
+    def run() -> List[float]:
+        hist = ca.level_histograms(m)
+        ca.cumulative_ge(hist)
+        scores = ca.comparison_scores(hist)
+        return ca.percentile_ranks(scores, scores).tolist()
+
+    return run
+
+
+def _median_ms(fn: Callable[[], Any], runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--players", type=int, default=5000)
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    players = make_players(args.players)
+    assert python_loop(players) == vectorized(players)
+
+    print(f"{args.players} players × {len(players[0]['cards'])} cards, median of {args.runs} runs:")
+    print(f"  python loop            {_median_ms(lambda: python_loop(players), args.runs):8.1f} ms")
+    print(f"  numpy (with matrix)    {_median_ms(lambda: vectorized(players), args.runs):8.1f} ms")
+    print(f"  numpy (prebuilt)       {_median_ms(vectorized_prebuilt(players), args.runs):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Бенчмарк JSON-кодека на ответах /players/{tag} (сеть не нужна):
+
+    python -m bench.codec [--players 500] [--runs 5] [--cassette prod.cas | --dir recorded/]
+
+Игроки берутся из кассеты (app.cassette, HTTP_CASSETTE_MODE=record), из каталога с <TAG>.json
+или генерируются (bench.fake_servers) с добавкой полей, которые есть в настоящем ответе API,
+но боту не нужны: бейджи, достижения, текущая колода, статистика лиг.
+
+Для каждого варианта — пропускная способность (МиБ/с и ответов/с, медиана по --runs)
+и аллокации на один ответ по tracemalloc: сколько блоков и КиБ остаётся за результатом разбора
+и пик памяти во время разбора. Отдельно — чтение снапшота из player_cache (полного и обрезанного).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from app import cassette, codec
+from bench import fake_servers
+
+Variant = Tuple[str, Callable[[Any], Any]]
+
+
+def _pad_like_api(player: Dict[str, Any], rnd: random.Random) -> Dict[str, Any]:
+    p = dict(player)
+    p["badges"] = [
+        {
+            "name": f"Badge{k}",
+            "level": rnd.randint(1, 8),
+            "maxLevel": 8,
+            "progress": rnd.randint(0, 5000),
+            "target": 5000,
+            "iconUrls": {"large": f"https://api-assets.clashroyale.com/playerbadges/512/badge{k}.png"},
+        }
+        for k in range(rnd.randint(60, 120))
+    ]
+    p["achievements"] = [
+        {
+            "name": f"Achievement {k}",
+            "stars": rnd.randint(0, 3),
+            "value": rnd.randint(0, 10000),
+            "target": 10000,
+            "info": "Lorem ipsum dolor sit amet, consectetur adipiscing elit",
+            "completionInfo": None,
+        }
+        for k in range(30)
+    ]
+    p["currentDeck"] = [dict(c, starPoints=rnd.randint(0, 5000)) for c in rnd.sample(p["cards"], 8)]
+    p["currentFavouriteCard"] = {k: v for k, v in p["cards"][0].items() if k != "level"}
+    p["leagueStatistics"] = {
+        "currentSeason": {"trophies": p["trophies"], "bestTrophies": p["bestTrophies"]},
+        "previousSeason": {"id": "2026-09", "trophies": p["trophies"] - 100},
+        "bestSeason": {"id": "2025-12", "trophies": p["bestTrophies"]},
+    }
+    p["arena"] = {"id": 54000000 + rnd.randint(0, 30), "name": "Legendary Arena"}
+    return p
+
+
+def synth_payloads(n: int) -> List[bytes]:
+    synth = fake_servers.Synth(fake_servers.FakeConfig(players=n), "https://api-assets.clashroyale.com")
+    rnd = random.Random(1)
+    now = datetime(2026, 1, 1)
+    return [json.dumps(_pad_like_api(synth.player(i, now), rnd), ensure_ascii=False).encode() for i in range(n)]
+
+
+def cassette_payloads(path: str, n: int) -> List[bytes]:
+    c = cassette.Cassette(path)
+    c.load()
+    out = []
+    for url in c.urls():
+        if re.search(r"/players/%23[0-9A-Za-z]+$", url):
+            head, body = c.lookup("GET", url)
+            if head["s"] == 200:
+                out.append(body)
+        if len(out) >= n:
+            break
+    return out
+
+
+def dir_payloads(path: str, n: int) -> List[bytes]:
+    out = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".json") and ".battlelog." not in name:
+            with open(os.path.join(path, name), "rb") as f:
+                out.append(f.read())
+        if len(out) >= n:
+            break
+    return out
+
+
+def variants() -> Tuple[List[Variant], List[Variant]]:
+    decode: List[Variant] = [
+        ("json.loads", json.loads),
+        ("json.loads + trim", lambda raw: codec.trim(json.loads(raw), codec.PLAYER_FIELDS)),
+    ]
+    encode: List[Variant] = [("json.dumps", lambda obj: json.dumps(obj, ensure_ascii=False))]
+    if codec.orjson is not None:
+        decode.append(("orjson.loads", codec.orjson.loads))
+        decode.append(("orjson.loads + trim", lambda raw: codec.trim(codec.orjson.loads(raw), codec.PLAYER_FIELDS)))
+        encode.append(("orjson.dumps", lambda obj: codec.orjson.dumps(obj).decode("utf-8")))
+    if codec.msgspec is not None:
+        decode.append(("msgspec typed", codec.decode_player))
+    return decode, encode
+
+
+def throughput(fn: Callable[[Any], Any], items: List[Any], total_bytes: int, runs: int) -> Tuple[float, float]:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        for it in items:
+            fn(it)
+        samples.append(time.perf_counter() - started)
+    t = statistics.median(samples)
+    return total_bytes / t / 2**20, len(items) / t
+
+
+def allocations(fn: Callable[[Any], Any], items: List[Any]) -> Tuple[float, float, float]:
+    """(блоков за результатом, КиБ за результатом, пик КиБ) на один элемент."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        kept = [fn(it) for it in items]
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    blocks = sum(s.count_diff for s in diff)
+    size = sum(s.size_diff for s in diff)
+    n = len(kept)
+    return blocks / n, size / n / 1024, (peak - base) / n / 1024
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--players", type=int, default=500)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--cassette", default="", help="take /players/{tag} responses from this cassette")
+    ap.add_argument("--dir", default="", help="take <TAG>.json player responses from this directory")
+    args = ap.parse_args()
+
+    if args.cassette:
+        payloads = cassette_payloads(args.cassette, args.players)
+    elif args.dir:
+        payloads = dir_payloads(args.dir, args.players)
+    else:
+        payloads = synth_payloads(args.players)
+    if not payloads:
+        raise SystemExit("no player payloads found")
+
+    raw_bytes = sum(len(p) for p in payloads)
+    full = [json.loads(p) for p in payloads]
+    trimmed = [codec.trim(p, codec.PLAYER_FIELDS) for p in full]
+    stored_full = sum(len(json.dumps(p, ensure_ascii=False).encode()) for p in full)
+    stored_trim = sum(len(json.dumps(p, ensure_ascii=False).encode()) for p in trimmed)
+
+    print(
+        f"{len(payloads)} player payloads, avg {raw_bytes / len(payloads) / 1024:.1f} KiB "
+        f"(trimmed to PLAYER_FIELDS: {stored_trim / len(payloads) / 1024:.1f} KiB, "
+        f"{stored_trim / stored_full * 100:.0f}%); codec backend: {codec.BACKEND}, typed: {codec.TYPED_BACKEND}"
+    )
+    decode, encode = variants()
+    print()
+    print(f"{'decode':<22} {'MiB/s':>8} {'obj/s':>9} {'blocks/obj':>11} {'KiB/obj':>9} {'peak KiB':>9}")
+    for name, fn in decode:
+        mibs, ops = throughput(fn, payloads, raw_bytes, args.runs)
+        blocks, kib, peak = allocations(fn, payloads)
+        print(f"{name:<22} {mibs:>8.1f} {ops:>9.0f} {blocks:>11.0f} {kib:>9.1f} {peak:>9.1f}")
+
+    # чтение снапшота из player_cache — на каждый показ профиля, в отличие от разбора ответа API
+    print()
+    print(f"{'cache read (codec)':<22} {'full obj/s':>11} {'trimmed obj/s':>14}")
+    full_text = [codec.dumps(p) for p in full]
+    trim_text = [codec.dumps(p) for p in trimmed]
+    _, ops_full = throughput(codec.loads, full_text, stored_full, args.runs)
+    _, ops_trim = throughput(codec.loads, trim_text, stored_trim, args.runs)
+    print(f"{'codec.loads':<22} {ops_full:>11.0f} {ops_trim:>14.0f}")
+
+    print()
+    print(f"{'encode':<22} {'full obj/s':>11} {'trimmed obj/s':>14}")
+    for name, fn in encode:
+        _, ops_full = throughput(fn, full, stored_full, args.runs)
+        _, ops_trim = throughput(fn, trimmed, stored_trim, args.runs)
+        print(f"{name:<22} {ops_full:>11.0f} {ops_trim:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
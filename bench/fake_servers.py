@@ -0,0 +1,367 @@
+"""
+Локальные заглушки внешних сервисов для нагрузочных прогонов (сеть не нужна):
+Clash Royale API (/v1/...), страницы игроков RoyaleAPI (/player/<TAG>) и иконки карт (/icons/...).
+
+    python -m bench.fake_servers [--port 8081] [--latency-ms 80] [--jitter-ms 30] [--error-rate 0.01]
+
+Бот можно направить на них переменными окружения
+CLASH_API_BASE=http://127.0.0.1:8081/v1 и ROYALEAPI_BASE=http://127.0.0.1:8081.
+
+Игроки и кланы синтетические и детерминированные: всё зависит только от тега
+(тег кодирует номер игрока, игрок i состоит в клане i % clans). Записанные настоящие ответы
+можно подложить каталогом --recorded: <TAG без #>.json (профиль) и <TAG>.battlelog.json —
+они отдаются вместо синтетики.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+# символы, из которых состоят теги Clash Royale
+TAG_ALPHABET = "0289PYLQGRJCUV"
+CARD_COUNT = 110
+SUPPORT_CARD_COUNT = 4
+MEMBERS_PER_CLAN = 50
+
+
+@dataclass
+class FakeConfig:
+    players: int = 10_000
+    clans: int = 200
+    latency_ms: float = 80.0
+    jitter_ms: float = 30.0
+    error_rate: float = 0.0       # доля ответов 503 (и столько же 429 — как при превышении лимита)
+    recorded: str = ""            # каталог с записанными ответами
+    icons_base: str = ""          # откуда брать иконки (по умолчанию — этот же сервер)
+
+
+def encode_id(n: int, prefix: str = "") -> str:
+    s = ""
+    while True:
+        n, r = divmod(n, len(TAG_ALPHABET))
+        s = TAG_ALPHABET[r] + s
+        if n == 0:
+            break
+    return "#" + prefix + s.rjust(7, TAG_ALPHABET[0])
+
+
+def decode_id(tag: str) -> Optional[int]:
+    t = tag.lstrip("#").upper().replace("%23", "")
+    if t[:1] == "C":
+        t = t[1:]
+    n = 0
+    for ch in t:
+        i = TAG_ALPHABET.find(ch)
+        if i < 0:
+            return None
+        n = n * len(TAG_ALPHABET) + i
+    return n
+
+
+def player_tag(i: int) -> str:
+    return encode_id(i)
+
+
+def clan_tag(j: int) -> str:
+    # теги игроков начинаются с «0» (дополнение нулями), клановые — с «C»: не пересекаются
+    return encode_id(j, prefix="C")
+
+
+# -------- синтетические ответы --------
+
+
+class Synth:
+    def __init__(self, cfg: FakeConfig, base_url: str):
+        self.cfg = cfg
+        self.icons_base = (cfg.icons_base or base_url).rstrip("/")
+
+    def _rnd(self, *key: Any) -> random.Random:
+        return random.Random(":".join(map(str, key)))
+
+    def clan_of(self, i: int) -> int:
+        return i % self.cfg.clans
+
+    def members_of(self, j: int) -> List[int]:
+        return list(range(j, self.cfg.players, self.cfg.clans))[:MEMBERS_PER_CLAN]
+
+    def _card(self, rnd: random.Random, cid: int) -> Dict[str, Any]:
+        mx = (16, 14, 11, 8)[cid % 4]
+        lv = rnd.randint(max(1, mx - 6), mx)
+        card = {
+            "name": f"Card {cid}",
+            "id": 26000000 + cid,
+            "level": lv,
+            "maxLevel": mx,
+            "count": rnd.randint(0, 3000),
+            "elixirCost": 1 + cid % 9,
+            "rarity": ("common", "rare", "epic", "legendary")[cid % 4],
+            "iconUrls": {"medium": f"{self.icons_base}/icons/{cid}.png"},
+        }
+        if cid % 7 == 0 and rnd.random() < 0.4:
+            card["evolutionLevel"] = 1
+            card["iconUrls"]["evolutionMedium"] = f"{self.icons_base}/icons/{cid}_evo.png"
+        return card
+
+    def player(self, i: int, now: datetime) -> Dict[str, Any]:
+        rnd = self._rnd("player", i)
+        # трофеи медленно растут со временем — у обновлений есть что сравнивать
+        drift = (int(now.timestamp()) // 600 + i) % 40 - 20
+        trophies = rnd.randint(4000, 9000) + drift
+        j = self.clan_of(i)
+        cards = [self._card(rnd, c) for c in range(CARD_COUNT) if rnd.random() < 0.9]
+        return {
+            "tag": player_tag(i),
+            "name": f"Player{i}",
+            "expLevel": rnd.randint(30, 70),
+            "trophies": trophies,
+            "bestTrophies": trophies + rnd.randint(0, 500),
+            "wins": rnd.randint(1000, 20000),
+            "losses": rnd.randint(1000, 20000),
+            "battleCount": rnd.randint(2000, 40000),
+            "clan": {"tag": clan_tag(j), "name": f"Clan {j}"},
+            "role": "member" if i >= self.cfg.clans else "leader",
+            "cards": cards,
+            "supportCards": [self._card(rnd, CARD_COUNT + c) for c in range(SUPPORT_CARD_COUNT)],
+        }
+
+    def battlelog(self, i: int, now: datetime) -> List[Dict[str, Any]]:
+        rnd = self._rnd("battlelog", i, int(now.timestamp()) // 3600)
+        out = []
+        for k in range(25):
+            t = now - timedelta(minutes=17 * k + rnd.randint(0, 10))
+            opp = rnd.randrange(self.cfg.players)
+            crowns = rnd.randint(0, 3), rnd.randint(0, 3)
+            out.append({
+                "type": rnd.choice(("PvP", "riverRacePvP", "pathOfLegend")),
+                "battleTime": t.strftime("%Y%m%dT%H%M%S.000Z"),
+                "gameMode": {"id": 72000006},
+                "team": [{"tag": player_tag(i), "crowns": crowns[0],
+                          "cards": [{"id": 26000000 + rnd.randrange(CARD_COUNT), "name": "c"} for _ in range(8)]}],
+                "opponent": [{"tag": player_tag(opp), "crowns": crowns[1],
+                              "cards": [{"id": 26000000 + rnd.randrange(CARD_COUNT), "name": "c"} for _ in range(8)]}],
+            })
+        return out
+
+    def clan(self, j: int) -> Dict[str, Any]:
+        members = [self._member(i) for i in self.members_of(j)]
+        return {
+            "tag": clan_tag(j),
+            "name": f"Clan {j}",
+            "clanScore": 50000 + j,
+            "clanWarTrophies": 1000 + j * 7 % 4000,
+            "members": len(members),
+            "memberList": members,
+        }
+
+    def _member(self, i: int) -> Dict[str, Any]:
+        rnd = self._rnd("player", i)
+        return {
+            "tag": player_tag(i),
+            "name": f"Player{i}",
+            "role": "member",
+            "expLevel": rnd.randint(30, 70),
+            "trophies": rnd.randint(4000, 9000),
+            "donations": rnd.randint(0, 500),
+            "lastSeen": "20260101T000000.000Z",
+        }
+
+    def _participants(self, j: int, week: int) -> List[Dict[str, Any]]:
+        out = []
+        for i in self.members_of(j):
+            rnd = self._rnd("war", i, week)
+            decks = rnd.randint(0, 16)
+            out.append({
+                "tag": player_tag(i),
+                "name": f"Player{i}",
+                "fame": decks * rnd.randint(100, 225),
+                "repairPoints": 0,
+                "boatAttacks": rnd.randint(0, 2),
+                "decksUsed": decks,
+                "decksUsedToday": min(4, decks),
+            })
+        return out
+
+    def current_river_race(self, j: int) -> Dict[str, Any]:
+        clan = {"tag": clan_tag(j), "name": f"Clan {j}", "fame": 0, "clanScore": 0,
+                "participants": self._participants(j, 0)}
+        return {"state": "full", "sectionIndex": 1, "periodIndex": 10, "periodType": "warDay",
+                "clan": clan, "clans": [clan]}
+
+    def river_race_log(self, j: int) -> Dict[str, Any]:
+        items = []
+        for w in range(1, 11):
+            clan = {"tag": clan_tag(j), "name": f"Clan {j}", "fame": 10000, "clanScore": 2000 + j,
+                    "participants": self._participants(j, w)}
+            items.append({
+                "seasonId": 130 - w // 4,
+                "sectionIndex": (10 - w) % 4,
+                "createdDate": "20260101T000000.000Z",
+                "standings": [{"rank": 1 + w % 5, "trophyChange": 20, "clan": clan}],
+            })
+        return {"items": items}
+
+    def royaleapi_page(self, i: int) -> str:
+        j = self.clan_of(i)
+        rows = []
+        for w in range(1, 11):
+            rnd = self._rnd("war", i, w)
+            decks = rnd.randint(0, 16)
+            rows.append(
+                f'<tr><td>{130 - w // 4}-{(10 - w) % 4 + 1}</td>'
+                f'<td><a class="clan" href="/clan/{clan_tag(j)[1:]}">Clan {j}</a></td>'
+                f"<td>{decks}</td><td>{decks * rnd.randint(100, 225)}</td><td>{2000 + j}</td></tr>"
+            )
+        return (
+            "<html><body><h1>Player</h1>"
+            '<table class="ui table player_cw2_history_table">'
+            "<thead><tr><th>Season</th><th>Clan</th><th>Decks</th><th>Fame</th><th>Trophies</th></tr></thead>"
+            f"<tbody>{''.join(rows)}</tbody></table></body></html>"
+        )
+
+
+def _icon_png() -> bytes:
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.new("RGBA", (96, 116), (80, 120, 200, 255)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+# -------- сервер --------
+
+
+def make_app(cfg: FakeConfig, base_url: str) -> web.Application:
+    synth = Synth(cfg, base_url)
+    rnd = random.Random()
+    icon: List[bytes] = []
+    stats: Dict[str, int] = {}
+
+    def _recorded(name: str) -> Optional[Any]:
+        if not cfg.recorded:
+            return None
+        path = os.path.join(cfg.recorded, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @web.middleware
+    async def latency_and_errors(request: web.Request, handler):
+        stats[request.path.split("/")[1]] = stats.get(request.path.split("/")[1], 0) + 1
+        delay = max(0.0, rnd.gauss(cfg.latency_ms, cfg.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if not request.path.startswith("/icons/"):
+            roll = rnd.random()
+            if roll < cfg.error_rate:
+                return web.json_response({"reason": "serviceUnavailable"}, status=503)
+            if roll < 2 * cfg.error_rate:
+                return web.json_response({"reason": "requestThrottled"}, status=429)
+        return await handler(request)
+
+    def _index(request: web.Request, limit: int) -> int:
+        n = decode_id(request.match_info["tag"])
+        if n is None or n >= limit:
+            raise web.HTTPNotFound(text=json.dumps({"reason": "notFound"}), content_type="application/json")
+        return n
+
+    async def player(request: web.Request) -> web.Response:
+        rec = _recorded(request.match_info["tag"].lstrip("#").replace("%23", "") + ".json")
+        if rec is not None:
+            return web.json_response(rec)
+        return web.json_response(synth.player(_index(request, cfg.players), datetime.utcnow()))
+
+    async def battlelog(request: web.Request) -> web.Response:
+        rec = _recorded(request.match_info["tag"].lstrip("#").replace("%23", "") + ".battlelog.json")
+        if rec is not None:
+            return web.json_response(rec)
+        return web.json_response(synth.battlelog(_index(request, cfg.players), datetime.utcnow()))
+
+    async def clan(request: web.Request) -> web.Response:
+        return web.json_response(synth.clan(_index(request, cfg.clans)))
+
+    async def members(request: web.Request) -> web.Response:
+        return web.json_response({"items": synth.clan(_index(request, cfg.clans))["memberList"]})
+
+    async def current_river_race(request: web.Request) -> web.Response:
+        return web.json_response(synth.current_river_race(_index(request, cfg.clans)))
+
+    async def river_race_log(request: web.Request) -> web.Response:
+        return web.json_response(synth.river_race_log(_index(request, cfg.clans)))
+
+    async def royaleapi_player(request: web.Request) -> web.Response:
+        n = decode_id(request.match_info["tag"])
+        if n is None or n >= cfg.players:
+            return web.Response(status=404, text="not found")
+        return web.Response(text=synth.royaleapi_page(n), content_type="text/html")
+
+    async def icon_png(request: web.Request) -> web.Response:
+        if not icon:
+            icon.append(_icon_png())
+        return web.Response(body=icon[0], content_type="image/png")
+
+    async def stats_view(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application(middlewares=[latency_and_errors])
+    app.router.add_get("/v1/players/{tag}", player)
+    app.router.add_get("/v1/players/{tag}/battlelog", battlelog)
+    app.router.add_get("/v1/clans/{tag}", clan)
+    app.router.add_get("/v1/clans/{tag}/members", members)
+    app.router.add_get("/v1/clans/{tag}/currentriverrace", current_river_race)
+    app.router.add_get("/v1/clans/{tag}/riverracelog", river_race_log)
+    app.router.add_get("/player/{tag}", royaleapi_player)
+    app.router.add_get("/icons/{name}", icon_png)
+    app.router.add_get("/_stats", stats_view)
+    app["stats"] = stats
+    return app
+
+
+async def start(cfg: FakeConfig, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+    """Запускает заглушки в текущем event loop; возвращает (runner, базовый URL). port=0 — любой свободный."""
+    # порт нужен синтетике заранее (ссылки на иконки), поэтому сокет открываем сами
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    base_url = f"http://{host}:{sock.getsockname()[1]}"
+    runner = web.AppRunner(make_app(cfg, base_url), access_log=None)
+    await runner.setup()
+    await web.SockSite(runner, sock).start()
+    return runner, base_url
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--players", type=int, default=FakeConfig.players)
+    ap.add_argument("--clans", type=int, default=FakeConfig.clans)
+    ap.add_argument("--latency-ms", type=float, default=FakeConfig.latency_ms)
+    ap.add_argument("--jitter-ms", type=float, default=FakeConfig.jitter_ms)
+    ap.add_argument("--error-rate", type=float, default=FakeConfig.error_rate)
+    ap.add_argument("--recorded", default="")
+    args = ap.parse_args()
+    cfg = FakeConfig(
+        players=args.players,
+        clans=args.clans,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        recorded=args.recorded,
+    )
+    base_url = f"http://{args.host}:{args.port}"
+    print(f"Clash API: {base_url}/v1   RoyaleAPI: {base_url}   (players {player_tag(0)}…{player_tag(cfg.players - 1)})")
+    web.run_app(make_app(cfg, base_url), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
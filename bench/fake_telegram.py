@@ -0,0 +1,105 @@
+"""
+Telegram без сети: сессия, которая ничего не отправляет, а отвечает правдоподобными
+объектами, и генераторы апдейтов. Для бенчмарков и нагрузочных прогонов.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import CallbackQuery, Chat, InlineQuery, Message, Update, User
+
+_ids = itertools.count(1)
+
+
+class FakeSession(BaseSession):
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__()
+        self.latency = latency  # секунд на каждый запрос — как сетевой round-trip до Bot API
+        self.sent: Dict[str, int] = {}
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: Optional[int] = None) -> Any:
+        name = type(method).__name__
+        self.sent[name] = self.sent.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        returning = method.__returning__
+        if returning is bool:
+            return True
+        if returning is Message:
+            chat_id = getattr(method, "chat_id", 0) or 0
+            return Message(
+                message_id=next(_ids),
+                date=datetime.now(),
+                chat=Chat(id=int(chat_id) if str(chat_id).lstrip("-").isdigit() else 0, type="private"),
+                text=getattr(method, "text", None),
+            ).as_(bot)  # как у настоящей сессии: у ответа можно звать edit_text() и т.п.
+        return None
+
+    async def stream_content(self, *args: Any, **kwargs: Any) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def make_bot(latency: float = 0.0) -> Bot:
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.enums import ParseMode
+
+    return Bot(
+        token="123456:FAKE",
+        session=FakeSession(latency),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+
+
+def _user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name=f"user{user_id}")
+
+
+def message_update(user_id: int, text: str) -> Update:
+    uid = next(_ids)
+    return Update(
+        update_id=uid,
+        message=Message(
+            message_id=uid,
+            date=datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            from_user=_user(user_id),
+            text=text,
+        ),
+    )
+
+
+def callback_update(user_id: int, data: str) -> Update:
+    uid = next(_ids)
+    return Update(
+        update_id=uid,
+        callback_query=CallbackQuery(
+            id=str(uid),
+            from_user=_user(user_id),
+            chat_instance=str(user_id),
+            data=data,
+            message=Message(
+                message_id=uid,
+                date=datetime.now(),
+                chat=Chat(id=user_id, type="private"),
+                text="…",
+            ),
+        ),
+    )
+
+
+def inline_update(user_id: int, query: str) -> Update:
+    uid = next(_ids)
+    return Update(
+        update_id=uid,
+        inline_query=InlineQuery(id=str(uid), from_user=_user(user_id), query=query, offset=""),
+    )
@@ -0,0 +1,332 @@
+"""
+Нагрузочный прогон бота целиком и без сети: заглушки Clash API и RoyaleAPI (bench.fake_servers),
+фейковая сессия Telegram (bench.fake_telegram), диспетчер и сервисы — как в app.main.
+
+    python -m bench.load [--rate 50] [--duration 30] [--users 2000]
+                         [--mix profile=5,progress=2,find=2,warhistory=1,clanwar=0.2,help=1]
+                         [--latency-ms 80] [--jitter-ms 30] [--error-rate 0.01] [--tg-latency-ms 40]
+                         [--servers http://127.0.0.1:8081] [--max-inflight 512] [--json out.json]
+                         [--cassette prod.cas [--cassette-latency 1]]
+
+Апдейты подаются с постоянной частотой --rate в секунду (открытая модель: следующий апдейт
+не ждёт окончания предыдущих). Если одновременно в работе уже --max-inflight апдейтов,
+новый не подаётся и считается отброшенным — как при переполнении очереди вебхука.
+В конце — пропускная способность, перцентили задержки по сценариям (точные) и по хендлерам
+(по гистограммам app.metrics), счётчики запросов к заглушкам.
+
+По умолчанию заглушки крутятся в том же процессе и делят с ботом CPU; для точных цифр
+запусти их отдельно (python -m bench.fake_servers) и передай адрес в --servers.
+
+С --cassette вместо заглушек отдаются ответы, записанные ботом в режиме HTTP_CASSETTE_MODE=record
+(app.cassette): игроки и кланы берутся из кассеты, задержки — записанные, умноженные
+на --cassette-latency (0 — без задержек, чтобы мерить только свой код).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+from aiogram.types import Update
+
+from app import cassette, metrics
+from app.config import Config
+from app.db import Database
+from app.main import build_dispatcher
+from app.services.clash_api import ClashApi
+from app.services.cw2_history import CW2HistoryService
+from app.services.inline import InlineAnswers
+from app.services.job_queue import JobContext, JobQueue
+from app.services.outbox import Outbox
+from app.services.profile_text import ProfileTexts
+from app.services.snapshots import PlayerSnapshots
+from app.services.upgrade_renders import UpgradeRenders
+from app.services.watcher import WatchScheduler
+from bench import fake_servers
+from bench.fake_telegram import inline_update, make_bot, message_update
+
+DEFAULT_MIX = "profile=5,progress=2,find=2,warhistory=1,clanwar=0.2,help=1"
+
+Scenario = Callable[[int, random.Random], Update]
+
+
+def scenarios(player_tags: List[str], clan_tags: List[str]) -> Dict[str, Scenario]:
+    return {
+        "profile": lambda uid, rnd: message_update(uid, "/profile"),
+        "progress": lambda uid, rnd: message_update(uid, "/progress 7"),
+        "find": lambda uid, rnd: message_update(
+            uid, f"/find tr>={rnd.randrange(4000, 9000, 250)} l16>={rnd.randint(0, 10)}"
+        ),
+        "warhistory": lambda uid, rnd: message_update(uid, "/warhistory"),
+        "clanwar": lambda uid, rnd: message_update(uid, f"/clanwar {rnd.choice(clan_tags)}"),
+        "upgrade": lambda uid, rnd: message_update(uid, "/upgrade"),
+        "help": lambda uid, rnd: message_update(uid, "/help"),
+        "inline": lambda uid, rnd: inline_update(uid, rnd.choice(player_tags)),
+    }
+
+
+def from_cassette(c: cassette.Cassette) -> Tuple[List[str], List[str], str, str]:
+    """Игроки с профилем и кланы с составом из кассеты и базовые адреса, с которыми она записана."""
+    players, clans = [], []
+    clash_base, royaleapi_base = Config.clash_api_base, Config.royaleapi_base
+    for url in c.urls():
+        m = re.search(r"^(.*)/players/(%23[0-9A-Za-z]+)$", url)
+        if m:
+            clash_base = m.group(1)
+            players.append(unquote(m.group(2)))
+            continue
+        m = re.search(r"/clans/(%23[0-9A-Za-z]+)/members$", url)
+        if m:
+            clans.append(unquote(m.group(1)))
+            continue
+        m = re.search(r"^(.*)/player/[0-9A-Za-z]+$", url)
+        if m:
+            royaleapi_base = m.group(1)
+    return sorted(players), sorted(clans), clash_base, royaleapi_base
+
+
+def parse_mix(raw: str, known: Dict[str, Scenario]) -> Dict[str, float]:
+    mix: Dict[str, float] = {}
+    for part in raw.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in known:
+            raise SystemExit(f"unknown scenario {name!r}; known: {', '.join(known)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class LoadRun:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.dropped = 0
+        self.inflight = 0
+
+    async def _one(self, dp, bot, name: str, update: Update) -> None:
+        self.inflight += 1
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        finally:
+            self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+            self.inflight -= 1
+
+    async def run(self) -> Dict[str, object]:
+        a = self.args
+        fake = fake_servers.FakeConfig(
+            players=a.players,
+            clans=a.clans,
+            latency_ms=a.latency_ms,
+            jitter_ms=a.jitter_ms,
+            error_rate=a.error_rate,
+        )
+        runner = None
+        if a.cassette:
+            replay = cassette.configure("replay", a.cassette, a.cassette_latency)
+            player_tags, clan_tags, clash_base, royaleapi_base = from_cassette(replay)
+            if not player_tags:
+                raise SystemExit(f"no player profiles in {a.cassette}")
+        else:
+            base = a.servers.rstrip("/")
+            if not base:
+                runner, base = await fake_servers.start(fake)
+            player_tags = [fake_servers.player_tag(i) for i in range(a.players)]
+            clan_tags = [fake_servers.clan_tag(j) for j in range(a.clans)]
+            clash_base, royaleapi_base = base + "/v1", base
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cfg = Config(
+                bot_token="123456:FAKE",
+                db_path=os.path.join(tmp, "load.db"),
+                clash_api_token="x",
+                clash_api_base=clash_base,
+                royaleapi_base=royaleapi_base,
+                clash_api_rate=0.0,
+                refresh_rate=0.0,
+                watch_rate=0.0,
+                warmup=False,
+            )
+            db = Database(cfg.db_path)
+            await db.init()
+            for uid in range(1, a.users + 1):
+                await db.ensure_user(uid)
+            for uid in range(1, a.users + 1):
+                tag = player_tags[uid % len(player_tags)]
+                await db.add_account(uid, tag, f"Player {tag}")
+
+            clash_api = ClashApi(
+                cfg.clash_api_token, cfg.clash_api_base, rate=cfg.clash_api_rate, trim_players=cfg.trim_player_json
+            )
+            cw2_history = CW2HistoryService(timeout=12.0, base_url=cfg.royaleapi_base, rate=cfg.royaleapi_rate)
+            bot = make_bot(a.tg_latency_ms / 1000)
+            outbox = Outbox(db, bot)
+
+            dp = build_dispatcher(cfg)
+            dp["db"] = db
+            dp["clash_api"] = clash_api
+            dp["cw2_history"] = cw2_history
+            dp["jobs"] = JobQueue(db, JobContext(db, clash_api, cw2_history), use_workers=False)
+            dp["snapshots"] = PlayerSnapshots(db, clash_api, max_age=cfg.snapshot_max_age)
+            dp["inline"] = InlineAnswers(db, dp["snapshots"], max_age=cfg.snapshot_max_age)
+            dp["profiles"] = ProfileTexts(db)
+            dp["renders"] = UpgradeRenders(dp["jobs"], dp["snapshots"], limit=cfg.upgrade_prerender)
+            dp["watcher"] = WatchScheduler(db, clash_api, outbox, rate=1.0)
+            dp["outbox"] = outbox
+            dp["config"] = cfg
+
+            known = scenarios(player_tags, clan_tags)
+            mix = parse_mix(a.mix, known)
+            if not clan_tags:
+                mix.pop("clanwar", None)
+            names, weights = list(mix), list(mix.values())
+            rnd = random.Random(a.seed)
+
+            tasks = set()
+            interval = 1.0 / a.rate
+            started = time.perf_counter()
+            next_at = started
+            deadline = started + a.duration
+            while next_at < deadline:
+                if self.inflight >= a.max_inflight:
+                    self.dropped += 1
+                else:
+                    name = rnd.choices(names, weights)[0]
+                    update = known[name](rnd.randint(1, a.users), rnd)
+                    task = asyncio.create_task(self._one(dp, bot, name, update))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                next_at += interval
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            sent_for = time.perf_counter() - started
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            elapsed = time.perf_counter() - started
+
+            server_stats: Optional[Dict[str, int]] = runner.app["stats"] if runner is not None else None
+            await clash_api.close()
+            await cw2_history.close()
+            await bot.session.close()
+        if runner is not None:
+            await runner.cleanup()
+        cassette.configure("off")
+
+        done = sum(len(v) for v in self.latencies.values())
+        return {
+            "offered_rate": a.rate,
+            "sent_for": sent_for,
+            "elapsed": elapsed,
+            "completed": done,
+            "throughput": done / elapsed if elapsed else 0.0,
+            "dropped": self.dropped,
+            "scenarios": {
+                name: self._summary(sorted(lat), self.errors.get(name, 0))
+                for name, lat in sorted(self.latencies.items())
+            },
+            "handlers": _handler_summary(),
+            "upstream": {" ".join(k): int(v) for k, v in sorted(metrics.UPSTREAM_REQUESTS.values.items())},
+            "fake_servers": server_stats,
+            "telegram_calls": dict(bot.session.sent),
+        }
+
+    @staticmethod
+    def _summary(lat: List[float], errors: int) -> Dict[str, float]:
+        return {
+            "count": len(lat),
+            "errors": errors,
+            "p50": percentile(lat, 0.50),
+            "p90": percentile(lat, 0.90),
+            "p99": percentile(lat, 0.99),
+            "max": lat[-1] if lat else 0.0,
+        }
+
+
+def _handler_summary() -> Dict[str, Dict[str, float]]:
+    out = {}
+    h = metrics.HANDLER_SECONDS
+    for key, data in sorted(h.values.items()):
+        labels = dict(zip(h.labelnames, key))
+        out["/".join(key)] = {
+            "count": data.count,
+            "errors": int(metrics.HANDLER_ERRORS.values.get(key, 0)),
+            "p50": h.quantile(0.5, **labels) or 0.0,
+            "p90": h.quantile(0.9, **labels) or 0.0,
+            "p99": h.quantile(0.99, **labels) or 0.0,
+        }
+    return out
+
+
+def print_report(r: Dict[str, object]) -> None:
+    print(
+        f"offered {r['offered_rate']:.0f}/s for {r['sent_for']:.1f}s -> completed {r['completed']} "
+        f"in {r['elapsed']:.1f}s = {r['throughput']:.1f} updates/s, dropped {r['dropped']}"
+    )
+    print()
+    print(f"{'scenario':<22} {'count':>7} {'err':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, s in r["scenarios"].items():  # type: ignore[union-attr]
+        print(
+            f"{name:<22} {s['count']:>7} {s['errors']:>5} {s['p50'] * 1000:>9.1f} "
+            f"{s['p90'] * 1000:>9.1f} {s['p99'] * 1000:>9.1f} {s['max'] * 1000:>9.1f}"
+        )
+    print()
+    print("handlers (from metric histograms, bucket-interpolated):")
+    for name, s in r["handlers"].items():  # type: ignore[union-attr]
+        print(
+            f"  {name:<32} {s['count']:>7} {s['errors']:>5} {s['p50'] * 1000:>9.1f} "
+            f"{s['p90'] * 1000:>9.1f} {s['p99'] * 1000:>9.1f}"
+        )
+    print()
+    print("upstream requests:")
+    for name, n in r["upstream"].items():  # type: ignore[union-attr]
+        print(f"  {name:<60} {n:>7}")
+    print("telegram calls:", ", ".join(f"{k} {v}" for k, v in r["telegram_calls"].items()))  # type: ignore[union-attr]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rate", type=float, default=50.0, help="updates per second")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds of offered load")
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--players", type=int, default=fake_servers.FakeConfig.players)
+    ap.add_argument("--clans", type=int, default=fake_servers.FakeConfig.clans)
+    ap.add_argument("--mix", default=DEFAULT_MIX)
+    ap.add_argument("--latency-ms", type=float, default=fake_servers.FakeConfig.latency_ms)
+    ap.add_argument("--jitter-ms", type=float, default=fake_servers.FakeConfig.jitter_ms)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--tg-latency-ms", type=float, default=40.0, help="fake Bot API round-trip")
+    ap.add_argument("--servers", default="", help="base URL of an external bench.fake_servers")
+    ap.add_argument("--max-inflight", type=int, default=512)
+    ap.add_argument("--cassette", default="", help="replay upstream responses from this cassette")
+    ap.add_argument("--cassette-latency", type=float, default=1.0, help="recorded latency multiplier")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", default="", help="also write the report to this file")
+    args = ap.parse_args()
+
+    report = asyncio.run(LoadRun(args).run())
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Сколько места занимает история прогресса одного игрока за месяц (сеть не нужна):
+
+    python -m bench.progression [--days 30] [--interval 300] [--players 20]
+
+Симулирует снапшоты активного игрока каждые --interval секунд (трофеи меняются почти всегда,
+карты качаются пару раз в неделю), пишет их через тот же путь, что и cache_player_json,
+и сравнивает размер таблицы progress с хранением каждого полного JSON. Плюс время восстановления
+состояния за весь период.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict
+
+import aiosqlite
+
+from app.db import Database
+from app import progression
+
+
+def make_player(tag: str, rnd: random.Random) -> Dict[str, Any]:
+    cards = []
+    for i in range(110):
+        mx = (16, 14, 12, 9)[i % 4]
+        cards.append({
+            "name": f"Card {i}",
+            "id": 26000000 + i,
+            "level": rnd.randint(max(1, mx - 5), mx - 1),
+            "maxLevel": mx,
+            "count": rnd.randint(0, 5000),
+            "evolutionLevel": 0,
+            "iconUrls": {"medium": f"https://api-assets.clashroyale.com/cards/300/{i:040d}.png"},
+        })
+    return {
+        "tag": tag,
+        "name": "Player",
+        "expLevel": 50,
+        "trophies": 7000,
+        "bestTrophies": 7200,
+        "wins": 10000,
+        "losses": 9000,
+        "battleCount": 19000,
+        "cards": cards,
+    }
+
+
+def step(player: Dict[str, Any], rnd: random.Random, interval: int) -> None:
+    player["trophies"] = max(0, player["trophies"] + rnd.choice((-30, -29, 0, 29, 30, 31)))
+    player["bestTrophies"] = max(player["bestTrophies"], player["trophies"])
+    player["battleCount"] += 1
+    # ~2 апгрейда в неделю
+    if rnd.random() < 2 * interval / (7 * 86400):
+        c = rnd.choice(player["cards"])
+        if c["level"] < c["maxLevel"]:
+            c["level"] += 1
+    if rnd.random() < 0.3 * interval / (7 * 86400):
+        rnd.choice(player["cards"])["evolutionLevel"] = 1
+
+
+async def run(days: int, interval: int, players: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = Database(path)
+        await db.init()
+
+        rnd = random.Random(1)
+        snapshots = days * 86400 // interval
+        full_json = 0
+        start_ms = int(time.time() * 1000) - days * 86400 * 1000
+
+        async with aiosqlite.connect(path) as conn:
+            for p in range(players):
+                tag = f"#P{p}"
+                player = make_player(tag, rnd)
+                for i in range(snapshots):
+                    step(player, rnd, interval)
+                    full_json += len(json.dumps(player, ensure_ascii=False).encode("utf-8"))
+                    await db._record_progress(conn, tag, player, start_ms + i * interval * 1000)
+                await conn.commit()
+
+            cur = await conn.execute(
+                "SELECT COUNT(*), SUM(kind = 0), SUM(length(data)), SUM(length(player_tag) + 8 + 1) FROM progress"
+            )
+            rows, keyframes, data_bytes, key_bytes = await cur.fetchone()
+
+        started = time.perf_counter()
+        timeline = progression.replay(await db.get_progress("#P0", start_ms))
+        progression.summarize(timeline, start_ms)
+        replay_ms = (time.perf_counter() - started) * 1000
+
+    per_player = (data_bytes + key_bytes) / players
+    print(f"{players} players × {snapshots} snapshots ({days} days, every {interval}s):")
+    print(f"  rows per player          {rows / players:10.0f} ({keyframes / players:.0f} keyframes)")
+    print(f"  progress per player      {per_player / 1024:10.1f} KiB (data + key, without b-tree overhead)")
+    print(f"  full JSON per player     {full_json / players / 1024:10.1f} KiB")
+    print(f"  ratio                    {full_json / (data_bytes + key_bytes):10.0f}×")
+    print(f"  replay {days}d for one     {replay_ms:10.1f} ms")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--interval", type=int, default=300)
+    ap.add_argument("--players", type=int, default=20)
+    args = ap.parse_args()
+    asyncio.run(run(args.days, args.interval, args.players))
+
+
+if __name__ == "__main__":
+    main()
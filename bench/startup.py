@@ -0,0 +1,124 @@
+"""
+Бенчмарк холодного старта бота (сеть не нужна):
+
+    python -m bench.startup [--runs 5] [--top 15]
+
+1) `python -X importtime -c "import app.main"` — общее время импорта и самые тяжёлые модули;
+2) время до первого апдейта: свежий процесс импортирует app.main, собирает диспетчер как в
+   main() (своя временная БД, фейковая сессия Telegram) и прогоняет один /help.
+
+Каждый замер — отдельный процесс, берём медиану по --runs запускам.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_UPDATE_SNIPPET = r"""
+import time
+t0 = time.perf_counter()
+
+import asyncio, json, os, sys
+from app.main import build_dispatcher
+t_imports = time.perf_counter() - t0
+
+from app.config import Config
+from app.db import Database
+from bench.fake_telegram import make_bot, message_update
+
+async def go():
+    cfg = Config(bot_token="x", db_path=sys.argv[1], clash_api_token="x", warmup=False)
+    db = Database(cfg.db_path)
+    await db.init()
+    dp = build_dispatcher(cfg)
+    dp["db"] = db
+    dp["config"] = cfg
+    bot = make_bot()
+    t_ready = time.perf_counter() - t0
+    await dp.feed_update(bot, message_update(1, "/help"))
+    t_first = time.perf_counter() - t0
+    print(json.dumps({"imports": t_imports, "ready": t_ready, "first_update": t_first}))
+
+asyncio.run(go())
+"""
+
+
+def measure_importtime() -> Tuple[float, List[Tuple[str, int, int]]]:
+    """Возвращает (суммарно секунд, [(модуль, self_us, cumulative_us)])."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows: List[Tuple[str, int, int]] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cum_us)))
+
+    total = next((cum for name, _, cum in rows if name == "app.main"), 0) / 1e6
+    return total, rows
+
+
+def measure_first_update() -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = subprocess.run(
+            [sys.executable, "-c", FIRST_UPDATE_SNIPPET, os.path.join(tmp, "bench.db")],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15)
+    args = ap.parse_args()
+
+    # первый запуск прогревает .pyc — его не считаем
+    measure_importtime()
+
+    totals = []
+    by_module: Dict[str, List[int]] = {}
+    for _ in range(args.runs):
+        total, rows = measure_importtime()
+        totals.append(total)
+        for name, _, cum in rows:
+            by_module.setdefault(name, []).append(cum)
+
+    print(f"import app.main: median {statistics.median(totals) * 1000:.0f} ms over {args.runs} runs")
+    print(f"\nTop {args.top} modules by cumulative import time (median):")
+    ranked = sorted(
+        ((name, statistics.median(v)) for name, v in by_module.items() if name != "app.main"),
+        key=lambda x: -x[1],
+    )
+    for name, cum in ranked[: args.top]:
+        print(f"  {cum / 1000:8.1f} ms  {name}")
+
+    print("\nOur modules (app.*):")
+    for name, cum in ranked:
+        if name.startswith("app."):
+            print(f"  {cum / 1000:8.1f} ms  {name}")
+
+    samples = [measure_first_update() for _ in range(args.runs)]
+    print("\nTime from process start (median):")
+    for phase in ("imports", "ready", "first_update"):
+        print(f"  {phase:13s} {statistics.median(s[phase] for s in samples) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
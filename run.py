@@ -1,4 +1,8 @@
-from app.main import run
+import time
+
+_started_at = time.perf_counter()
+
+from app.main import run  # noqa: E402
 
 if __name__ == "__main__":
-    run()
+    run(started_at=_started_at)